@@ -0,0 +1,517 @@
+import os
+import sys
+import io
+import json
+import time
+import types
+import random
+import shutil
+import socket
+import hashlib
+import zipfile
+import argparse
+import platform
+import builtins
+import tempfile
+import threading
+import statistics
+import contextlib
+import subprocess
+import http.server
+import datetime
+from unittest import mock
+
+# Benchmarks gradle.py end to end without the network or a Windows machine: a local
+# HTTP server stands in for services.gradle.org, a synthetic distribution for the real
+# one, and in-memory fakes for the registry, the shortcut API and the settings broadcast.
+# Every run works in its own temporary directories, so nothing on this machine changes.
+
+BENCHMARK_SCHEMA = 1
+BENCHMARK_VERSION = "8.14.3"
+SERVER_CHUNK_SIZE = 16 * 1024
+MIRROR_EXTRA_LATENCY = 0.05 # The failover mirror answers slower, so the probe picks the primary that then fails
+DEFAULT_SCENARIOS = ["cold", "warm", "noop", "extract", "download"]
+
+# Phases of main(): the stage rules it prints, and the functions inside a stage that are
+# timed on their own (the stage "Gradle Installation" is download plus extraction).
+PHASE_FUNCTIONS = {
+    "version_fetch": ["resolve_gradle_version"],
+    "download": ["use_cached_distribution", "download_gradle_distribution"],
+}
+PHASE_STAGES = { # Titles exactly as main() passes them to begin_stage()
+    "env_config": "Environment Configuration (System-wide)",
+    "verification": "Final Verification",
+    "post_install": "Post-Install Operations",
+    "cleanup": "Final Cleanup (Temporary Files)",
+}
+
+# --- Windows stand-ins ---
+
+FAKE_REGISTRY = {} # {(root, key path lower-cased): {value name: (value, type)}}
+ENVIRONMENT_KEY = r"SYSTEM\CurrentControlSet\Control\Session Manager\Environment"
+
+def reset_fake_registry():
+    # A machine that has never seen the installer: only the default system Path.
+    FAKE_REGISTRY.clear()
+    FAKE_REGISTRY[(0x80000002, ENVIRONMENT_KEY.lower())] = {"Path": (r"C:\Windows\system32;C:\Windows", 2)}
+
+def install_windows_fakes(desktop_dir):
+    # Registers fake winreg, winshell, win32gui and win32con modules before gradle.py is
+    # imported (and in place of the real ones on Windows), backed by FAKE_REGISTRY.
+    registry = FAKE_REGISTRY
+
+    winreg = types.ModuleType("winreg")
+    winreg.HKEY_CURRENT_USER, winreg.HKEY_LOCAL_MACHINE = 0x80000001, 0x80000002
+    winreg.KEY_READ, winreg.KEY_ALL_ACCESS = 0x20019, 0xF003F
+    winreg.KEY_WOW64_64KEY, winreg.KEY_WOW64_32KEY = 0x100, 0x200
+    winreg.REG_SZ, winreg.REG_EXPAND_SZ, winreg.REG_DWORD = 1, 2, 4
+
+    class Key:
+        def __init__(self, root, path):
+            self.root, self.path = root, path.lower()
+        def __enter__(self):
+            return self
+        def __exit__(self, *exc_info):
+            return False
+        def Close(self):
+            pass
+
+    def OpenKey(key, sub_key, reserved=0, access=winreg.KEY_READ):
+        root, path = (key.root, f"{key.path}\\{sub_key}".lower()) if isinstance(key, Key) else (key, sub_key.lower())
+        if (root, path) not in registry:
+            raise FileNotFoundError(2, "The system cannot find the file specified", sub_key)
+        return Key(root, path)
+
+    def CreateKey(key, sub_key):
+        root, path = (key.root, f"{key.path}\\{sub_key}".lower()) if isinstance(key, Key) else (key, sub_key.lower())
+        registry.setdefault((root, path), {})
+        return Key(root, path)
+
+    def QueryValueEx(key, name):
+        values = registry.get((key.root, key.path), {})
+        if name not in values:
+            raise FileNotFoundError(2, "The system cannot find the file specified", name)
+        return values[name]
+
+    def SetValueEx(key, name, reserved, value_type, value):
+        registry.setdefault((key.root, key.path), {})[name] = (value, value_type)
+
+    def EnumKey(key, index):
+        prefix = key.path + "\\"
+        children = sorted({path[len(prefix):].split("\\")[0] for root, path in registry if root == key.root and path.startswith(prefix)})
+        if index >= len(children):
+            raise OSError(259, "No more data is available")
+        return children[index]
+
+    winreg.OpenKey, winreg.OpenKeyEx, winreg.CreateKey = OpenKey, OpenKey, CreateKey
+    winreg.QueryValueEx, winreg.SetValueEx, winreg.EnumKey = QueryValueEx, SetValueEx, EnumKey
+    winreg.CloseKey = lambda key: None
+    reset_fake_registry()
+
+    winshell = types.ModuleType("winshell")
+    winshell.desktop = lambda common=False: desktop_dir
+
+    @contextlib.contextmanager
+    def shortcut(path):
+        link = types.SimpleNamespace(path="", arguments="", description="", icon_location=("", 0), working_directory="")
+        yield link
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(vars(link), f)
+    winshell.shortcut = shortcut
+
+    win32con = types.ModuleType("win32con")
+    win32con.HWND_BROADCAST, win32con.WM_SETTINGCHANGE = 0xFFFF, 0x001A
+    win32con.SMTO_NORMAL, win32con.SMTO_ABORTIFHUNG = 0x0000, 0x0002
+    win32gui = types.ModuleType("win32gui")
+    win32gui.broadcasts = []
+    win32gui.SendMessageTimeout = lambda *args: win32gui.broadcasts.append(args) or (1, 0)
+
+    sys.modules.update({"winreg": winreg, "winshell": winshell, "win32con": win32con, "win32gui": win32gui})
+    if not hasattr(subprocess, "CREATE_NO_WINDOW"):
+        subprocess.CREATE_NO_WINDOW = 0
+
+# --- Synthetic distribution ---
+
+def _jar_bytes(rng, entries, entry_size, receipt=None):
+    # A real (readable) JAR: half random, half repetitive bytes per class, like compiled code.
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as jar:
+        for index in range(entries):
+            jar.writestr(f"org/gradle/synthetic/C{index}.class", rng.randbytes(entry_size // 2) + b"\xca\xfe" * (entry_size // 4))
+        if receipt:
+            jar.writestr("org/gradle/build-receipt.properties", receipt)
+    return buffer.getvalue()
+
+def build_distribution(out_dir, version=BENCHMARK_VERSION, files=300, total_bytes=30 * 1024 * 1024, seed=1):
+    # Writes gradle-<version>-bin.zip (and its .sha256) shaped like the real thing: the
+    # launchers, gradle-*.jar modules with a build receipt, dependency JARs and plugins.
+    # Returns the ZIP path.
+    rng = random.Random(seed)
+    zip_path = os.path.join(out_dir, f"gradle-{version}-bin.zip")
+    jar_count = max(2, files - 3)
+    entry_size = 4096
+    entries_per_jar = max(1, total_bytes // jar_count // entry_size)
+    receipt = (f"buildTimestamp=20250101000000+0000\nbuildTimestampIso=2025-01-01 00:00:00 UTC\ncommitId=0000000000000000\n"
+               f"isSnapshot=false\nversionBase={version}\nversionNumber={version}\n")
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as archive:
+        def add(name, data, mode=0o644):
+            info = zipfile.ZipInfo(f"gradle-{version}/{name}", (2025, 1, 1, 0, 0, 0))
+            info.external_attr = (0o100000 | mode) << 16
+            info.compress_type = zipfile.ZIP_DEFLATED
+            archive.writestr(info, data)
+        add("bin/gradle", f'#!/bin/sh\necho "Gradle {version}"\n'.encode(), 0o755)
+        add("bin/gradle.bat", f"@echo off\r\nset CLASSPATH=%APP_HOME%\\lib\\gradle-gradle-cli-main-{version}.jar\r\necho Gradle {version}\r\n".encode())
+        add("LICENSE", b"Apache License, Version 2.0\n" * 400)
+        add(f"lib/gradle-base-services-{version}.jar", _jar_bytes(rng, entries_per_jar, entry_size, receipt))
+        add(f"lib/gradle-gradle-cli-main-{version}.jar", _jar_bytes(rng, entries_per_jar, entry_size))
+        for index in range(jar_count - 2):
+            name = (f"lib/gradle-module{index}-{version}.jar" if index % 3 == 0 else
+                    f"lib/plugins/plugin{index}-{version}.jar" if index % 3 == 1 else f"lib/dependency{index}-1.0.jar")
+            add(name, _jar_bytes(rng, entries_per_jar, entry_size))
+    with open(zip_path, "rb") as f:
+        sha256 = hashlib.sha256(f.read()).hexdigest()
+    with open(zip_path + ".sha256", "w", encoding="ascii") as f:
+        f.write(sha256)
+    return zip_path
+
+# --- Local services.gradle.org ---
+
+class BenchmarkServer(http.server.ThreadingHTTPServer):
+    # latency: seconds before every response; bandwidth: bytes/s per connection (0 = no
+    # limit); ranges: honour Range requests; fail_after: drop one distribution
+    # connection once this many ZIP bytes have been served (0 = never).
+    daemon_threads = True
+    request_queue_size = 64
+
+    def __init__(self, root, latency=0.0, bandwidth=0, ranges=True, fail_after=0):
+        super().__init__(("127.0.0.1", 0), BenchmarkRequestHandler)
+        self.root, self.latency, self.bandwidth, self.ranges, self.fail_after = root, latency, bandwidth, ranges, fail_after
+        self.lock = threading.Lock()
+        self.served_bytes = 0
+        self.requests = 0
+        self.failures = 0
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError): # Clients hang up on probes and cancelled segments.
+            super().handle_error(request, client_address)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="benchmark-server", daemon=True).start()
+        return self
+
+class BenchmarkRequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.do_GET(head=True)
+
+    def do_GET(self, head=False):
+        with self.server.lock:
+            self.server.requests += 1
+        time.sleep(self.server.latency)
+        path = os.path.normpath(os.path.join(self.server.root, self.path.split("?")[0].lstrip("/")))
+        if not path.startswith(self.server.root) or not os.path.isfile(path):
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        with open(path, "rb") as f:
+            data = f.read()
+        etag = f'"{hashlib.sha1(data).hexdigest()}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        start, end, status = 0, len(data) - 1, 200
+        requested = self.headers.get("Range", "") if self.server.ranges else ""
+        if requested.startswith("bytes=") and (self.headers.get("If-Range") in (None, etag)):
+            first, _, last = requested[len("bytes="):].partition("-")
+            start, end, status = int(first or 0), min(int(last), len(data) - 1) if last else len(data) - 1, 206
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json" if "/versions/" in self.path else "application/octet-stream")
+        self.send_header("ETag", etag)
+        if self.server.ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        if not head:
+            self._send_throttled(data[start:end + 1], counted=path.endswith(".zip"))
+
+    def _send_throttled(self, body, counted):
+        started = time.perf_counter()
+        for offset in range(0, len(body), SERVER_CHUNK_SIZE):
+            chunk = body[offset:offset + SERVER_CHUNK_SIZE]
+            if counted:
+                with self.server.lock:
+                    self.server.served_bytes += len(chunk)
+                    drop = self.server.fail_after and self.server.served_bytes > self.server.fail_after and not self.server.failures
+                    if drop:
+                        self.server.failures += 1
+                if drop:
+                    self.connection.shutdown(socket.SHUT_RDWR)
+                    self.close_connection = True
+                    return
+            try:
+                self.wfile.write(chunk)
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True # The installer closes probes and cancelled segments early.
+                return
+            if self.server.bandwidth:
+                ahead = (offset + len(chunk)) / self.server.bandwidth - (time.perf_counter() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+def build_jdk(java_home, version="21.0.4"):
+    # Just what JDK discovery reads: the release file and bin/javac.
+    os.makedirs(os.path.join(java_home, "bin"), exist_ok=True)
+    with open(os.path.join(java_home, "release"), "w", encoding="utf-8") as f:
+        f.write(f'IMPLEMENTOR="Benchmark"\nJAVA_VERSION="{version}"\nOS_ARCH="x86_64"\n')
+    for name in ("java", "javac", "java.exe", "javac.exe"):
+        open(os.path.join(java_home, "bin", name), "w").close()
+    return java_home
+
+def build_site(root, version=BENCHMARK_VERSION, files=300, total_bytes=30 * 1024 * 1024):
+    # The versions API and the distribution, laid out like services.gradle.org.
+    os.makedirs(os.path.join(root, "versions"), exist_ok=True)
+    os.makedirs(os.path.join(root, "distributions"), exist_ok=True)
+    release = {"version": version, "snapshot": False, "nightly": False, "releaseNightly": False, "broken": False,
+               "rcFor": "", "milestoneFor": "", "activeRc": False}
+    with open(os.path.join(root, "versions", "current"), "w", encoding="utf-8") as f:
+        json.dump(release, f)
+    with open(os.path.join(root, "versions", "all"), "w", encoding="utf-8") as f:
+        json.dump([release], f)
+    return build_distribution(os.path.join(root, "distributions"), version, files, total_bytes)
+
+# --- Measurements ---
+
+def _slug(title):
+    return "_".join(title.lower().split())
+
+def run_main(gradle, work_dir, base_url, extra_args=(), verbose=False):
+    # One headless main() in work_dir (its own temp, install, cache and Gradle user home
+    # directories). Returns {"total", "exit_code", "stages", "phases"} in seconds.
+    for name in ("tmp", "install", "cache", "user-home", "desktop"):
+        os.makedirs(os.path.join(work_dir, name), exist_ok=True)
+    gradle.TEMP_DIR = os.path.join(work_dir, "tmp")
+    gradle.INSTALL_DIR = os.path.join(work_dir, "install")
+    gradle.CACHE_DIR = os.path.join(work_dir, "cache")
+    gradle.DOWNLOAD_MIRRORS = []
+    sys.modules["winshell"].desktop = lambda common=False: os.path.join(work_dir, "desktop")
+    java_home = build_jdk(os.path.join(work_dir, "jdk-21"))
+
+    marks = []
+    function_times = {phase: 0.0 for phase in PHASE_FUNCTIONS}
+    def timed(phase, function):
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                function_times[phase] += time.perf_counter() - started
+        return wrapper
+    console = gradle.console
+    print_rule = console.rule
+    def rule(title="", *args, **kwargs):
+        marks.append((time.perf_counter(), title)) # Every stage of main() starts with a rule.
+        return print_rule(title, *args, **kwargs)
+
+    output = io.StringIO()
+    exit_code = 0
+    with contextlib.ExitStack() as patches:
+        for phase, names in PHASE_FUNCTIONS.items():
+            for name in names:
+                patches.enter_context(mock.patch.object(gradle, name, timed(phase, getattr(gradle, name))))
+        patches.callback(setattr, console, "file", console.file) # A property, which mock.patch cannot restore.
+        console.file = sys.stderr if verbose else output
+        patches.enter_context(mock.patch.object(console, "rule", rule))
+        patches.enter_context(mock.patch.object(console, "clear", lambda *args, **kwargs: None))
+        patches.enter_context(mock.patch.object(gradle.Confirm, "ask", lambda *args, **kwargs: kwargs.get("default", True)))
+        patches.enter_context(mock.patch.object(gradle, "is_admin", lambda: True))
+        patches.enter_context(mock.patch.object(builtins, "input", lambda *args: ""))
+        patches.enter_context(mock.patch.dict(os.environ, {"GRADLE_USER_HOME": os.path.join(work_dir, "user-home"), "JAVA_HOME": java_home}))
+        started = time.perf_counter()
+        try:
+            gradle.main(["--services-url", base_url, *extra_args])
+        except SystemExit as e:
+            exit_code = e.code if isinstance(e.code, int) else 1
+        finished = time.perf_counter()
+
+    stages = {"startup": (marks[0][0] if marks else finished) - started}
+    for (mark, title), next_mark in zip(marks, [mark for mark, _ in marks[1:]] + [finished]):
+        plain = title.split("]", 1)[-1].split("[", 1)[0] if "[" in title else title
+        stages[_slug(plain)] = stages.get(_slug(plain), 0.0) + next_mark - mark
+    phases = dict(function_times)
+    phases["extraction"] = max(0.0, stages.get("gradle_installation", 0.0) - function_times["download"])
+    for phase, title in PHASE_STAGES.items():
+        phases[phase] = stages.get(_slug(title), 0.0)
+    missing = [phase for phase, title in PHASE_STAGES.items() if _slug(title) not in stages]
+    if exit_code == 0 and "gradle_installation" in stages and missing:
+        # A full install ran every stage, so a missing one means a title in main() changed.
+        raise SystemExit(f"No stage of main() matched the phase(s) {', '.join(missing)}; update PHASE_STAGES.")
+    return {"total": finished - started, "exit_code": exit_code, "stages": stages, "phases": phases,
+            "output_tail": output.getvalue()[-2000:] if exit_code else None}
+
+def bench_extract(gradle, zip_path, work_dir):
+    results = {}
+    for name, extract in (("extract_archive", lambda dest: gradle.extract_archive(zip_path, dest)),
+                          ("extractall", lambda dest: zipfile.ZipFile(zip_path).extractall(dest))):
+        dest = os.path.join(work_dir, name)
+        started = time.perf_counter()
+        extract(dest)
+        results[name] = time.perf_counter() - started
+        shutil.rmtree(dest, ignore_errors=True)
+    return results
+
+def bench_download(gradle, server, mirror, zip_name, work_dir):
+    # segmented: the ranged engine; single_stream: the plain GET it falls back to without
+    # Range support; failover: the primary drops the connection halfway through and the
+    # rest comes from the mirror.
+    url = f"{server.base_url}/distributions/{zip_name}"
+    expected_sha256 = gradle.fetch_published_sha256(url)
+    half = os.path.getsize(os.path.join(server.root, "distributions", zip_name)) // 2
+    downloads = (
+        ("segmented", lambda dest: gradle.download_file(url, dest, expected_sha256=expected_sha256)),
+        ("single_stream", lambda dest: gradle._download_single(url, dest, expected_sha256)),
+        ("failover", lambda dest: gradle.download_file(url, dest, expected_sha256=expected_sha256,
+                                                      mirrors=[f"{mirror.base_url}/distributions/{zip_name}"])),
+    )
+    results = {}
+    fail_after = server.fail_after
+    try:
+        for name, download in downloads:
+            server.fail_after, server.failures, server.served_bytes = half if name == "failover" else fail_after, 0, 0
+            dest = os.path.join(work_dir, f"{name}.zip")
+            started = time.perf_counter()
+            download(dest)
+            results[name] = time.perf_counter() - started
+            if name == "failover" and not server.failures:
+                raise SystemExit("The failover download never lost its connection to the primary.")
+            os.remove(dest)
+    finally:
+        server.fail_after = fail_after
+    return results
+
+def median_of(runs, key):
+    names = sorted({name for run in runs for name in run.get(key, {})}) if key else None
+    if key is None:
+        return statistics.median(run["total"] for run in runs)
+    return {name: statistics.median(run[key].get(name, 0.0) for run in runs) for name in names}
+
+def compare(results, baseline):
+    # Median changes against an earlier result file, slowest phases first.
+    lines = []
+    for scenario, data in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(scenario)
+        if not previous:
+            continue
+        lines.append(f"{scenario}:")
+        for key in ("median_total", *sorted(k for k in data["median"])):
+            new = data["median_total"] if key == "median_total" else data["median"][key]
+            old = previous.get("median_total") if key == "median_total" else previous.get("median", {}).get(key)
+            if old:
+                lines.append(f"  {key:<28} {old:8.3f}s -> {new:8.3f}s  ({(new - old) / old * 100:+6.1f}%)")
+    return "\n".join(lines)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark gradle.py end to end against a local stand-in for services.gradle.org.")
+    parser.add_argument("--scenarios", default=",".join(DEFAULT_SCENARIOS),
+                        help="Comma-separated: cold (empty caches), warm (cached distribution, existing install), "
+                             "noop (unattended run when the version is already installed and active), "
+                             "extract (extract_archive vs ZipFile.extractall), download (segmented vs single stream, "
+                             "and mirror failover after the primary drops the connection halfway).")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per scenario (default 3); medians are reported.")
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds the server waits before each response (default 0.02).")
+    parser.add_argument("--bandwidth", type=float, default=0, help="Bytes per second per connection (default 0, unlimited).")
+    parser.add_argument("--no-ranges", action="store_true", help="Make the server ignore Range requests.")
+    parser.add_argument("--fail-after", type=int, default=0, metavar="BYTES",
+                        help="Drop one distribution connection after this many bytes per run (default 0, never).")
+    parser.add_argument("--files", type=int, default=300, help="Files in the synthetic distribution (default 300).")
+    parser.add_argument("--size-mb", type=float, default=30, help="Uncompressed size of the synthetic distribution (default 30).")
+    parser.add_argument("--label", default="", help="Free text stored with the results (a release or commit).")
+    parser.add_argument("--output", metavar="FILE", help="Write the JSON results here instead of stdout.")
+    parser.add_argument("--compare", metavar="FILE", help="Print the median changes against an earlier result file.")
+    parser.add_argument("--keep", action="store_true", help="Keep the working directory for inspection.")
+    parser.add_argument("--verbose", action="store_true", help="Show the installer output (on stderr).")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    work_root = tempfile.mkdtemp(prefix="gradle-installer-bench-")
+    install_windows_fakes(os.path.join(work_root, "desktop"))
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import gradle
+
+    site_dir = os.path.join(work_root, "site")
+    zip_path = build_site(site_dir, files=args.files, total_bytes=int(args.size_mb * 1024 * 1024))
+    server = BenchmarkServer(site_dir, latency=args.latency, bandwidth=args.bandwidth, ranges=not args.no_ranges).start()
+    mirror = BenchmarkServer(site_dir, latency=args.latency + MIRROR_EXTRA_LATENCY, bandwidth=args.bandwidth,
+                             ranges=not args.no_ranges).start() if "download" in scenarios else None
+    results = {
+        "benchmark": "gradle-installer", "schema": BENCHMARK_SCHEMA, "label": args.label,
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count(),
+        "config": {"latency": args.latency, "bandwidth": args.bandwidth, "ranges": not args.no_ranges, "fail_after": args.fail_after,
+                   "files": args.files, "uncompressed_bytes": int(args.size_mb * 1024 * 1024), "zip_bytes": os.path.getsize(zip_path),
+                   "repeat": args.repeat},
+        "scenarios": {},
+    }
+    try:
+        for scenario in scenarios:
+            runs = []
+            for index in range(args.repeat):
+                server.fail_after, server.failures, server.served_bytes, server.requests = args.fail_after, 0, 0, 0
+                reset_fake_registry()
+                work_dir = os.path.join(work_root, f"{scenario}-{index}")
+                os.makedirs(work_dir)
+                if scenario == "cold":
+                    runs.append(run_main(gradle, work_dir, server.base_url, ["--no-tune", "--no-wrapper-seed"], args.verbose))
+                elif scenario == "warm":
+                    run_main(gradle, work_dir, server.base_url, ["--no-tune", "--no-wrapper-seed"], args.verbose)
+                    runs.append(run_main(gradle, work_dir, server.base_url, ["--no-tune", "--no-wrapper-seed", "--force"], args.verbose))
+                elif scenario == "noop":
+                    run_main(gradle, work_dir, server.base_url, ["--no-tune", "--no-wrapper-seed"], args.verbose)
+                    runs.append(run_main(gradle, work_dir, server.base_url, ["--yes"], args.verbose))
+                elif scenario == "extract":
+                    times = bench_extract(gradle, zip_path, work_dir)
+                    runs.append({"total": sum(times.values()), "phases": times})
+                elif scenario == "download":
+                    times = bench_download(gradle, server, mirror, os.path.basename(zip_path), work_dir)
+                    runs.append({"total": sum(times.values()), "phases": times})
+                else:
+                    raise SystemExit(f"Unknown scenario '{scenario}'.")
+                runs[-1]["requests"] = server.requests
+                shutil.rmtree(work_dir, ignore_errors=True)
+            results["scenarios"][scenario] = {"runs": runs, "median_total": median_of(runs, None), "median": median_of(runs, "phases")}
+    finally:
+        for running in filter(None, (server, mirror)):
+            running.shutdown()
+            running.server_close()
+        if not args.keep:
+            shutil.rmtree(work_root, ignore_errors=True)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            print(compare(results, json.load(f)), file=sys.stderr)
+    failed = [run for scenario in results["scenarios"].values() for run in scenario["runs"] if run.get("exit_code")]
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
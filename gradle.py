@@ -2,24 +2,49 @@ import os
 import sys
 import subprocess
 import ctypes
-import requests
 import zipfile
 import shutil
 import winreg
 import time
+import argparse
+import json
+import hashlib
+import bisect
+import struct
+import zlib
+import threading
+import difflib
+import contextlib
+import email.utils
+import urllib.parse
+import urllib.request
+import http.server
+import socket
+import random
+import re
+import importlib
+import importlib.util
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+
+# Exit codes (see the parse_args epilog); defined first so the dependency check below can use them.
+EXIT_OK = 0 # Installed, or already installed and active
+EXIT_FAILED = 1 # Version resolution, download, extraction or an unexpected error failed
+EXIT_NOT_ADMIN = 3 # Not elevated, and not restarted elevated (always the case with --yes); 2 is argparse's usage error
+EXIT_VERIFY_FAILED = 4 # Installed, but verification failed, so the post-install steps were skipped
+EXIT_CANCELLED = 5 # A confirmation was declined
 
 try:
     from rich.console import Console
     from rich.text import Text
     from rich.panel import Panel
     from rich.prompt import Confirm, Prompt
-    from rich.progress import Progress, BarColumn, DownloadColumn, TransferSpeedColumn, TimeRemainingColumn
     from rich.style import Style
     from rich.theme import Theme
-    import winshell
-    from winshell import shortcut
-    import win32gui
-    import win32con
+    # Only some paths need these (see LazyModule), so they are imported there; finding
+    # them is enough to report a missing one before anything starts.
+    for module_name in ("rich.progress", "requests", "winshell", "win32gui", "win32con"):
+        if module_name not in sys.modules and importlib.util.find_spec(module_name) is None:
+            raise ImportError(f"No module named '{module_name}'")
 except ImportError:
     # rich is critical for the admin prompt too, so check before anything else
     # that might use `console`.
@@ -31,7 +56,7 @@ except ImportError:
         print("Please install it by running: pip install rich requests winshell pywin32")
         if not getattr(sys, 'frozen', False):
              input("Press Enter to exit.") # Stall if run from python
-        sys.exit(1)
+        sys.exit(EXIT_FAILED)
     
     # If rich is available, but others are missing, use rich console for the message.
     # Define a basic console for this specific error message if rich.console is available.
@@ -51,17 +76,95 @@ except ImportError:
         Prompt.ask("Press Enter to exit.", console=console_fallback)
     else: 
         input("Press Enter to exit.")
-    sys.exit(1)
+    sys.exit(EXIT_FAILED)
 
 
 GRADLE_VERSION = None
 DOWNLOAD_URL = None
+# Directories serving the same distributions as services.gradle.org: Artifactory/Nexus
+# remotes, web servers or file shares (URLs or paths; separated by ';' in the variable).
+DOWNLOAD_MIRRORS = [mirror.strip() for mirror in os.environ.get("GRADLE_INSTALLER_MIRRORS", "").split(";") if mirror.strip()]
+DOWNLOAD_MIRROR_URLS = []
+SERVICES_BASE_URL = os.environ.get("GRADLE_INSTALLER_SERVICES_URL", "https://services.gradle.org").rstrip("/")
+# Base of the distributionUrl 'gradle wrapper' writes; the wrapper cache is keyed by that exact URL.
+WRAPPER_DISTRIBUTION_BASE_URL = "https://services.gradle.org/distributions"
 TEMP_DIR = os.path.join(os.environ.get("TEMP", "C:\\Temp"), "gradle_installer_py")
+# Persistent, content-addressed store of downloaded distributions. Point
+# GRADLE_INSTALLER_CACHE at a shared directory to let several machines use one cache.
+CACHE_DIR = os.environ.get("GRADLE_INSTALLER_CACHE") or os.path.join(
+    os.environ.get("LOCALAPPDATA", os.environ.get("TEMP", "C:\\Temp")), "gradle_installer_py", "cache")
+CACHE_MAX_BYTES = int(os.environ.get("GRADLE_INSTALLER_CACHE_MAX_MB", "2048")) * 1024 * 1024
+CACHE_LOCK_TIMEOUT = 30
+CACHE_LOCK_STALE_SECONDS = 120
+VERSIONS_CACHE_TTL = 6 * 60 * 60
+MIN_FREE_DISK_MB = 500
 GRADLE_ZIP_NAME = None
 GRADLE_ZIP_PATH = None
 INSTALL_DIR = "C:\\Gradle"
 GRADLE_HOME_DIR_NAME = None
 GRADLE_HOME = None
+MANIFEST_DIR_NAME = ".gradle-installer" # Install index and per-version manifests, inside INSTALL_DIR
+CURRENT_LINK_NAME = "current" # Junction to the active gradle-<version>; GRADLE_HOME and Path point here
+IO_REPARSE_TAG_MOUNT_POINT = 0xA0000003
+TRASH_DIR_NAME = ".trash" # Old trees are renamed here (instant) and deleted in the background
+CLEANUP_KEEP_VERSIONS = 2
+TRASH_RETRIES = 5
+TRASH_RETRY_DELAY = 0.2
+# DETACHED_PROCESS | CREATE_NEW_PROCESS_GROUP | BELOW_NORMAL_PRIORITY_CLASS: the trash sweeper outlives the installer.
+TRASH_SWEEP_CREATION_FLAGS = 0x00000008 | 0x00000200 | 0x00004000
+GRADLE_ZIP_SHA256 = None
+
+DOWNLOAD_SEGMENTS = 8
+DOWNLOAD_MIN_SEGMENT_SIZE = 4 * 1024 * 1024
+DOWNLOAD_CHUNK_SIZE = 8192 * 4
+DOWNLOAD_TIMEOUT = (10, 300)
+DOWNLOAD_RETRIES = 5
+DOWNLOAD_BACKOFF_BASE = 1.0
+DOWNLOAD_BACKOFF_MAX = 30.0
+DOWNLOAD_STATE_SAVE_INTERVAL = 1.0
+HASH_BUFFER_LIMIT = 32 * 1024 * 1024
+MIRROR_PROBE_BYTES = 64 * 1024 # Enough to tell a slow mirror from a distant one
+MIRROR_PROBE_TIMEOUT = (5, 15)
+SERVE_PORT = 8765 # Default port of the 'serve' distribution proxy
+PREFETCH_SPECS = ["latest", "rc"] # What 'prefetch' keeps in the distribution cache unless --gradle-version is given
+PREFETCH_JITTER = 0.1 # Spread --interval by up to 10% so a fleet does not ask the versions API in lockstep
+DISTRIBUTION_PROXY_ENDPOINT = re.compile(r"[a-z][a-z-]*")
+DISTRIBUTION_PROXY_ZIP = re.compile(r"gradle-[0-9A-Za-z.+-]+-(bin|all)\.zip")
+DISTRIBUTION_PROXY_FILL_WAIT = 5 # A ZIP request waits this long for its upstream fetch before answering 503
+DISTRIBUTION_PROXY_RETRY_AFTER = 10 # Seconds a 503 (ZIP still being fetched, cache busy) asks clients to wait
+DISTRIBUTION_PROXY_TOUCH_INTERVAL = 60 # Refresh a served ZIP's cache LRU time at most this often
+EXTRACT_WORKERS = min(16, (os.cpu_count() or 4) * 2)
+EXTRACT_BLOCK_SIZE = 1024 * 1024
+PROVISION_JOBS = 3 # Versions 'provision' downloads and extracts at once
+# Extract entries into a staging directory while the archive is still downloading.
+STREAM_EXTRACT = True
+DAEMON_STOP_TIMEOUT = 15
+DAEMON_POLL_INTERVAL = 0.1
+# Java versions that can run each Gradle line (newest first), from Gradle's compatibility matrix.
+GRADLE_JAVA_COMPATIBILITY = [("9.1", 17, 25), ("9.0", 17, 24), ("8.14", 8, 24), ("8.10", 8, 23), ("8.8", 8, 22),
+                             ("8.5", 8, 21), ("8.3", 8, 20), ("7.6", 8, 19), ("7.5", 8, 18), ("7.3", 8, 17),
+                             ("7.0", 8, 16), ("6.7", 8, 15)]
+JDK_REGISTRY_KEYS = [r"SOFTWARE\JavaSoft", r"SOFTWARE\Eclipse Adoptium", r"SOFTWARE\Eclipse Foundation", r"SOFTWARE\AdoptOpenJDK",
+                     r"SOFTWARE\Microsoft\JDK", r"SOFTWARE\Azul Systems\Zulu", r"SOFTWARE\BellSoft\Liberica", r"SOFTWARE\Amazon Corretto"]
+JDK_VENDOR_DIRS = ["Java", "Eclipse Adoptium", "Eclipse Foundation", "AdoptOpenJDK", "Microsoft", "Zulu", "BellSoft", "Amazon Corretto", "OpenJDK"]
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+PROCESS_TERMINATE = 0x0001
+PROCESS_COMMAND_LINE_INFORMATION = 60 # NtQueryInformationProcess class, Windows 8.1 and later
+# A daemon runs "... org.gradle.launcher.daemon.bootstrap.GradleDaemon <version>"
+GRADLE_DAEMON_COMMAND_LINE = re.compile(r'org\.gradle\.launcher\.daemon\.bootstrap\.GradleDaemon"?\s+"?([^\s"]+)')
+STILL_ACTIVE = 259
+PROCESS_MODE_BACKGROUND_BEGIN = 0x00100000 # Low CPU, I/O and memory priority for the calling process
+# Performance profile written to <Gradle user home>/gradle.properties (see tune_gradle_properties)
+TUNE_HEAP_MIN_MB = 1024
+TUNE_HEAP_MAX_MB = 8192
+TUNE_WORKER_MEMORY_MB = 512 # Left per worker for its own JVMs (compiler daemons, test executors)
+TUNE_BLOCK_BEGIN = "# --- Begin Gradle Setup Utility profile (keys set outside this block take precedence) ---"
+TUNE_BLOCK_END = "# --- End Gradle Setup Utility profile ---"
+IOCTL_STORAGE_QUERY_PROPERTY = 0x002D1400
+STORAGE_DEVICE_SEEK_PENALTY_PROPERTY = 7
+ASSUME_YES = False # --yes: every question is answered yes, no logo, no "Press Enter" pauses, no elevation prompt
+TRACE_PATH = os.environ.get("GRADLE_INSTALLER_TRACE") # --trace default; fleet agents can set it without changing the command line
+TRACE_COUNTER_SAMPLE_INTERVAL = 0.1 # At most this often a counter sample lands in the trace; totals are always exact
 
 custom_theme = Theme({
     "info": "cyan", "warning": "yellow", "danger": "bold red",
@@ -70,6 +173,164 @@ custom_theme = Theme({
 })
 console = Console(theme=custom_theme, width=100)
 
+class LazyModule:
+    # Stands in for a module until an attribute is first used, so a run that never goes
+    # online, creates a shortcut or broadcasts a setting change never imports requests
+    # or pywin32. import_module() is thread-safe, and after the first call a cheap lookup.
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(importlib.import_module(self._name), attr)
+
+requests = LazyModule("requests")
+winshell = LazyModule("winshell")
+win32gui = LazyModule("win32gui")
+win32con = LazyModule("win32con")
+
+def transfer_progress(transient=True, eta=False):
+    # The byte progress bar of downloads, extraction and verification. rich.progress is
+    # the heaviest part of rich, so it is imported here rather than at startup.
+    from rich.progress import Progress, BarColumn, DownloadColumn, TransferSpeedColumn, TimeRemainingColumn
+    columns = ["[progress.description]{task.description}", BarColumn(), DownloadColumn(), TransferSpeedColumn()]
+    if eta:
+        columns += ["ETA:", TimeRemainingColumn()]
+    return Progress(*columns, console=console, transient=transient)
+
+def confirm(question, default=True):
+    if ASSUME_YES:
+        console.print(f"{question} [dim]yes (--yes)[/dim]")
+        return True
+    return Confirm.ask(question, default=default, console=console)
+
+def pause(message="Press Enter to exit."):
+    # Keeps a double-clicked console window open; unattended runs never wait.
+    if ASSUME_YES:
+        return
+    if getattr(sys, 'frozen', False): Prompt.ask(message, console=console)
+    else: input(message)
+
+class Tracer:
+    # Spans, counters and instant events for --trace, written as JSON lines or as a
+    # Chrome trace (chrome://tracing, Perfetto). While disabled every method returns at
+    # its first line and span() hands out one shared no-op context manager, so the
+    # calls can stay in the download and extraction paths.
+
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+        self.counters = {}
+        self._sampled = {}
+        self._threads = {}
+        self._phase = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._started = time.time()
+
+    def enable(self):
+        self.enabled = True
+        self.events, self.counters, self._sampled, self._threads, self._phase = [], {}, {}, {}, None
+        self._local = threading.local()
+        self._origin, self._started = time.perf_counter(), time.time()
+
+    def _now(self):
+        return (time.perf_counter() - self._origin) * 1e6 # Chrome trace timestamps are microseconds
+
+    def _emit(self, event):
+        # Thread idents are recycled once a thread ends, so each thread gets its own number.
+        tid = getattr(self._local, "tid", None)
+        with self._lock:
+            if tid is None:
+                tid = self._local.tid = len(self._threads) + 1
+                self._threads[tid] = threading.current_thread().name
+            event.update(pid=os.getpid(), tid=tid)
+            self.events.append(event)
+
+    def span(self, name, category="phase", **args):
+        # The context value is the span's args dict: whatever the block adds to it (status,
+        # sizes, the source it used) is recorded with the span, as is an escaping exception.
+        if not self.enabled:
+            return contextlib.nullcontext({}) # A fresh dict each time: annotations are dropped with it
+        return self._span(name, category, args)
+
+    @contextlib.contextmanager
+    def _span(self, name, category, args):
+        started = self._now()
+        try:
+            yield args
+        except BaseException as e:
+            args["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self._emit({"ph": "X", "name": name, "cat": category, "ts": started, "dur": self._now() - started, "args": args})
+
+    def phase(self, name):
+        # Ends the running phase (if any) and starts the next: installer stages follow each other.
+        if not self.enabled:
+            return
+        self.end_phase()
+        self._phase = (name, self._now())
+
+    def end_phase(self):
+        if not self.enabled or not self._phase:
+            return
+        name, started = self._phase
+        self._phase = None
+        self._emit({"ph": "X", "name": name, "cat": "phase", "ts": started, "dur": self._now() - started, "args": {}})
+
+    def mark(self, name, category="event", **args):
+        if not self.enabled:
+            return
+        self._emit({"ph": "i", "s": "t", "name": name, "cat": category, "ts": self._now(), "args": args})
+
+    def count(self, name, value=1):
+        if not self.enabled:
+            return
+        now = self._now()
+        with self._lock:
+            total = self.counters[name] = self.counters.get(name, 0) + value
+            if now - self._sampled.get(name, -1e12) < TRACE_COUNTER_SAMPLE_INTERVAL * 1e6:
+                return
+            self._sampled[name] = now
+        self._emit({"ph": "C", "name": name, "cat": "counter", "ts": now, "args": {"value": total}})
+
+    def write(self, path, trace_format=None, **metadata):
+        # trace_format "chrome" or "jsonl"; by default a .json file gets the Chrome format.
+        self.end_phase()
+        now = self._now()
+        with self._lock:
+            events = list(self.events)
+            events += [{"ph": "C", "name": name, "cat": "counter", "ts": now, "args": {"value": total}, "pid": os.getpid(), "tid": 0}
+                       for name, total in sorted(self.counters.items())]
+            threads = dict(self._threads)
+            counters = dict(self.counters)
+        events.sort(key=lambda event: event["ts"])
+        metadata.update(started=self._started, duration=now / 1e6, pid=os.getpid(), host=socket.gethostname(), counters=counters)
+        if (trace_format or ("chrome" if path.lower().endswith(".json") else "jsonl")) == "chrome":
+            events += [{"ph": "M", "name": "thread_name", "pid": os.getpid(), "tid": tid, "args": {"name": name}}
+                       for tid, name in threads.items()]
+            lines = [json.dumps({"traceEvents": events, "displayTimeUnit": "ms", "otherData": metadata})]
+        else:
+            kinds = {"X": "span", "i": "event", "C": "counter"}
+            lines = [json.dumps({"type": "run", **metadata})]
+            for event in events:
+                record = {"type": kinds[event["ph"]], "name": event["name"], "cat": event["cat"], "ts": round(event["ts"] / 1e6, 6),
+                          "thread": threads.get(event["tid"], "")}
+                if "dur" in event:
+                    record["dur"] = round(event["dur"] / 1e6, 6)
+                if event["args"]:
+                    record["args"] = event["args"]
+                lines.append(json.dumps(record))
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+
+TRACE = Tracer()
+
 def is_admin():
     try:
         return ctypes.windll.shell32.IsUserAnAdmin() != 0
@@ -118,37 +379,1863 @@ def run_as_admin():
         console.print("[danger]Please try running the script manually as an administrator.[/danger]")
         return False
 
-def fetch_latest_gradle_version():
-    api_url = "https://services.gradle.org/versions/current"
-    console.print(f"Fetching latest Gradle version from [link={api_url}]{api_url}[/link]...", style="info")
-    try:
-        response = requests.get(api_url, timeout=15)
-        response.raise_for_status()
-        data = response.json()
-        latest_version = data.get("version")
-        if latest_version:
-            console.print(f"  [success]Latest Gradle version found: [variable]{latest_version}[/variable][/success]")
-            return latest_version
-        else:
-            console.print("  [danger]Could not parse version from API response.[/danger]")
-            return None
+def trace_dns(url):
+    # With --trace, resolves the host in its own span so slow DNS shows up on its own;
+    # the connection that follows then gets the answer from the resolver cache.
+    if not TRACE.enabled:
+        return
+    host = urllib.parse.urlsplit(url).hostname
+    if not host:
+        return
+    with TRACE.span(f"dns {host}", "network", host=host) as span:
+        try:
+            span["addresses"] = len(socket.getaddrinfo(host, None, type=socket.SOCK_STREAM))
+        except OSError as e:
+            span["error"] = str(e)
+
+def _versions_cache_path(endpoint):
+    return os.path.join(CACHE_DIR, "metadata", f"versions-{endpoint.replace('/', '-')}.json")
+
+def fetch_versions_api(endpoint, offline=False, ttl=None):
+    # Returns (data, source) where source is one of "cache", "revalidated", "network",
+    # "stale" (network failed, cached copy used) or (None, None) if nothing is available.
+    ttl = VERSIONS_CACHE_TTL if ttl is None else ttl
+    cache_path = _versions_cache_path(endpoint)
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        cached = None
+
+    if cached is not None and (offline or time.time() - cached.get("fetched_at", 0) < ttl):
+        return cached["data"], "cache"
+    if offline:
+        return None, None
+
+    headers = {}
+    if cached is not None:
+        if cached.get("etag"): headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"): headers["If-Modified-Since"] = cached["last_modified"]
+    try:
+        with TRACE.span(f"GET versions/{endpoint}", "network", conditional=bool(headers)) as span:
+            trace_dns(SERVICES_BASE_URL)
+            response = requests.get(f"{SERVICES_BASE_URL}/versions/{endpoint}", headers=headers, timeout=15)
+            span.update(status=response.status_code, ttfb_ms=response.elapsed.total_seconds() * 1000)
+            if response.status_code == 304 and cached is not None:
+                source = "revalidated"
+            else:
+                response.raise_for_status()
+                cached = {"data": response.json(), "etag": response.headers.get("ETag"),
+                          "last_modified": response.headers.get("Last-Modified")}
+                source = "network"
+    except (requests.RequestException, ValueError):
+        if cached is not None:
+            return cached["data"], "stale"
+        raise
+
+    cached["fetched_at"] = time.time()
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f"{cache_path}.tmp-{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(cached, f)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass # A read-only cache only costs us the next revalidation.
+    return cached["data"], source
+
+def version_sort_key(version):
+    # "8.14.1" > "8.14.1-rc-2" > "8.14.1-milestone-1"; missing components count as 0.
+    base, _, qualifier = version.partition("-")
+    numbers = tuple(int(part) if part.isdigit() else 0 for part in base.split("."))
+    numbers += (0,) * (3 - len(numbers))
+    if not qualifier:
+        return numbers + (2, 0)
+    kind, _, number = qualifier.rpartition("-")
+    rank = {"rc": 1, "milestone": 0}.get(kind, -1)
+    return numbers + (rank, int(number) if number.isdigit() else 0)
+
+def _is_stable(entry):
+    return not (entry.get("snapshot") or entry.get("nightly") or entry.get("releaseNightly") or entry.get("broken")
+                or entry.get("rcFor") or entry.get("milestoneFor"))
+
+def select_gradle_version(spec, versions):
+    # spec: "latest", "rc" (the active release candidate, while it is newer than the newest
+    # stable release), an exact version ("8.14.1")
+    # or a prefix selecting its newest stable patch ("8" or "8.x" -> newest 8.*).
+    versions = [entry for entry in versions if entry.get("version") and not entry.get("broken")]
+    spec = (spec or "latest").strip().lower()
+    if spec == "latest":
+        candidates = [entry for entry in versions if _is_stable(entry)]
+    elif spec == "rc":
+        newest_stable = max((version_sort_key(entry["version"]) for entry in versions if _is_stable(entry)), default=None)
+        candidates = [entry for entry in versions if entry.get("rcFor") and entry.get("activeRc")
+                      and (newest_stable is None or version_sort_key(entry["version"]) > newest_stable)]
+    else:
+        exact = [entry for entry in versions if entry["version"].lower() == spec]
+        if exact:
+            return exact[0]["version"]
+        prefix = spec[:-2] if spec.endswith(".x") else spec
+        candidates = [entry for entry in versions if _is_stable(entry) and entry["version"].startswith(prefix + ".")]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda entry: version_sort_key(entry["version"]))["version"]
+
+def resolve_gradle_version(spec="latest", offline=False, ttl=None):
+    spec = (spec or "latest").strip()
+    source_labels = {"cache": "from local cache", "revalidated": "cache revalidated, not modified",
+                     "network": "from the versions API", "stale": "from stale cache, network unavailable"}
+    console.print(f"Resolving Gradle version [variable]{spec}[/variable]{' (offline)' if offline else ''}...", style="info")
+    try:
+        if spec.lower() == "latest":
+            data, source = fetch_versions_api("current", offline=offline, ttl=ttl)
+            if data and data.get("version"):
+                console.print(f"  [success]Latest Gradle version found: [variable]{data['version']}[/variable] ({source_labels[source]})[/success]")
+                return data["version"]
+        data, source = fetch_versions_api("all", offline=offline, ttl=ttl)
     except requests.RequestException as e:
-        console.print(f"  [danger]Error fetching latest Gradle version: {e}[/danger]")
+        console.print(f"  [danger]Error fetching Gradle version information: {e}[/danger]")
         return None
-    except ValueError: 
+    except ValueError:
         console.print("  [danger]Error parsing version data (not valid JSON).[/danger]")
         return None
+    if data is None:
+        console.print("  [danger]No cached version information is available for offline use. Run once while online first.[/danger]")
+        return None
+    version = select_gradle_version(spec, data)
+    if version:
+        console.print(f"  [success]Resolved Gradle version: [variable]{version}[/variable] ({source_labels[source]})[/success]")
+    elif spec.lower() == "rc":
+        console.print("  [danger]There is no active Gradle release candidate newer than the latest stable release.[/danger]")
+    else:
+        console.print(f"  [danger]No Gradle release matches '{spec}'.[/danger]")
+    return version
+
+def fetch_latest_gradle_version(offline=False):
+    return resolve_gradle_version("latest", offline=offline)
+
+def parse_args(argv=None):
+    # "@file" reads further arguments from file, one per line: a provisioning profile.
+    parser = argparse.ArgumentParser(description="Install the official Gradle distribution on Windows.", fromfile_prefix_chars="@",
+                                     epilog=f"Exit codes: {EXIT_OK} installed (or already installed and active), {EXIT_FAILED} failed, "
+                                            f"2 usage error, {EXIT_NOT_ADMIN} not running as administrator, {EXIT_VERIFY_FAILED} "
+                                            f"installed but verification failed, {EXIT_CANCELLED} cancelled at a prompt.")
+    parser.add_argument("command", nargs="?", default="install", choices=["install", "provision", "prefetch", "status", "repair", "switch", "rollback", "pin", "unpin", "seed-wrapper", "tune", "serve", "empty-trash"],
+                        help="'install' (default) runs the installer; 'provision' installs every --gradle-version side by "
+                             "side, several at once, without changing the active version; 'prefetch' downloads new releases "
+                             "(--gradle-version, default latest and rc) into the distribution cache at low priority; 'status' lists installed versions, the active one, "
+                             "their disk usage and any files modified since installation; 'repair' checks an installed "
+                             "version (the active one unless --gradle-version is given) against its archive and "
+                             "re-extracts only damaged or missing files; 'switch' activates an installed version "
+                             "(--gradle-version, default the newest) and 'rollback' the previously active one; "
+                             "'seed-wrapper' fills the Gradle wrapper cache for --seed-wrapper entries (default: the active version); "
+                             "'tune' writes the hardware-sized gradle.properties profile only; "
+                             "'serve' runs a caching proxy of the versions API and distributions for other installers (see --services-url); "
+                             "'pin' / 'unpin' keep --gradle-version (default the active one) from being removed by cleanup, or allow it again; "
+                             "'empty-trash' deletes old installations that cleanup moved aside.")
+    parser.add_argument("--seed-wrapper", action="append", default=[], metavar="URL_OR_VERSION",
+                        help="Also put this distribution into the Gradle wrapper cache, so 'gradlew' projects using it start "
+                             "without a download. A version means the official -bin URL. Can be given several times.")
+    parser.add_argument("--no-wrapper-seed", action="store_true",
+                        help="Do not put the installed version into the Gradle wrapper cache.")
+    parser.add_argument("--no-tune", action="store_true",
+                        help="Do not write the hardware-sized performance profile into the Gradle user home's gradle.properties.")
+    parser.add_argument("--tune-dry-run", action="store_true",
+                        help="Show the gradle.properties changes the performance profile would make, without writing them.")
+    parser.add_argument("--mirror", action="append", default=[], metavar="URL_OR_PATH",
+                        help="Another place serving the Gradle distributions (an Artifactory/Nexus remote, web server, "
+                             "file:// URL or share path). All mirrors and services.gradle.org are probed and the fastest "
+                             "one is used; the download moves to the next if it fails. Can be given several times "
+                             "(also GRADLE_INSTALLER_MIRRORS, separated by ';').")
+    parser.add_argument("--services-url", metavar="URL",
+                        help=f"Versions API and distributions base URL (default {SERVICES_BASE_URL}), e.g. a 'serve' proxy "
+                             "like http://buildcache01:8765 (also GRADLE_INSTALLER_SERVICES_URL).")
+    parser.add_argument("--bind", default="0.0.0.0", metavar="HOST", help="Address 'serve' listens on (default all interfaces).")
+    parser.add_argument("--port", type=int, default=SERVE_PORT, metavar="N", help=f"Port 'serve' listens on (default {SERVE_PORT}).")
+    parser.add_argument("--yes", "-y", action="store_true",
+                        help="Unattended: answer every question with yes and never wait for Enter. Skips the logo, and "
+                             "exits instead of asking for elevation when not run as administrator.")
+    parser.add_argument("--force", action="store_true",
+                        help="Install even when the requested version is already installed and active.")
+    parser.add_argument("--no-cleanup", action="store_true",
+                        help="Keep all older Gradle versions instead of removing all but the newest --keep.")
+    parser.add_argument("--install-dir", metavar="DIR", help=f"Installation root (default {INSTALL_DIR}).")
+    parser.add_argument("--keep", type=int, default=CLEANUP_KEEP_VERSIONS, metavar="N",
+                        help=f"How many of the newest installed versions cleanup keeps (default {CLEANUP_KEEP_VERSIONS}). The active "
+                             "version and the rollback target are always kept.")
+    parser.add_argument("--gradle-version", "-g", action="append", metavar="SPEC",
+                        help="Version to install: 'latest' (default), 'rc', an exact version like 8.14.1, "
+                             "or a major/minor prefix like 8 or 8.14.x for its newest stable patch. 'provision' takes "
+                             "several (repeat the option or separate them with commas).")
+    parser.add_argument("--jobs", type=int, default=PROVISION_JOBS, metavar="N",
+                        help=f"How many versions 'provision' downloads and extracts at once (default {PROVISION_JOBS}).")
+    parser.add_argument("--max-bandwidth", type=float, metavar="MB_PER_S",
+                        help="Cap the combined download rate of 'provision' and 'prefetch', in MB/s (default unlimited).")
+    parser.add_argument("--max-disk-io", type=float, metavar="MB_PER_S",
+                        help="Cap the combined extraction write rate of 'provision', in MB/s (default unlimited).")
+    parser.add_argument("--interval", type=float, default=0, metavar="HOURS",
+                        help="Keep 'prefetch' running and check again every HOURS (default 0: check once and exit, "
+                             "for a scheduled task).")
+    parser.add_argument("--offline", action="store_true",
+                        help="Resolve versions and distributions from the local cache only, without network access.")
+    parser.add_argument("--deep-verify", action="store_true",
+                        help="Also run 'gradle --version' (starts a JVM) after the file-based verification.")
+    parser.add_argument("--no-reuse", action="store_true",
+                        help="Extract every file, instead of linking files that are unchanged since the previous install.")
+    parser.add_argument("--trace", default=None, metavar="FILE",
+                        help="Record phase and subprocess timings, download and extraction counters and time-to-first-byte "
+                             "into FILE (also GRADLE_INSTALLER_TRACE).")
+    parser.add_argument("--trace-format", choices=["jsonl", "chrome"],
+                        help="'jsonl' (one JSON object per line) or 'chrome' (chrome://tracing / Perfetto). "
+                             "Default: chrome for a .json file, jsonl otherwise.")
+    args = parser.parse_args(argv)
+    default_specs = PREFETCH_SPECS if args.command == "prefetch" else ["latest"]
+    args.gradle_versions = [spec.strip() for specs in (args.gradle_version or default_specs) for spec in specs.split(",") if spec.strip()] or default_specs
+    if len(args.gradle_versions) > 1 and args.command not in ("provision", "prefetch", "pin", "unpin"):
+        parser.error(f"'{args.command}' takes one --gradle-version; use 'provision' to install several")
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.interval < 0:
+        parser.error("--interval cannot be negative")
+    args.gradle_version = args.gradle_versions[0]
+    return args
+
+class GradleInstall:
+    # Names and paths of one version's installation. The interactive installer keeps its
+    # single install in the module globals (see update_global_config); provisioning
+    # several versions side by side gives each pool thread one of these instead.
+
+    def __init__(self, version, install_dir=None, temp_dir=None):
+        self.version = version
+        self.zip_name = f"gradle-{version}-bin.zip"
+        self.url = f"{SERVICES_BASE_URL}/distributions/{self.zip_name}"
+        self.mirror_urls = [mirror_url(mirror, self.zip_name) for mirror in DOWNLOAD_MIRRORS]
+        self.zip_path = os.path.join(temp_dir or TEMP_DIR, self.zip_name)
+        self.zip_sha256 = None
+        self.install_dir = install_dir or INSTALL_DIR
+        self.home_dir_name = f"gradle-{version}"
+        self.home = os.path.join(self.install_dir, self.home_dir_name)
 
 def update_global_config(version_str):
     global GRADLE_VERSION, DOWNLOAD_URL, GRADLE_ZIP_NAME, GRADLE_ZIP_PATH
-    global GRADLE_HOME_DIR_NAME, GRADLE_HOME, INSTALL_DIR
+    global GRADLE_HOME_DIR_NAME, GRADLE_HOME, INSTALL_DIR, DOWNLOAD_MIRROR_URLS
+
+    install = GradleInstall(version_str)
+    GRADLE_VERSION, DOWNLOAD_URL, GRADLE_ZIP_NAME = install.version, install.url, install.zip_name
+    DOWNLOAD_MIRROR_URLS, GRADLE_ZIP_PATH = install.mirror_urls, install.zip_path
+    GRADLE_HOME_DIR_NAME, GRADLE_HOME = install.home_dir_name, install.home
+    return install
+
+class DownloadError(Exception):
+    pass
+
+class RemoteChangedError(DownloadError):
+    pass
+
+def mirror_url(mirror, file_name):
+    # A mirror is the URL of a directory holding the distributions, or a local or UNC path.
+    if "://" not in mirror:
+        mirror = "file:" + urllib.request.pathname2url(os.path.abspath(mirror))
+    return f"{mirror.rstrip('/')}/{file_name}"
+
+def _file_url_path(url):
+    parsed = urllib.parse.urlsplit(url)
+    path = urllib.request.url2pathname(parsed.path)
+    return f"\\\\{parsed.netloc}{path}" if parsed.netloc and parsed.netloc != "localhost" else path
+
+def _if_range_header(etag, last_modified):
+    # If-Range only accepts strong validators; weak ETags would force a full 200 every time.
+    if etag and not etag.startswith("W/"):
+        return etag
+    return last_modified
+
+def probe_download(url, session=None, probe_bytes=1, timeout=DOWNLOAD_TIMEOUT):
+    # A one-byte range request tells us the size, whether ranges are honoured, the
+    # validators for If-Range and where redirects end up, so the segment workers
+    # can skip the redirect hops. Mirror probes read a few more bytes to time them.
+    if url.startswith("file:"):
+        try:
+            with open(_file_url_path(url), "rb") as f:
+                f.read(probe_bytes)
+                stat = os.fstat(f.fileno())
+        except OSError as e:
+            raise DownloadError(f"Cannot read {_file_url_path(url)}: {e}") from e
+        return {"url": url, "size": stat.st_size, "ranges": True, "etag": None,
+                "last_modified": email.utils.formatdate(stat.st_mtime, usegmt=True)}
+    http = session or requests
+    trace_dns(url)
+    with TRACE.span("probe", "network", url=url) as span, \
+            http.get(url, headers={"Range": f"bytes=0-{probe_bytes - 1}"}, stream=True, timeout=timeout) as r:
+        span.update(status=r.status_code, ttfb_ms=r.elapsed.total_seconds() * 1000)
+        r.raise_for_status()
+        info = {
+            "url": r.url or url, "size": int(r.headers.get("Content-Length", 0) or 0), "ranges": False,
+            "etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified"),
+        }
+        # A 200 here means the server ignored our Range header, whatever Accept-Ranges claims.
+        if r.status_code == 206:
+            total = r.headers.get("Content-Range", "").rpartition("/")[2]
+            if total.isdigit():
+                info["size"] = int(total)
+                info["ranges"] = True
+            for _ in r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                pass
+        return info
+
+def probe_mirrors(urls, expected_sha256=None):
+    # Probes every mirror at once: a MIRROR_PROBE_BYTES range request (connection
+    # latency plus a taste of the bandwidth) and its published .sha256. Mirrors that
+    # publish another digest than expected_sha256 (or, without one, than most of the
+    # others), or serve another size, are rejected. Returns (usable sources fastest
+    # first, [(url, reason)] rejected, agreed sha256 or None).
+    def probe(url):
+        started = time.perf_counter()
+        info = probe_download(url, probe_bytes=MIRROR_PROBE_BYTES, timeout=MIRROR_PROBE_TIMEOUT)
+        info["seconds"] = time.perf_counter() - started
+        info["mirror"] = url
+        info["sha256"] = fetch_published_sha256(url)
+        return info
+
+    sources, rejected = [], []
+    with ThreadPoolExecutor(max_workers=len(urls), thread_name_prefix="gradle-probe") as pool:
+        futures = [(url, pool.submit(probe, url)) for url in urls]
+        for url, future in futures:
+            try:
+                sources.append(future.result())
+            except (requests.RequestException, DownloadError) as e:
+                rejected.append((url, f"unreachable ({e})"))
+    published = [source["sha256"] for source in sources if source["sha256"]]
+    agreed_sha256 = (expected_sha256 or "").lower() or max(published, key=published.count, default=None)
+    sizes = [source["size"] for source in sources if source["size"] and (not agreed_sha256 or source["sha256"] == agreed_sha256)]
+    agreed_size = max(sizes, key=sizes.count, default=None)
+    usable = []
+    for source in sources:
+        if agreed_sha256 and source["sha256"] and source["sha256"] != agreed_sha256:
+            rejected.append((source["mirror"], f"publishes SHA-256 {source['sha256']}, expected {agreed_sha256}"))
+        elif agreed_size and source["size"] and source["size"] != agreed_size:
+            rejected.append((source["mirror"], f"serves {source['size']} bytes, expected {agreed_size}"))
+        else:
+            usable.append(source)
+    usable.sort(key=lambda source: source["seconds"])
+    return usable, rejected, agreed_sha256
+
+class MirrorPool:
+    # The sources of one download, fastest first. Segment workers read from the first;
+    # when it fails it is dropped and their unfinished ranges continue on the next one,
+    # so a dying mirror costs a reconnect, not the bytes already on disk.
+
+    def __init__(self, sources, on_mirror=None):
+        self.sources = list(sources)
+        self.on_mirror = on_mirror
+        self._lock = threading.Lock()
+
+    def current(self):
+        with self._lock:
+            return self.sources[0]
+
+    def fail(self, source, error):
+        # Returns False when source is the last one left (it is kept, the caller gives up).
+        with self._lock:
+            if source in self.sources:
+                if len(self.sources) == 1:
+                    return False
+                self.sources.remove(source)
+                replacement = self.sources[0]
+            elif self.sources:
+                return True # Another worker already moved on.
+            else:
+                return False
+        TRACE.count("download.failovers")
+        if self.on_mirror:
+            self.on_mirror("failover", source.get("mirror", source["url"]), f"{error}; continuing from {replacement.get('mirror', replacement['url'])}")
+        return True
+
+class RateLimiter:
+    # A bytes-per-second budget shared by several threads, e.g. every download (or every
+    # extraction) of a provisioning run. consume() books the bytes and sleeps off any
+    # debt, so all callers together stay at the rate however many there are.
+
+    def __init__(self, rate):
+        self.rate = float(rate)
+        self._capacity = max(self.rate / 4, 64 * 1024) # Burst: a quarter second's worth
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_megabytes(cls, megabytes_per_second):
+        return cls(megabytes_per_second * 1024 * 1024) if megabytes_per_second else None
+
+    def consume(self, amount):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self.rate) - amount
+            self._updated = now
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0
+        if delay:
+            time.sleep(delay)
+
+def split_ranges(total_size, segments):
+    segments = max(1, min(segments, -(-total_size // DOWNLOAD_MIN_SEGMENT_SIZE)))
+    base = total_size // segments
+    ranges = []
+    start = 0
+    for i in range(segments):
+        end = total_size - 1 if i == segments - 1 else start + base - 1
+        ranges.append((start, end))
+        start = end + 1
+    return ranges
+
+def merge_ranges(ranges):
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+def missing_ranges(completed, total_size):
+    missing = []
+    position = 0
+    for start, end in merge_ranges(completed):
+        if start > position:
+            missing.append((position, start - 1))
+        position = max(position, end + 1)
+    if position < total_size:
+        missing.append((position, total_size - 1))
+    return missing
+
+class ResumeState:
+    # Sidecar next to the .part file recording what has safely reached the disk.
+    # Workers write unbuffered, so every range marked here is already in the file.
+
+    def __init__(self, state_path, info):
+        self.state_path = state_path
+        self.url = info["url"]
+        self.size = info["size"]
+        self.etag = info.get("etag")
+        self.last_modified = info.get("last_modified")
+        self.completed = []
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+
+    @classmethod
+    def load(cls, state_path, part_path, info):
+        state = cls(state_path, info)
+        try:
+            with open(state_path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return state
+        same_remote = (
+            saved.get("size") == info["size"]
+            and (saved.get("etag") == info.get("etag") or not info.get("etag"))
+            and (saved.get("last_modified") == info.get("last_modified") or not info.get("last_modified"))
+            and (info.get("etag") or info.get("last_modified"))
+        )
+        if same_remote and os.path.exists(part_path) and os.path.getsize(part_path) == info["size"]:
+            state.completed = merge_ranges(saved.get("completed", []))
+        return state
+
+    @property
+    def if_range(self):
+        return _if_range_header(self.etag, self.last_modified)
+
+    def completed_bytes(self):
+        with self._lock:
+            return sum(end - start + 1 for start, end in self.completed)
+
+    def mark(self, start, end):
+        with self._lock:
+            self.completed = merge_ranges(self.completed + [[start, end]])
+            due = time.monotonic() - self._last_save >= DOWNLOAD_STATE_SAVE_INTERVAL
+        if due:
+            self.save()
+
+    def save(self):
+        with self._lock:
+            data = {
+                "url": self.url, "size": self.size, "etag": self.etag,
+                "last_modified": self.last_modified, "completed": self.completed,
+            }
+            self._last_save = time.monotonic()
+            tmp_path = self.state_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.state_path)
+
+class ChecksumMismatchError(DownloadError):
+    pass
+
+class DownloadCancelledError(DownloadError):
+    pass
+
+class OrderedHasher:
+    # SHA-256 has to see the bytes in file order, but segments arrive out of order.
+    # Chunks ahead of the hashed frontier are buffered in memory up to a limit; past
+    # that (and for bytes already on disk from an earlier run) only the range is
+    # remembered and read back from the file once the frontier reaches it.
+
+    def __init__(self, path, on_disk=()):
+        self.path = path
+        self._sha256 = hashlib.sha256()
+        self._frontier = 0
+        self._buffered = {}
+        self._buffered_bytes = 0
+        self._deferred = {start: end - start + 1 for start, end in on_disk}
+        self._lock = threading.Lock()
+        self._drain()
+
+    def feed(self, offset, data):
+        with self._lock:
+            if offset == self._frontier:
+                self._sha256.update(data)
+                self._frontier += len(data)
+            elif self._buffered_bytes + len(data) <= HASH_BUFFER_LIMIT:
+                self._buffered[offset] = data
+                self._buffered_bytes += len(data)
+            else:
+                self._deferred[offset] = len(data)
+            self._drain()
+
+    def _drain(self):
+        while True:
+            data = self._buffered.pop(self._frontier, None)
+            if data is not None:
+                self._buffered_bytes -= len(data)
+                self._sha256.update(data)
+                self._frontier += len(data)
+                continue
+            length = self._deferred.pop(self._frontier, None)
+            if length is None:
+                return
+            with open(self.path, "rb") as f:
+                f.seek(self._frontier)
+                remaining = length
+                while remaining:
+                    block = f.read(min(remaining, 1024 * 1024))
+                    if not block:
+                        raise DownloadError(f"{self.path} is shorter than expected while hashing.")
+                    self._sha256.update(block)
+                    remaining -= len(block)
+            self._frontier += length
+
+    @property
+    def hashed_bytes(self):
+        return self._frontier
+
+    def hexdigest(self):
+        return self._sha256.hexdigest()
+
+def fetch_published_sha256(url):
+    try:
+        if url.startswith("file:"):
+            with open(_file_url_path(url) + ".sha256", "r", encoding="ascii", errors="replace") as f:
+                text = f.read()
+        else:
+            with TRACE.span("GET .sha256", "network", url=url + ".sha256") as span:
+                response = requests.get(url + ".sha256", timeout=15)
+                span["status"] = response.status_code
+            response.raise_for_status()
+            text = response.text
+    except (OSError, requests.RequestException):
+        return None
+    checksum = text.strip().split()[0].lower() if text.strip() else ""
+    if len(checksum) == 64 and all(c in "0123456789abcdef" for c in checksum):
+        return checksum
+    return None
+
+def _verify_sha256(digest, expected_sha256, *stale_paths):
+    if expected_sha256 and digest != expected_sha256.lower():
+        for stale_path in stale_paths:
+            if os.path.exists(stale_path): os.remove(stale_path)
+        raise ChecksumMismatchError(f"SHA-256 mismatch: expected {expected_sha256}, got {digest}.")
+
+def _report(progress, task_id, **kwargs):
+    if progress is not None and task_id is not None:
+        progress.update(task_id, **kwargs)
+
+@contextlib.contextmanager
+def _open_range(url, start, end, if_range=None):
+    # Yields an iterator over the bytes start..end of an http(s) or file URL.
+    if url.startswith("file:"):
+        with open(_file_url_path(url), "rb") as f:
+            f.seek(start)
+            yield iter(lambda: f.read(min(DOWNLOAD_CHUNK_SIZE, end + 1 - f.tell())), b"")
+        return
+    headers = {"Range": f"bytes={start}-{end}"}
+    if if_range:
+        headers["If-Range"] = if_range
+    with requests.Session() as session:
+        with session.get(url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as r:
+            r.raise_for_status()
+            if r.status_code != 206:
+                # With If-Range a full 200 response means the file changed under us.
+                raise RemoteChangedError(f"Server returned HTTP {r.status_code} for bytes {start}-{end}; the remote file has changed.")
+            yield r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE)
+
+def _fetch_range(state, hasher, part_path, start, end, cancel_events, progress=None, task_id=None, observer=None, source=None, throttle=None):
+    # source: the probe_download() result of the mirror to read from (default: the state's URL).
+    url, if_range = (source["url"], _if_range_header(source["etag"], source["last_modified"])) if source else (state.url, state.if_range)
+    requested = time.perf_counter()
+    with TRACE.span("range", "download", url=url, start=start, end=end) as span, _open_range(url, start, end, if_range) as chunks:
+        position = start
+        with open(part_path, "r+b", buffering=0) as f:
+            f.seek(start)
+            for chunk in chunks:
+                if any(event.is_set() for event in cancel_events):
+                    return
+                if not chunk:
+                    continue
+                if position == start:
+                    span["ttfb_ms"] = (time.perf_counter() - requested) * 1000
+                chunk = chunk[:end + 1 - position]
+                f.write(chunk)
+                hasher.feed(position, chunk)
+                state.mark(position, position + len(chunk) - 1)
+                if observer is not None:
+                    observer.written(position, len(chunk))
+                position += len(chunk)
+                _report(progress, task_id, advance=len(chunk))
+                TRACE.count("download.bytes", len(chunk))
+                if throttle is not None:
+                    throttle.consume(len(chunk))
+                if position > end:
+                    break
+        span["bytes"] = position - start
+        if position <= end:
+            raise DownloadError(f"Connection closed early for bytes {start}-{end} (stopped at {position}).")
+
+def _fetch_range_failover(mirrors, state, hasher, part_path, start, end, cancel_events, progress=None, task_id=None, observer=None, throttle=None):
+    pending = [(start, end)]
+    while pending:
+        source = mirrors.current()
+        try:
+            for range_start, range_end in pending:
+                _fetch_range(state, hasher, part_path, range_start, range_end, cancel_events, progress, task_id, observer, source, throttle)
+            return
+        except RemoteChangedError:
+            raise
+        except (requests.RequestException, DownloadError) as e:
+            if any(event.is_set() for event in cancel_events) or not mirrors.fail(source, e):
+                raise
+        # Whatever reached the disk stays; only the rest of this segment moves to the next mirror.
+        pending = [(max(missing_start, start), min(missing_end, end)) for missing_start, missing_end in missing_ranges(state.completed, state.size)
+                   if missing_start <= end and missing_end >= start]
+
+def _download_single(url, dest_path, expected_sha256=None, progress=None, task_id=None, cancel_event=None, observer=None, throttle=None):
+    written = 0
+    part_path = dest_path + ".part"
+    sha256 = hashlib.sha256()
+    with TRACE.span("stream", "download", url=url) as span, requests.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT) as r:
+        span.update(status=r.status_code, ttfb_ms=r.elapsed.total_seconds() * 1000)
+        r.raise_for_status()
+        total_size = int(r.headers.get("content-length", 0) or 0)
+        if total_size:
+            _report(progress, task_id, total=total_size)
+        # Unbuffered, so an observer reading the .part file sees every byte it is told about.
+        with open(part_path, "wb", buffering=0) as f:
+            if observer is not None:
+                observer.attach(part_path, total_size, ranges=False, fresh=True)
+            for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                if cancel_event is not None and cancel_event.is_set():
+                    raise DownloadCancelledError("Download cancelled.")
+                if chunk:
+                    f.write(chunk)
+                    sha256.update(chunk)
+                    if observer is not None:
+                        observer.written(written, len(chunk))
+                    written += len(chunk)
+                    _report(progress, task_id, advance=len(chunk))
+                    TRACE.count("download.bytes", len(chunk))
+                    if throttle is not None:
+                        throttle.consume(len(chunk))
+        span["bytes"] = written
+    if total_size and written != total_size:
+        raise DownloadError(f"Expected {total_size} bytes but received {written}.")
+    if observer is not None:
+        observer.release()
+    digest = sha256.hexdigest()
+    _verify_sha256(digest, expected_sha256, part_path)
+    os.replace(part_path, dest_path)
+    return written, digest
+
+def _download_ranges(state, hasher, part_path, segments, mirrors, progress=None, task_id=None, cancel_event=None, observer=None, throttle=None):
+    pending = []
+    for start, end in missing_ranges(state.completed, state.size):
+        pending.extend((start + s, start + e) for s, e in split_ranges(end - start + 1, segments))
+    if not pending:
+        return
+    abort_event = threading.Event()
+    cancel_events = (abort_event,) if cancel_event is None else (abort_event, cancel_event)
+    with ThreadPoolExecutor(max_workers=min(segments, len(pending)), thread_name_prefix="gradle-dl") as pool:
+        futures = [pool.submit(_fetch_range_failover, mirrors, state, hasher, part_path, start, end, cancel_events, progress, task_id, observer, throttle)
+                   for start, end in pending]
+        try:
+            for future in futures:
+                future.result()
+        except BaseException:
+            abort_event.set()
+            raise
+        finally:
+            state.save()
+    if cancel_event is not None and cancel_event.is_set():
+        raise DownloadCancelledError("Download cancelled.")
+
+def _resume_source(state_path, sources):
+    # Prefer the mirror an interrupted download came from: its validators match the resume state.
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            saved_url = json.load(f).get("url")
+    except (OSError, ValueError):
+        return sources
+    return sorted(sources, key=lambda source: source["url"] != saved_url)
+
+def download_file(url, dest_path, segments=DOWNLOAD_SEGMENTS, expected_sha256=None, progress=None, task_id=None,
+                  retries=DOWNLOAD_RETRIES, on_retry=None, cancel_event=None, observer=None, tail_first=0,
+                  mirrors=(), on_mirror=None, throttle=None):
+    # Returns (size, sha256 hex digest). The digest is computed while the bytes are
+    # written, so checking it never costs a second pass over a fresh download.
+    # An observer is told about every byte range that reaches the .part file (see
+    # StreamingExtractor); tail_first fetches the last bytes (the ZIP central
+    # directory) before anything else. With mirrors (more URLs of the same file) the
+    # fastest source that agrees on the digest is used, and the others take over if
+    # it fails; on_mirror(event, url, detail) hears about each decision. A RateLimiter
+    # as throttle caps the bytes per second of all segments together.
+    part_path = dest_path + ".part"
+    state_path = part_path + ".json"
+    attempt = 0
+    while True:
+        try:
+            if mirrors:
+                sources, rejected, agreed_sha256 = probe_mirrors([url, *mirrors], expected_sha256)
+                for rejected_url, reason in rejected:
+                    if on_mirror: on_mirror("rejected", rejected_url, reason)
+                if not sources:
+                    raise DownloadError("No mirror can serve the download: " + "; ".join(f"{u}: {r}" for u, r in rejected))
+                expected_sha256 = agreed_sha256
+                if on_mirror: on_mirror("digest", None, agreed_sha256)
+            else:
+                sources = [probe_download(url)]
+            ranged = [source for source in sources if source["ranges"] and source["size"] > 0]
+            if not ranged:
+                return _download_single(sources[0]["url"], dest_path, expected_sha256, progress, task_id, cancel_event, observer, throttle)
+            pool = MirrorPool(_resume_source(state_path, ranged), on_mirror)
+            info = pool.current()
+            if mirrors and on_mirror:
+                on_mirror("selected", info["mirror"], f"{info['seconds'] * 1000:.0f} ms probe, {len(ranged) - 1} fallback(s)")
+
+            state = ResumeState.load(state_path, part_path, info)
+            if not state.completed:
+                with open(part_path, "wb") as f:
+                    f.truncate(state.size)
+            hasher = OrderedHasher(part_path, on_disk=state.completed)
+            _report(progress, task_id, total=state.size, completed=state.completed_bytes())
+            if observer is not None:
+                observer.attach(part_path, state.size, ranges=True, fresh=not state.completed)
+                for start, end in state.completed:
+                    observer.written(start, end - start + 1)
+            if tail_first:
+                tail_start = max(0, state.size - tail_first)
+                for start, end in missing_ranges(state.completed, state.size):
+                    if end >= tail_start:
+                        _fetch_range_failover(pool, state, hasher, part_path, max(start, tail_start), end,
+                                              (cancel_event or threading.Event(),), progress, task_id, observer, throttle)
+            _download_ranges(state, hasher, part_path, max(1, segments), pool, progress, task_id, cancel_event, observer, throttle)
+            if state.completed_bytes() != state.size or hasher.hashed_bytes != state.size:
+                raise DownloadError(f"Expected {state.size} bytes but only {state.completed_bytes()} were written.")
+            if observer is not None:
+                observer.release()
+            digest = hasher.hexdigest()
+            _verify_sha256(digest, expected_sha256, part_path, state_path)
+            os.replace(part_path, dest_path)
+            os.remove(state_path)
+            return state.size, digest
+        except (ChecksumMismatchError, DownloadCancelledError):
+            raise
+        except (requests.RequestException, DownloadError) as e:
+            if observer is not None:
+                observer.release()
+            status = e.response.status_code if isinstance(e, requests.HTTPError) and e.response is not None else None
+            if status and 400 <= status < 500 and status not in (408, 429):
+                raise # Missing or forbidden; retrying will not change that.
+            if isinstance(e, RemoteChangedError):
+                for stale_path in (part_path, state_path):
+                    if os.path.exists(stale_path): os.remove(stale_path)
+            attempt += 1
+            if attempt > retries:
+                raise
+            retry_after = e.response.headers.get("Retry-After", "") if status in (429, 503) else ""
+            delay = min(DOWNLOAD_BACKOFF_MAX, max(DOWNLOAD_BACKOFF_BASE * 2 ** (attempt - 1), int(retry_after) if retry_after.isdigit() else 0))
+            TRACE.count("download.retries")
+            TRACE.mark("download retry", "download", attempt=attempt, delay=delay, error=str(e))
+            if on_retry:
+                on_retry(attempt, delay, e)
+            if cancel_event is not None and cancel_event.wait(delay):
+                raise DownloadCancelledError("Download cancelled.")
+            elif cancel_event is None:
+                time.sleep(delay)
+
+def run_in_background(func, *args, **kwargs):
+    # Like ThreadPoolExecutor.submit, but on a daemon thread: an abandoned speculative
+    # download must never keep the interpreter alive after the user aborts.
+    future = Future()
+    def runner():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(func(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+    threading.Thread(target=runner, name=f"gradle-{func.__name__}", daemon=True).start()
+    return future
+
+class BackgroundDownload:
+    # Runs checksum lookup and download_file() off the main thread. It stands in for the
+    # rich Progress object until a real progress bar attaches, so the download can start
+    # while the user is still answering prompts.
+
+    def __init__(self, url, dest_path, extractor=None, mirrors=()):
+        self.url = url
+        self.dest_path = dest_path
+        self.extractor = extractor
+        self.mirrors = list(mirrors)
+        self.mirror_events = []
+        self.total = None
+        self.completed = 0
+        self.expected_sha256 = None
+        self.cancel_event = threading.Event()
+        self.future = None
+        self._retries = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        os.makedirs(os.path.dirname(self.dest_path), exist_ok=True)
+        self.future = run_in_background(self._run)
+        return self
+
+    def _run(self):
+        with TRACE.span("download", "download", url=self.url, mirrors=len(self.mirrors), streaming=self.extractor is not None) as span:
+            span["size"], span["sha256"] = self._download()
+            return span["size"], span["sha256"]
+
+    def _download(self):
+        self.expected_sha256 = fetch_published_sha256(self.url)
+        try:
+            size, digest = download_file(self.url, self.dest_path, expected_sha256=self.expected_sha256, progress=self,
+                                         task_id=0, on_retry=self._on_retry, cancel_event=self.cancel_event,
+                                         observer=self.extractor,
+                                         tail_first=StreamingExtractor.TAIL_SIZE if self.extractor else 0,
+                                         mirrors=self.mirrors, on_mirror=self._on_mirror)
+        except BaseException:
+            if self.extractor is not None:
+                self.extractor.abort()
+            raise
+        return size, digest
+
+    def update(self, task_id, total=None, completed=None, advance=None, **kwargs):
+        with self._lock:
+            if total is not None: self.total = total
+            if completed is not None: self.completed = completed
+            if advance: self.completed += advance
+
+    def _on_retry(self, attempt, delay, error):
+        with self._lock:
+            self._retries.append((attempt, delay, error))
+
+    def _on_mirror(self, event, url, detail):
+        with self._lock:
+            if event == "digest":
+                self.expected_sha256 = self.expected_sha256 or detail # The mirrors agreed on one without the origin.
+            else:
+                self.mirror_events.append((event, url, detail))
+
+    def pop_mirror_events(self):
+        with self._lock:
+            events, self.mirror_events = self.mirror_events, []
+        return events
+
+    def pop_retries(self):
+        with self._lock:
+            retries, self._retries = self._retries, []
+        return retries
+
+    def wait(self, timeout=None):
+        try:
+            self.future.exception(timeout=timeout)
+            return True
+        except FuturesTimeoutError:
+            return False
+
+    def result(self):
+        return self.future.result()
+
+    def cancel(self, timeout=5):
+        # Let the workers notice the flag and save resume state before the process exits.
+        self.cancel_event.set()
+        if self.future is not None:
+            self.wait(timeout)
+
+def _cache_paths(cache_dir=None):
+    cache_dir = cache_dir or CACHE_DIR
+    return cache_dir, os.path.join(cache_dir, "distributions"), os.path.join(cache_dir, "index.json")
+
+class CacheLockTimeout(TimeoutError):
+    pass
+
+class _CacheLock:
+    # Lock file guarding index.json, so several machines can share one cache directory
+    # (e.g. on a network share). A lock older than CACHE_LOCK_STALE_SECONDS is assumed
+    # to belong to a crashed process and is broken.
 
-    GRADLE_VERSION = version_str
-    DOWNLOAD_URL = f"https://services.gradle.org/distributions/gradle-{GRADLE_VERSION}-bin.zip"
-    GRADLE_ZIP_NAME = f"gradle-{GRADLE_VERSION}-bin.zip"
-    GRADLE_ZIP_PATH = os.path.join(TEMP_DIR, GRADLE_ZIP_NAME)
-    GRADLE_HOME_DIR_NAME = f"gradle-{GRADLE_VERSION}"
-    GRADLE_HOME = os.path.join(INSTALL_DIR, GRADLE_HOME_DIR_NAME)
+    def __init__(self, cache_dir):
+        self.lock_path = os.path.join(cache_dir, "index.lock")
+
+    def __enter__(self):
+        deadline = time.monotonic() + CACHE_LOCK_TIMEOUT
+        while True:
+            try:
+                fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, str(os.getpid()).encode("ascii"))
+                os.close(fd)
+                return self
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.lock_path) > CACHE_LOCK_STALE_SECONDS:
+                        os.remove(self.lock_path)
+                        continue
+                except OSError:
+                    continue
+                if time.monotonic() > deadline:
+                    raise CacheLockTimeout(f"Timed out waiting for cache lock {self.lock_path}")
+                time.sleep(0.05)
+
+    def __exit__(self, *exc_info):
+        try: os.remove(self.lock_path)
+        except OSError: pass
+
+def _load_cache_index(index_path):
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+    index.setdefault("versions", {})
+    index.setdefault("blobs", {})
+    return index
+
+def _save_cache_index(index_path, index):
+    tmp_path = f"{index_path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=1, sort_keys=True)
+    for attempt in range(5):
+        try:
+            os.replace(tmp_path, index_path)
+            return
+        except PermissionError:
+            # Windows refuses while a lock-free reader (cache_lookup(touch=False)) has it open.
+            if attempt == 4:
+                raise
+            time.sleep(0.05 * (attempt + 1))
+
+def is_cached_distribution(path, cache_dir=None):
+    _, blobs_dir, _ = _cache_paths(cache_dir)
+    return os.path.normcase(os.path.dirname(os.path.abspath(path))) == os.path.normcase(os.path.abspath(blobs_dir))
+
+def cache_lookup(version, sha256=None, cache_dir=None, touch=True):
+    # With touch=False the index is read without the lock (it is only ever replaced
+    # whole) and the LRU time is left alone; the caller refreshes it with cache_touch().
+    cache_dir, blobs_dir, index_path = _cache_paths(cache_dir)
+    if not os.path.isdir(blobs_dir):
+        return None, None
+    with _CacheLock(cache_dir) if touch else contextlib.nullcontext():
+        index = _load_cache_index(index_path)
+        sha256 = (sha256 or index["versions"].get(version) or "").lower()
+        entry = index["blobs"].get(sha256)
+        blob_path = os.path.join(blobs_dir, f"{sha256}.zip")
+        if not entry or not os.path.isfile(blob_path) or os.path.getsize(blob_path) != entry.get("size"):
+            return None, None
+        if touch:
+            entry["last_used"] = time.time()
+            _save_cache_index(index_path, index)
+    return blob_path, sha256
+
+def cache_touch(sha256, cache_dir=None):
+    # Marks a blob as recently used, so the LRU eviction in cache_insert() keeps it.
+    cache_dir, _, index_path = _cache_paths(cache_dir)
+    with _CacheLock(cache_dir):
+        index = _load_cache_index(index_path)
+        entry = index["blobs"].get(sha256)
+        if entry:
+            entry["last_used"] = time.time()
+            _save_cache_index(index_path, index)
+
+def cache_insert(zip_path, version, sha256, cache_dir=None, max_bytes=None):
+    cache_dir, blobs_dir, index_path = _cache_paths(cache_dir)
+    os.makedirs(blobs_dir, exist_ok=True)
+    sha256 = sha256.lower()
+    blob_path = os.path.join(blobs_dir, f"{sha256}.zip")
+    if not os.path.isfile(blob_path):
+        # Stage under a unique name in the same directory, then rename: readers on other
+        # machines either see the complete blob or nothing.
+        tmp_path = f"{blob_path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        try:
+            os.link(zip_path, tmp_path)
+        except OSError:
+            shutil.copyfile(zip_path, tmp_path)
+        os.replace(tmp_path, blob_path)
+    with _CacheLock(cache_dir):
+        index = _load_cache_index(index_path)
+        index["versions"][version] = sha256
+        index["blobs"][sha256] = {"name": os.path.basename(zip_path), "size": os.path.getsize(blob_path), "last_used": time.time()}
+        evicted = _evict_cache(blobs_dir, index, CACHE_MAX_BYTES if max_bytes is None else max_bytes, keep=sha256)
+        _save_cache_index(index_path, index)
+    return blob_path, evicted
+
+def _evict_cache(blobs_dir, index, max_bytes, keep=None):
+    evicted = []
+    total = sum(entry.get("size", 0) for entry in index["blobs"].values())
+    for sha256, entry in sorted(index["blobs"].items(), key=lambda item: item[1].get("last_used", 0)):
+        if total <= max_bytes:
+            break
+        if sha256 == keep:
+            continue
+        try:
+            os.remove(os.path.join(blobs_dir, f"{sha256}.zip"))
+        except FileNotFoundError:
+            pass
+        except OSError:
+            continue # Still open elsewhere (e.g. another machine extracting it); try next time.
+        total -= entry.get("size", 0)
+        del index["blobs"][sha256]
+        evicted.append(sha256)
+    for version, sha256 in list(index["versions"].items()):
+        if sha256 not in index["blobs"]:
+            del index["versions"][version]
+    return evicted
+
+def archive_member_path(dest_dir, member):
+    # Same sanitising as ZipFile._extract_member: no absolute paths, drive letters or "..".
+    arcname = member.filename.replace("/", os.path.sep)
+    if os.path.altsep:
+        arcname = arcname.replace(os.path.altsep, os.path.sep)
+    arcname = os.path.splitdrive(arcname)[1]
+    arcname = os.path.sep.join(part for part in arcname.split(os.path.sep) if part not in ("", os.path.curdir, os.path.pardir))
+    if os.path.sep == "\\":
+        arcname = zipfile.ZipFile._sanitize_windows_name(arcname, os.path.sep)
+    return os.path.normpath(os.path.join(dest_dir, arcname))
+
+def _restore_metadata(path, member):
+    mode = (member.external_attr >> 16) & 0o7777
+    if member.create_system == 3 and mode and not member.is_dir():
+        try:
+            os.chmod(path, mode)
+        except OSError:
+            pass
+    timestamp = time.mktime(member.date_time + (0, 0, -1))
+    try:
+        os.utime(path, (timestamp, timestamp))
+    except OSError:
+        pass
+
+def _extract_member(zip_path, handles, opened, member, target_path, progress=None, task_id=None, throttle=None):
+    # One ZipFile (and so one OS file handle) per worker thread; ZipFile objects keep a
+    # shared file position and must not be used from several threads at once.
+    archive = getattr(handles, "archive", None)
+    if archive is None:
+        archive = handles.archive = zipfile.ZipFile(zip_path, "r")
+        opened.append(archive)
+    with archive.open(member) as source, open(target_path, "wb") as target:
+        if member.file_size:
+            target.truncate(member.file_size) # Preallocate so NTFS can place the file in one extent.
+        while True:
+            block = source.read(EXTRACT_BLOCK_SIZE)
+            if not block:
+                break
+            target.write(block)
+            _report(progress, task_id, advance=len(block))
+            if throttle is not None:
+                throttle.consume(len(block))
+    _restore_metadata(target_path, member)
+    TRACE.count("extract.files")
+    TRACE.count("extract.bytes_written", member.file_size)
+    return member.file_size
+
+def _relative_member_name(member):
+    # "gradle-8.14/lib/foo.jar" -> "lib/foo.jar": the same file across two releases.
+    return member.filename.partition("/")[2]
+
+def archive_fingerprints(zip_path):
+    with zipfile.ZipFile(zip_path, "r") as archive:
+        return {_relative_member_name(member): (member.file_size, member.CRC, time.mktime(member.date_time + (0, 0, -1)))
+                for member in archive.infolist() if not member.is_dir()}
+
+def file_crc32(path):
+    checksum = 0
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(EXTRACT_BLOCK_SIZE)
+            if not block:
+                return checksum
+            checksum = zlib.crc32(block, checksum)
+
+class ReuseIndex:
+    # Finds files of a previous installation that are byte-identical to entries of the
+    # archive being installed. With fingerprints (size/CRC/mtime per file, from the
+    # previous install's manifest or cached archive) most entries are decided from a stat() call;
+    # without them a candidate of the right size is confirmed by its CRC-32.
+
+    def __init__(self, previous_home, fingerprints=None):
+        self.previous_home = previous_home
+        self.fingerprints = fingerprints or {}
+
+    def candidate(self, member):
+        relative_name = _relative_member_name(member)
+        if not relative_name or member.is_dir():
+            return None
+        fingerprint = self.fingerprints.get(relative_name)
+        if fingerprint and (fingerprint[0] != member.file_size or fingerprint[1] != member.CRC):
+            return None
+        source_path = os.path.join(self.previous_home, *relative_name.split("/"))
+        try:
+            if os.path.getsize(source_path) != member.file_size:
+                return None
+        except OSError:
+            return None
+        return source_path
+
+    def verify(self, member, source_path):
+        fingerprint = self.fingerprints.get(_relative_member_name(member))
+        if fingerprint and abs(os.path.getmtime(source_path) - fingerprint[2]) <= 2: # ZIP times have 2s resolution
+            return True # Untouched since it was installed with the same CRC.
+        return file_crc32(source_path) == member.CRC
+
+def reuse_file(source_path, target_path):
+    # Hardlink when possible: no data is written at all. A hardlinked file shares content
+    # and timestamps with the previous installation, so its metadata is left alone (the
+    # previous install's manifest would otherwise report it as modified). Returns True
+    # when linked.
+    if os.path.exists(target_path):
+        os.remove(target_path)
+    try:
+        os.link(source_path, target_path)
+        return True
+    except OSError:
+        shutil.copy2(source_path, target_path)
+        return False
+
+def build_reuse_index(current_home, exclude=(), install_dir=None):
+    # exclude: homes that may be replaced while the index is in use (see provision_versions).
+    install_dir = install_dir or INSTALL_DIR
+    if not os.path.isdir(install_dir):
+        return None
+    skipped_homes = {os.path.normpath(home) for home in (current_home, *exclude)}
+    previous = []
+    for item_name in os.listdir(install_dir):
+        item_path = os.path.join(install_dir, item_name)
+        if item_name.startswith("gradle-") and os.path.isdir(item_path) and os.path.normpath(item_path) not in skipped_homes:
+            previous.append((version_sort_key(item_name[len("gradle-"):]), item_name[len("gradle-"):], item_path))
+    if not previous:
+        return None
+    _, previous_version, previous_home = max(previous)
+    manifest = load_install_manifest(previous_version, install_dir)
+    if manifest and os.path.normcase(os.path.normpath(manifest["home"])) == os.path.normcase(os.path.normpath(previous_home)):
+        return ReuseIndex(previous_home, {name: tuple(entry) for name, entry in manifest["files"].items()})
+    fingerprints = None
+    try:
+        cached_zip = cache_lookup(previous_version)[0]
+        if cached_zip:
+            fingerprints = archive_fingerprints(cached_zip)
+    except (OSError, TimeoutError, zipfile.BadZipFile):
+        pass
+    return ReuseIndex(previous_home, fingerprints)
+
+def _manifest_paths(install_dir=None):
+    manifest_dir = os.path.join(install_dir or INSTALL_DIR, MANIFEST_DIR_NAME)
+    return manifest_dir, os.path.join(manifest_dir, "manifests"), os.path.join(manifest_dir, "index.json")
+
+def _load_install_index(index_path):
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+    index.setdefault("installs", {})
+    return index
+
+def write_install_manifest(version, gradle_home, url, sha256, zip_path, install_dir=None):
+    # Records what was installed: one manifest per version with size, CRC-32 and the
+    # on-disk mtime of every file, plus a summary entry in index.json. Both are read
+    # back by status (size/mtime via stat) and by the next upgrade (as reuse fingerprints).
+    manifest_dir, manifests_dir, index_path = _manifest_paths(install_dir)
+    os.makedirs(manifests_dir, exist_ok=True)
+    files = {}
+    with zipfile.ZipFile(zip_path, "r") as archive:
+        for member in archive.infolist():
+            relative_name = _relative_member_name(member)
+            if member.is_dir() or not relative_name:
+                continue
+            stat = os.stat(os.path.join(gradle_home, *relative_name.split("/")))
+            files[relative_name] = [stat.st_size, member.CRC, stat.st_mtime]
+    manifest = {"version": version, "home": gradle_home, "url": url, "sha256": sha256,
+                "installed_at": time.time(), "files": files}
+    _save_cache_index(os.path.join(manifests_dir, f"gradle-{version}.json"), manifest)
+    with _CacheLock(manifest_dir):
+        index = _load_install_index(index_path)
+        pinned = index["installs"].get(version, {}).get("pinned") # A reinstall keeps the pin.
+        index["installs"][version] = {key: manifest[key] for key in ("home", "url", "sha256", "installed_at")}
+        if pinned:
+            index["installs"][version]["pinned"] = True
+        index["installs"][version].update(files=len(files), bytes=sum(entry[0] for entry in files.values()))
+        _save_cache_index(index_path, index)
+    return manifest
+
+def load_install_manifest(version, install_dir=None):
+    _, manifests_dir, _ = _manifest_paths(install_dir)
+    try:
+        with open(os.path.join(manifests_dir, f"gradle-{version}.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def installed_home(version, install_dir=None):
+    # Where version was installed: the home its manifest (or index entry) records, which
+    # may lie under another root than INSTALL_DIR now names, else gradle-<version> there.
+    manifest = load_install_manifest(version, install_dir) or \
+        _load_install_index(_manifest_paths(install_dir)[2])["installs"].get(version) or {}
+    if manifest.get("home") and os.path.isdir(manifest["home"]):
+        return manifest["home"]
+    return os.path.join(install_dir or INSTALL_DIR, f"gradle-{version}")
+
+def remove_install_record(version, install_dir=None):
+    manifest_dir, manifests_dir, index_path = _manifest_paths(install_dir)
+    if not os.path.isdir(manifest_dir):
+        return
+    with _CacheLock(manifest_dir):
+        index = _load_install_index(index_path)
+        if index["installs"].pop(version, None) is not None:
+            _save_cache_index(index_path, index)
+    try: os.remove(os.path.join(manifests_dir, f"gradle-{version}.json"))
+    except OSError: pass
+
+def set_install_pinned(version, pinned, install_dir=None):
+    # Pinned installs are never removed by cleanup (see plan_cleanup). Returns False
+    # when version has no index entry, i.e. was not installed by this script.
+    manifest_dir, _, index_path = _manifest_paths(install_dir)
+    if not os.path.isdir(manifest_dir):
+        return False
+    with _CacheLock(manifest_dir):
+        index = _load_install_index(index_path)
+        entry = index["installs"].get(version)
+        if entry is None:
+            return False
+        if pinned:
+            entry["pinned"] = True
+        else:
+            entry.pop("pinned", None)
+        _save_cache_index(index_path, index)
+    return True
+
+def pin_versions(specs, pinned=True):
+    failures = 0
+    for spec in specs:
+        version = _repair_version(spec, offline=True) # An installed version, the active one by default.
+        if version and set_install_pinned(version, pinned):
+            console.print(f"[success]Gradle {version} is {'pinned: cleanup will keep it' if pinned else 'no longer pinned'}.[/success]")
+        else:
+            console.print(f"[danger]Gradle {version or spec} was not installed by this script; nothing to {'pin' if pinned else 'unpin'}.[/danger]")
+            failures += 1
+    return failures == 0
+
+def check_install_files(manifest):
+    # stat() only: a file counts as modified when its size or mtime differs from the manifest.
+    missing, modified = [], []
+    for relative_name, (size, _, mtime) in manifest["files"].items():
+        try:
+            stat = os.stat(os.path.join(manifest["home"], *relative_name.split("/")))
+        except OSError:
+            missing.append(relative_name)
+            continue
+        if stat.st_size != size or abs(stat.st_mtime - mtime) > 0.001:
+            modified.append(relative_name)
+    return missing, modified
+
+def get_system_env_var(var_name):
+    try:
+        key = winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, r"SYSTEM\CurrentControlSet\Control\Session Manager\Environment", 0, winreg.KEY_READ)
+        try:
+            return winreg.QueryValueEx(key, var_name)[0]
+        finally:
+            winreg.CloseKey(key)
+    except OSError:
+        return None
+
+def install_status(install_dir=None, check_files=True):
+    # Everything comes from the index, the manifests and stat(); no process is started.
+    install_dir = install_dir or INSTALL_DIR
+    _, _, index_path = _manifest_paths(install_dir)
+    index = _load_install_index(index_path)
+    active_home = resolve_active_home(get_system_env_var("GRADLE_HOME"))
+    active_home = os.path.normcase(os.path.normpath(active_home)) if active_home else None
+    installs = []
+    for version, entry in index["installs"].items():
+        status = dict(entry, version=version, present=os.path.isdir(entry["home"]), missing=[], modified=[])
+        status["active"] = active_home == os.path.normcase(os.path.normpath(entry["home"]))
+        if check_files and status["present"]:
+            manifest = load_install_manifest(version, install_dir)
+            if manifest:
+                status["missing"], status["modified"] = check_install_files(manifest)
+        installs.append(status)
+    # gradle-* directories installed before manifests existed (or by hand) are listed without details.
+    recorded = {os.path.normcase(os.path.normpath(entry["home"])) for entry in index["installs"].values()}
+    if os.path.isdir(install_dir):
+        for item_name in os.listdir(install_dir):
+            item_path = os.path.join(install_dir, item_name)
+            if item_name.startswith("gradle-") and os.path.isdir(item_path) and os.path.normcase(os.path.normpath(item_path)) not in recorded:
+                installs.append({"version": item_name[len("gradle-"):], "home": item_path, "present": True, "unmanaged": True,
+                                 "active": active_home == os.path.normcase(os.path.normpath(item_path)),
+                                 "missing": [], "modified": []})
+    installs.sort(key=lambda status: version_sort_key(status["version"]), reverse=True)
+    return installs
+
+def print_status(install_dir=None):
+    started = time.perf_counter()
+    installs = install_status(install_dir)
+    console.print(f"Gradle installations in [path]{install_dir or INSTALL_DIR}[/path]:", style="info")
+    if not installs:
+        console.print("  No Gradle installations found.", style="info")
+    for status in installs:
+        marker = " ".join(filter(None, ["[success]* active[/success]" if status["active"] else "",
+                                        "[info]pinned[/info]" if status.get("pinned") else ""]))
+        if status.get("unmanaged"):
+            console.print(f"  [variable]{status['version']}[/variable] [path]{status['home']}[/path] {marker} [dim](not installed by this script, no manifest)[/dim]")
+            continue
+        console.print(f"  [variable]{status['version']}[/variable] [path]{status['home']}[/path] {marker}")
+        console.print(f"    {status['files']} files, {status['bytes'] / (1024 * 1024):.1f} MB, installed "
+                      f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(status['installed_at']))} from [link={status['url']}]{status['url']}[/link]")
+        if not status["present"]:
+            console.print("    [danger]Directory is missing.[/danger]")
+        elif status["missing"] or status["modified"]:
+            console.print(f"    [warning]{len(status['missing'])} file(s) missing, {len(status['modified'])} file(s) modified since installation.[/warning]")
+            for relative_name in (status["missing"] + status["modified"])[:10]:
+                console.print(f"      [path]{relative_name}[/path]")
+        else:
+            console.print("    [success]All files unchanged since installation.[/success]")
+    console.print(f"[dim]Answered from the install index in {(time.perf_counter() - started) * 1000:.0f} ms.[/dim]")
+    return installs
+
+def staging_dir_for(gradle_home_dir_name, install_dir=None):
+    # Same volume as the final tree, so promotion is a rename.
+    return os.path.join(install_dir or INSTALL_DIR, f".staging-{gradle_home_dir_name}")
+
+def promote_staged_tree(staging_dir, dest_dir):
+    # Moves every top-level entry of staging_dir into dest_dir with a rename, so a tree
+    # only becomes visible once it is complete. An existing entry of the same name is
+    # renamed aside first (Windows cannot rename over a directory); the displaced paths
+    # are returned for the caller to delete.
+    displaced = []
+    for name in os.listdir(staging_dir):
+        target_path = os.path.join(dest_dir, name)
+        if os.path.lexists(target_path):
+            aside_path = os.path.join(dest_dir, f".replaced-{name}-{os.getpid()}")
+            os.replace(target_path, aside_path)
+            displaced.append(aside_path)
+        os.replace(os.path.join(staging_dir, name), target_path)
+    os.rmdir(staging_dir)
+    return displaced
+
+def current_link_path(install_dir=None):
+    return os.path.join(install_dir or INSTALL_DIR, CURRENT_LINK_NAME)
+
+def _is_dir_link(path):
+    try:
+        return os.path.islink(path) or getattr(os.lstat(path), "st_reparse_tag", 0) == IO_REPARSE_TAG_MOUNT_POINT
+    except OSError:
+        return False
+
+def _create_dir_link(target_path, link_path):
+    # A junction needs no symlink privilege and works for every local volume.
+    try:
+        import _winapi
+        _winapi.CreateJunction(target_path, link_path)
+    except (ImportError, AttributeError):
+        os.symlink(target_path, link_path, target_is_directory=True)
+
+def _remove_dir_link(link_path):
+    try:
+        os.unlink(link_path)
+    except OSError:
+        os.rmdir(link_path) # Junctions (and directory symlinks on Windows) are removed like directories.
+
+def read_current_link(install_dir=None):
+    link_path = current_link_path(install_dir)
+    return os.path.realpath(link_path) if _is_dir_link(link_path) else None
+
+def point_current_link(gradle_home, install_dir=None):
+    # Repoints INSTALL_DIR\current at gradle_home: the new link is built under a temporary
+    # name and renamed over the old one, so "current" never refers to a partial tree.
+    # Returns the previous target (or None).
+    link_path = current_link_path(install_dir)
+    if os.path.lexists(link_path) and not _is_dir_link(link_path):
+        raise OSError(f"{link_path} exists and is not a link; move it away to let the installer manage it.")
+    previous_home = read_current_link(install_dir)
+    temp_link_path = f"{link_path}.tmp-{os.getpid()}"
+    if os.path.lexists(temp_link_path):
+        _remove_dir_link(temp_link_path)
+    _create_dir_link(gradle_home, temp_link_path)
+    try:
+        os.replace(temp_link_path, link_path)
+    except OSError:
+        # Windows refuses to rename over a directory entry, junctions included.
+        old_link_path = f"{link_path}.old-{os.getpid()}"
+        os.replace(link_path, old_link_path)
+        os.replace(temp_link_path, link_path)
+        _remove_dir_link(old_link_path)
+    manifest_dir, _, index_path = _manifest_paths(install_dir)
+    os.makedirs(manifest_dir, exist_ok=True)
+    with _CacheLock(manifest_dir):
+        index = _load_install_index(index_path)
+        current_version = os.path.basename(os.path.normpath(gradle_home))[len("gradle-"):]
+        if index.get("current") != current_version:
+            index["previous"], index["current"] = index.get("current"), current_version
+            _save_cache_index(index_path, index)
+    return previous_home
+
+def resolve_active_home(gradle_home):
+    # GRADLE_HOME normally names the "current" link; report the version directory behind it.
+    return os.path.realpath(gradle_home) if gradle_home and _is_dir_link(gradle_home) else gradle_home
+
+def _install_member(zip_path, handles, opened, member, target_path, reuse=None, progress=None, task_id=None, throttle=None):
+    # Returns (bytes, reused).
+    source_path = reuse.candidate(member) if reuse else None
+    if source_path and reuse.verify(member, source_path):
+        if not reuse_file(source_path, target_path):
+            _restore_metadata(target_path, member)
+        _report(progress, task_id, advance=member.file_size)
+        TRACE.count("extract.reused_files")
+        return member.file_size, True
+    return _extract_member(zip_path, handles, opened, member, target_path, progress, task_id, throttle), False
+
+def extract_archive(zip_path, dest_dir, workers=EXTRACT_WORKERS, members=None, progress=None, task_id=None, reuse=None, throttle=None):
+    # Returns per-phase timings and totals: "index" reads the central directory and
+    # creates the directory tree, "extract" decompresses in parallel, "finalize" stamps
+    # directory times (after their contents are written, or writing would reset them).
+    # With a ReuseIndex, entries identical to the previous install are linked instead.
+    # A RateLimiter as throttle caps the bytes written per second.
+    with TRACE.span("extract", "extract", archive=os.path.basename(zip_path), workers=workers) as span:
+        stats = _extract_archive(zip_path, dest_dir, workers, members, progress, task_id, reuse, throttle)
+        span.update(files=stats["files"], bytes=stats["bytes"], reused_files=stats["reused_files"])
+        return stats
+
+def _extract_archive(zip_path, dest_dir, workers, members, progress, task_id, reuse, throttle):
+    stats = {"files": 0, "directories": 0, "bytes": 0, "compressed_bytes": 0, "reused_files": 0, "reused_bytes": 0}
+    started = time.perf_counter()
+    with zipfile.ZipFile(zip_path, "r") as archive:
+        infos = archive.infolist() if members is None else members
+    dir_members, file_members = [], []
+    directories = set()
+    for member in infos:
+        target_path = archive_member_path(dest_dir, member)
+        if member.is_dir():
+            dir_members.append((member, target_path))
+            directories.add(target_path)
+        else:
+            file_members.append((member, target_path))
+            directories.add(os.path.dirname(target_path))
+    for directory in sorted(directories):
+        os.makedirs(directory, exist_ok=True)
+    stats["directories"] = len(directories)
+    stats["index_seconds"] = time.perf_counter() - started
+
+    # Largest entries first so one big JAR doesn't end up alone at the tail.
+    file_members.sort(key=lambda item: item[0].compress_size, reverse=True)
+    _report(progress, task_id, total=sum(member.file_size for member, _ in file_members))
+    phase_started = time.perf_counter()
+    handles = threading.local()
+    opened = []
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="gradle-unzip") as pool:
+            futures = [pool.submit(_install_member, zip_path, handles, opened, member, target_path, reuse, progress, task_id, throttle)
+                       for member, target_path in file_members]
+            for future in futures:
+                size, reused = future.result()
+                stats["bytes"] += size
+                if reused:
+                    stats["reused_files"] += 1
+                    stats["reused_bytes"] += size
+    finally:
+        for handle in opened:
+            handle.close()
+    stats["files"] = len(file_members)
+    stats["compressed_bytes"] = sum(member.compress_size for member, _ in file_members)
+    stats["extract_seconds"] = time.perf_counter() - phase_started
+
+    phase_started = time.perf_counter()
+    for member, target_path in sorted(dir_members, key=lambda item: item[1], reverse=True):
+        _restore_metadata(target_path, member)
+    stats["finalize_seconds"] = time.perf_counter() - phase_started
+    stats["total_seconds"] = time.perf_counter() - started
+    return stats
+
+def _check_member(member, target_path):
+    # None when the file matches its archive entry, otherwise the reason it does not.
+    try:
+        if os.path.getsize(target_path) != member.file_size:
+            return "size differs"
+        if file_crc32(target_path) != member.CRC:
+            return "CRC-32 differs"
+    except FileNotFoundError:
+        return "missing"
+    except OSError as e:
+        return f"unreadable ({e.strerror or e})"
+    return None
+
+def verify_install_tree(zip_path, dest_dir, workers=EXTRACT_WORKERS, progress=None, task_id=None):
+    # Checks every entry of the archive against what was extracted to dest_dir: size
+    # first, then CRC-32 read back with a worker pool. Returns [(member, reason)].
+    with zipfile.ZipFile(zip_path, "r") as archive:
+        members = archive.infolist()
+    damaged = []
+    file_members = []
+    for member in members:
+        target_path = archive_member_path(dest_dir, member)
+        if not member.is_dir():
+            file_members.append((member, target_path))
+        elif not os.path.isdir(target_path):
+            damaged.append((member, "missing"))
+    file_members.sort(key=lambda item: item[0].file_size, reverse=True)
+    _report(progress, task_id, total=sum(member.file_size for member, _ in file_members))
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="gradle-verify") as pool:
+        futures = [(member, pool.submit(_check_member, member, target_path)) for member, target_path in file_members]
+        for member, future in futures:
+            reason = future.result()
+            if reason:
+                damaged.append((member, reason))
+            _report(progress, task_id, advance=member.file_size)
+    return damaged
+
+def repair_install_tree(zip_path, dest_dir, damaged, workers=EXTRACT_WORKERS):
+    # Damaged files are removed before re-extraction: a file hardlinked from another
+    # install must get a new inode rather than be overwritten in place.
+    for member, _ in damaged:
+        target_path = archive_member_path(dest_dir, member)
+        if not member.is_dir() and os.path.lexists(target_path):
+            try: os.chmod(target_path, 0o666) # Clear the read-only attribute, or remove() fails on Windows.
+            except OSError: pass
+            os.remove(target_path)
+    return extract_archive(zip_path, dest_dir, workers=workers, members=[member for member, _ in damaged])
+
+def format_extraction_stats(stats):
+    # Rates cover only entries inflated after the download; streamed and reused entries are reported separately.
+    streamed_files = stats.get("streamed_files", 0)
+    reused_files = stats.get("reused_files", 0)
+    extracted_files = stats["files"] - streamed_files - reused_files
+    extracted_mb = (stats["bytes"] - stats.get("streamed_bytes", 0) - stats.get("reused_bytes", 0)) / (1024 * 1024)
+    extract_seconds = max(stats["extract_seconds"], 1e-6)
+    text = (f"{stats['files']} files, {stats['bytes'] / (1024 * 1024):.1f} MB in {stats['total_seconds']:.2f}s "
+            f"(index {stats['index_seconds'] * 1000:.0f} ms, extract {stats['extract_seconds']:.2f}s")
+    if extracted_files:
+        text += f" at {extracted_mb / extract_seconds:.1f} MB/s, {extracted_files / extract_seconds:.0f} files/s"
+    text += f", finalize {stats['finalize_seconds'] * 1000:.0f} ms)"
+    if streamed_files:
+        text += f"; {streamed_files} files were extracted while downloading"
+    if reused_files:
+        text += f"; {reused_files} unchanged files ({stats['reused_bytes'] / (1024 * 1024):.1f} MB) reused from the previous install"
+    return text
+
+class StreamingExtractor:
+    # Download observer that extracts ZIP entries into a staging directory as soon as
+    # their bytes are in the .part file. With range support the central directory is
+    # fetched first (see tail_first) and each entry is extracted once the span up to
+    # the next local header is covered. Without ranges the stream is sequential, so
+    # local file headers are parsed as they arrive. Nothing leaves staging until
+    # finish() runs, i.e. after the SHA-256 of the whole archive has been verified.
+    # With a ReuseIndex, entries identical to the previous install are linked from it
+    # as soon as their CRC is known, without waiting for their bytes. An inactive
+    # extractor only records what arrived; nothing is written until activate().
+
+    TAIL_SIZE = 1024 * 1024
+
+    def __init__(self, staging_dir, workers=EXTRACT_WORKERS, reuse=None, active=True):
+        self.staging_dir = staging_dir
+        self.workers = workers
+        self.reuse = reuse
+        self.active = active
+        self.part_path = None
+        self.size = 0
+        self.mode = None
+        self.stats = {"streamed_files": 0, "streamed_bytes": 0, "reused_files": 0, "reused_bytes": 0}
+        self._lock = threading.Lock()
+        self._pool = None
+        self._futures = []
+        self._handles = threading.local()
+        self._opened = []
+        self._coverage = []
+        self._reset_entries()
+
+    def _reset_entries(self):
+        self._entries = None # (start, end, member, target_path) sorted by start, once the central directory is read
+        self._entry_starts = []
+        self._extracted = set() # Archive names handed to a worker; failures are removed again
+        self._sequential_position = 0
+
+    def attach(self, part_path, size, ranges, fresh):
+        self.release()
+        with self._lock:
+            self.part_path = part_path
+            self.size = size
+            self.mode = "central" if ranges else "sequential"
+            if fresh or not self._coverage:
+                self._coverage = []
+                self._reset_entries()
+                self.stats = {"streamed_files": 0, "streamed_bytes": 0, "reused_files": 0, "reused_bytes": 0}
+                if self.active and os.path.exists(self.staging_dir):
+                    shutil.rmtree(self.staging_dir)
+            if self.active:
+                self._start_pool()
+
+    def _start_pool(self):
+        os.makedirs(self.staging_dir, exist_ok=True)
+        self._pool = ThreadPoolExecutor(max_workers=max(1, self.workers), thread_name_prefix="gradle-stream")
+
+    def activate(self):
+        # Once the install is confirmed: create staging and catch up on everything
+        # downloaded so far. Until then the install root is not touched.
+        with self._lock:
+            if self.active:
+                return
+            self.active = True
+            if self.part_path is None:
+                return # attach() sets everything up.
+            if os.path.exists(self.staging_dir):
+                shutil.rmtree(self.staging_dir) # Left by an earlier run; nothing was extracted yet.
+            self._start_pool()
+            try:
+                if self.mode == "central" and self._coverage:
+                    self._schedule_central(0, self.size - 1)
+                elif self.mode == "sequential":
+                    self._schedule_sequential()
+            except (OSError, ValueError, zipfile.BadZipFile, struct.error):
+                self.mode = "fallback" # The download may already be complete; finish() extracts the rest.
+
+    def written(self, offset, length):
+        with self._lock:
+            if self.mode not in ("central", "sequential"):
+                return
+            self._coverage = merge_ranges(self._coverage + [[offset, offset + length - 1]])
+            if self._pool is None:
+                return
+            try:
+                if self.mode == "central":
+                    self._schedule_central(offset, offset + length - 1)
+                elif self.mode == "sequential":
+                    self._schedule_sequential()
+            except (OSError, ValueError, zipfile.BadZipFile, struct.error):
+                # Anything unexpected in the archive layout: stop streaming and let
+                # finish() extract the rest from the completed download.
+                self.mode = "fallback"
+
+    def _covered(self, start, end):
+        for covered_start, covered_end in self._coverage:
+            if covered_start <= start and end <= covered_end:
+                return True
+        return False
+
+    def _read_part(self, offset, length):
+        with open(self.part_path, "rb") as f:
+            f.seek(offset)
+            return f.read(length)
+
+    def _load_central_directory(self):
+        tail_start = max(0, self.size - min(self.size, 65536 + 22))
+        if not self._covered(tail_start, self.size - 1):
+            return False
+        tail = self._read_part(tail_start, self.size - tail_start)
+        eocd = tail.rfind(b"PK\x05\x06")
+        if eocd < 0 or len(tail) - eocd < 22:
+            raise zipfile.BadZipFile("End of central directory not found.")
+        cd_size, cd_offset = struct.unpack("<II", tail[eocd + 12:eocd + 20])
+        if cd_offset == 0xFFFFFFFF or cd_size == 0xFFFFFFFF:
+            raise zipfile.BadZipFile("ZIP64 archives are not streamed.")
+        if not self._covered(cd_offset, self.size - 1):
+            return False
+        with zipfile.ZipFile(self.part_path, "r") as archive:
+            members = sorted(archive.infolist(), key=lambda member: member.header_offset)
+        self._entries = []
+        directories = set()
+        for index, member in enumerate(members):
+            end = (members[index + 1].header_offset if index + 1 < len(members) else cd_offset) - 1
+            target_path = archive_member_path(self.staging_dir, member)
+            directories.add(target_path if member.is_dir() else os.path.dirname(target_path))
+            if not member.is_dir():
+                self._entries.append((member.header_offset, end, member, target_path))
+        for directory in sorted(directories):
+            os.makedirs(directory, exist_ok=True)
+        self._entry_starts = [entry[0] for entry in self._entries]
+        if self.reuse:
+            for _, _, member, target_path in self._entries:
+                source_path = self.reuse.candidate(member)
+                if source_path:
+                    self._extracted.add(member.filename)
+                    self._futures.append(self._pool.submit(self._reuse_entry, member, target_path, source_path))
+        return True
+
+    def _schedule_central(self, start, end):
+        if self._entries is None:
+            if not self._load_central_directory():
+                return
+            start, end = 0, self.size - 1 # First time through: everything already covered is a candidate.
+        first = max(0, bisect.bisect_right(self._entry_starts, start) - 1)
+        last = bisect.bisect_right(self._entry_starts, end)
+        for entry_start, entry_end, member, target_path in self._entries[first:last]:
+            if member.filename not in self._extracted and self._covered(entry_start, entry_end):
+                self._extracted.add(member.filename)
+                self._futures.append(self._pool.submit(self._extract_central, member, target_path))
+
+    def _extract_central(self, member, target_path):
+        try:
+            size = _extract_member(self.part_path, self._handles, self._opened, member, target_path)
+        except (OSError, zipfile.BadZipFile, zlib.error):
+            with self._lock:
+                self._extracted.discard(member.filename) # finish() retries it from the complete archive.
+            return
+        with self._lock:
+            self.stats["streamed_files"] += 1
+            self.stats["streamed_bytes"] += size
+
+    def _reuse_entry(self, member, target_path, source_path):
+        try:
+            reused = self.reuse.verify(member, source_path)
+            if reused:
+                reuse_file(source_path, target_path)
+        except OSError:
+            reused = False
+        with self._lock:
+            if not reused:
+                self._extracted.discard(member.filename)
+                if self._entries is not None and self._pool is not None:
+                    entry_start = member.header_offset
+                    entry_index = bisect.bisect_left(self._entry_starts, entry_start)
+                    self._schedule_central(entry_start, self._entries[entry_index][1])
+                return
+            self.stats["reused_files"] += 1
+            self.stats["reused_bytes"] += member.file_size
+        TRACE.count("extract.reused_files")
+
+    def _schedule_sequential(self):
+        covered_end = self._coverage[0][1] + 1 if self._coverage and self._coverage[0][0] == 0 else 0
+        while self._sequential_position + 30 <= covered_end:
+            header = self._read_part(self._sequential_position, 30)
+            if header[:4] != b"PK\x03\x04":
+                self.mode = "drained" # Reached the central directory; everything before it is scheduled.
+                return
+            (_, _, flags, method, mod_time, mod_date, crc, compress_size, file_size,
+             name_length, extra_length) = struct.unpack("<IHHHHHIIIHH", header)
+            if flags & 0x08 or flags & 0x01 or method not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+                raise ValueError("Entry sizes are only in a trailing data descriptor (or the entry is encrypted).")
+            data_offset = self._sequential_position + 30 + name_length + extra_length
+            if data_offset + compress_size > covered_end:
+                return
+            raw_name = self._read_part(self._sequential_position + 30, name_length)
+            name = raw_name.decode("utf-8" if flags & 0x800 else "cp437")
+            member = zipfile.ZipInfo(name, date_time=((mod_date >> 9) + 1980, (mod_date >> 5) & 0xF, mod_date & 0x1F,
+                                                      mod_time >> 11, (mod_time >> 5) & 0x3F, (mod_time & 0x1F) * 2))
+            target_path = archive_member_path(self.staging_dir, member)
+            self._sequential_position = data_offset + compress_size
+            self._extracted.add(name)
+            if member.is_dir():
+                os.makedirs(target_path, exist_ok=True)
+                continue
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            member.CRC, member.file_size = crc, file_size
+            source_path = self.reuse.candidate(member) if self.reuse else None
+            if source_path:
+                self._futures.append(self._pool.submit(self._reuse_entry, member, target_path, source_path))
+                continue
+            self._futures.append(self._pool.submit(self._extract_sequential, name, data_offset, compress_size, file_size,
+                                                   method, crc, target_path))
+
+    def _extract_sequential(self, name, data_offset, compress_size, file_size, method, crc, target_path):
+        try:
+            self._inflate_local_entry(data_offset, compress_size, file_size, method, crc, target_path)
+        except (OSError, zipfile.BadZipFile, zlib.error):
+            with self._lock:
+                self._extracted.discard(name)
+            return
+        TRACE.count("extract.files")
+        TRACE.count("extract.bytes_written", file_size)
+        with self._lock:
+            self.stats["streamed_files"] += 1
+            self.stats["streamed_bytes"] += file_size
+
+    def _inflate_local_entry(self, data_offset, compress_size, file_size, method, crc, target_path):
+        decompressor = zlib.decompressobj(-15) if method == zipfile.ZIP_DEFLATED else None
+        checksum = 0
+        with open(self.part_path, "rb") as source, open(target_path, "wb") as target:
+            if file_size:
+                target.truncate(file_size)
+            source.seek(data_offset)
+            remaining = compress_size
+            while remaining:
+                block = source.read(min(remaining, EXTRACT_BLOCK_SIZE))
+                if not block:
+                    raise zipfile.BadZipFile(f"Truncated entry data for {target_path}")
+                remaining -= len(block)
+                data = decompressor.decompress(block) if decompressor else block
+                checksum = zlib.crc32(data, checksum)
+                target.write(data)
+            if decompressor:
+                data = decompressor.flush()
+                checksum = zlib.crc32(data, checksum)
+                target.write(data)
+        if checksum != crc:
+            raise zipfile.BadZipFile(f"Bad CRC-32 for {target_path}")
+
+    def release(self):
+        # Wait for in-flight entries and close every handle on the .part file, so it can
+        # be renamed or deleted (Windows refuses either while a handle is open).
+        with self._lock:
+            pool, self._pool = self._pool, None
+            self._futures = []
+        if pool is not None:
+            pool.shutdown(wait=True)
+        for handle in self._opened:
+            handle.close()
+        self._opened.clear()
+        self._handles = threading.local()
+
+    def abort(self):
+        try:
+            self.release()
+        except Exception:
+            pass
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+
+    def finish(self, zip_path, dest_dir):
+        # Extract whatever did not stream (fallback mode, or entries whose range never
+        # completed), stamp metadata from the central directory and move the tree out
+        # of staging (see promote_staged_tree; stats["displaced"] lists replaced trees).
+        started = time.perf_counter()
+        self.release()
+        TRACE.mark("streamed extraction finishing", "extract", streamed_files=self.stats["streamed_files"], reused_files=self.stats["reused_files"])
+        with zipfile.ZipFile(zip_path, "r") as archive:
+            members = archive.infolist()
+        remaining = [member for member in members if not member.is_dir() and member.filename not in self._extracted]
+        stats = extract_archive(zip_path, self.staging_dir, workers=self.workers, members=remaining, reuse=self.reuse)
+        for member in sorted(members, key=lambda member: member.filename, reverse=True):
+            target_path = archive_member_path(self.staging_dir, member)
+            if os.path.exists(target_path) and (member.is_dir() or os.stat(target_path).st_nlink == 1):
+                _restore_metadata(target_path, member)
+        stats["displaced"] = promote_staged_tree(self.staging_dir, dest_dir)
+        for key in ("reused_files", "reused_bytes"):
+            stats[key] += self.stats[key]
+        stats.update(streamed_files=self.stats["streamed_files"], streamed_bytes=self.stats["streamed_bytes"])
+        stats["files"] += self.stats["streamed_files"] + self.stats["reused_files"]
+        stats["bytes"] += self.stats["streamed_bytes"] + self.stats["reused_bytes"]
+        stats["finalize_seconds"] = time.perf_counter() - started - stats["index_seconds"] - stats["extract_seconds"]
+        stats["total_seconds"] = time.perf_counter() - started
+        return stats
 
 def lerp_color(color1_rgb, color2_rgb, factor):
     r = int(color1_rgb[0] + (color2_rgb[0] - color1_rgb[0]) * factor)
@@ -202,18 +2289,230 @@ def print_logo():
         console.print(Text(line, style=style), justify="center")
     console.print()
 
-def check_java():
-    console.print("Checking for Java installation...", style="info")
+def parse_release_file(java_home):
+    # <JDK>/release is a small KEY="value" file shipped by every JDK build since 9 (and most 8s).
+    info = {}
+    with open(os.path.join(java_home, "release"), "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            key, separator, value = line.partition("=")
+            if separator:
+                info[key.strip()] = value.strip().strip('"')
+    return info
+
+def java_feature_version(version):
+    # "1.8.0_402" -> 8, "21.0.2" -> 21, "17" -> 17
+    parts = version.split(".")
+    try:
+        return int(parts[1]) if parts[0] == "1" and len(parts) > 1 else int(parts[0].split("-")[0].split("+")[0])
+    except ValueError:
+        return None
+
+def _registry_java_homes():
+    # JavaSoft keys hold JavaHome; vendor MSIs (Adoptium, Microsoft, Zulu, ...) use other value names.
+    homes = []
+    def walk(key, depth):
+        for value_name in ("JavaHome", "Path", "InstallationPath"):
+            try:
+                homes.append(winreg.QueryValueEx(key, value_name)[0])
+            except OSError:
+                pass
+        if depth == 0:
+            return
+        index = 0
+        while True:
+            try:
+                subkey_name = winreg.EnumKey(key, index)
+            except OSError:
+                break
+            index += 1
+            try:
+                with winreg.OpenKey(key, subkey_name, 0, winreg.KEY_READ | winreg.KEY_WOW64_64KEY) as subkey:
+                    walk(subkey, depth - 1)
+            except OSError:
+                pass
+    for vendor_key in JDK_REGISTRY_KEYS:
+        try:
+            with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, vendor_key, 0, winreg.KEY_READ | winreg.KEY_WOW64_64KEY) as key:
+                walk(key, 3)
+        except OSError:
+            pass
+    return homes
+
+def _jdk_roots():
+    program_files = {os.environ.get("ProgramFiles", "C:\\Program Files"), os.environ.get("ProgramW6432", "C:\\Program Files")}
+    roots = [os.path.join(base, vendor) for base in sorted(program_files) for vendor in JDK_VENDOR_DIRS]
+    roots += [os.path.join(os.path.expanduser("~"), ".jdks"), os.path.join(gradle_user_home(), "jdks")]
+    return roots
+
+def _load_jdk_cache(cache_path):
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    cache.setdefault("roots", {})
+    cache.setdefault("jdks", {})
+    return cache
+
+def discover_jdks():
+    # Finds JDKs without running Java: JAVA_HOME, java on PATH, the registry and the usual
+    # install roots, each described by its release file. Root listings and release files
+    # are cached in CACHE_DIR and re-read only when the directory's mtime changes.
+    cache_path = os.path.join(CACHE_DIR, "metadata", "jdks.json")
+    cache = _load_jdk_cache(cache_path)
+    changed = False
+    candidates = [os.environ.get("JAVA_HOME"), get_system_env_var("JAVA_HOME")]
+    java_on_path = shutil.which("java")
+    if java_on_path:
+        candidates.append(os.path.dirname(os.path.dirname(os.path.realpath(java_on_path))))
+    candidates += _registry_java_homes()
+    roots = {}
+    for root in _jdk_roots():
+        try:
+            root_mtime = os.stat(root).st_mtime
+        except OSError:
+            continue
+        cached_root = cache["roots"].get(root)
+        if not cached_root or cached_root["mtime"] != root_mtime:
+            cached_root = {"mtime": root_mtime, "homes": sorted(os.path.join(root, name) for name in os.listdir(root))}
+            changed = True
+        roots[root] = cached_root
+        candidates += cached_root["homes"]
+    cache["roots"] = roots
+
+    jdks = {}
+    for java_home in candidates:
+        if not java_home:
+            continue
+        java_home = os.path.normpath(java_home)
+        key = os.path.normcase(java_home)
+        if key in jdks:
+            continue
+        try:
+            home_mtime = os.stat(java_home).st_mtime
+        except OSError:
+            continue
+        cached = cache["jdks"].get(key)
+        if not cached or cached["mtime"] != home_mtime:
+            try:
+                release = parse_release_file(java_home)
+            except OSError:
+                continue
+            cached = {"mtime": home_mtime, "home": java_home, "version": release.get("JAVA_VERSION", ""),
+                      "vendor": release.get("IMPLEMENTOR", ""), "arch": release.get("OS_ARCH", ""),
+                      "jdk": os.path.isfile(os.path.join(java_home, "bin", "javac.exe")) or os.path.isfile(os.path.join(java_home, "bin", "javac"))}
+            cached["feature"] = java_feature_version(cached["version"])
+            changed = True
+        jdks[key] = cached
+    if set(cache["jdks"]) != set(jdks):
+        changed = True
+    cache["jdks"] = jdks
+    if changed:
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            _save_cache_index(cache_path, cache)
+        except OSError:
+            pass
+    return sorted(jdks.values(), key=lambda jdk: (jdk["feature"] or 0, jdk["version"]), reverse=True)
+
+def gradle_java_range(gradle_version):
+    # (oldest, newest) Java feature version that can run the given Gradle; newest is None when unknown.
+    # Release candidates and milestones share the requirements of their release; the
+    # newest known line gets no upper bound, as later Java releases are usually added.
+    key = version_sort_key(gradle_version)[:3]
+    for index, (since, oldest, newest) in enumerate(GRADLE_JAVA_COMPATIBILITY):
+        if key >= version_sort_key(since)[:3]:
+            return oldest, newest if index else None
+    return 8, 14
+
+def select_jdk(jdks, gradle_version):
+    # The JDK Gradle would actually use (JAVA_HOME) if it is compatible, otherwise the newest
+    # compatible full JDK. Returns (jdk or None, compatible JDKs).
+    oldest, newest = gradle_java_range(gradle_version)
+    compatible = [jdk for jdk in jdks if jdk["feature"] and oldest <= jdk["feature"] and (newest is None or jdk["feature"] <= newest)]
+    java_home = os.environ.get("JAVA_HOME") or get_system_env_var("JAVA_HOME")
+    for jdk in compatible:
+        if java_home and os.path.normcase(jdk["home"]) == os.path.normcase(os.path.normpath(java_home)):
+            return jdk, compatible
+    compatible.sort(key=lambda jdk: (jdk["jdk"], jdk["arch"] in ("x86_64", "amd64", "aarch64"), jdk["feature"]), reverse=True)
+    return (compatible[0] if compatible else None), compatible
+
+def check_java(jdks=None):
+    # Returns the JDK Gradle should run on, or None.
+    console.print("Looking for Java installations...", style="info")
+    jdks = discover_jdks() if jdks is None else jdks
+    if not jdks:
+        console.print("  [warning]No Java installation found (JAVA_HOME, PATH, registry, common install folders). Gradle requires a Java Development Kit (JDK).[/warning]")
+        console.print("  Please install a JDK from: [link=https://adoptium.net/]Adoptium (Recommended)[/link] or [link=https://www.oracle.com/java/technologies/javase-downloads.html]Oracle Java SE[/link]")
+        return None
+    for jdk in jdks[:10]:
+        console.print(f"  [info]Java {jdk['version'] or '?'} ({jdk['vendor'] or 'unknown vendor'}, {jdk['arch'] or '?'}{'' if jdk['jdk'] else ', JRE only'}) at [path]{jdk['home']}[/path][/info]")
+    if len(jdks) > 10:
+        console.print(f"  [info]... and {len(jdks) - 10} more.[/info]")
+    oldest, newest = gradle_java_range(GRADLE_VERSION)
+    selected, _ = select_jdk(jdks, GRADLE_VERSION)
+    supported = f"Java {oldest}{f' to {newest}' if newest else ' or newer'}"
+    if not selected:
+        console.print(f"  [warning]None of them can run Gradle {GRADLE_VERSION}, which needs {supported}.[/warning]")
+        console.print("  Please install a suitable JDK from: [link=https://adoptium.net/]Adoptium (Recommended)[/link]")
+        return None
+    console.print(f"  [success]Gradle {GRADLE_VERSION} ({supported}) will use Java {selected['version']} at [path]{selected['home']}[/path].[/success]")
+    return selected
+
+def configure_java_home(jdk):
+    # Gradle's launcher runs %JAVA_HOME%\bin\java.exe, or java from PATH when JAVA_HOME is unset.
+    # An existing JAVA_HOME belongs to the user: it is only replaced when they say so at
+    # the prompt, never by --yes, which just reports the compatible JDK.
+    java_home = get_system_env_var("JAVA_HOME")
+    if java_home and os.path.normcase(os.path.normpath(java_home)) == os.path.normcase(jdk["home"]):
+        return False
+    if java_home:
+        question = (f"System JAVA_HOME points to [path]{java_home}[/path], which cannot run Gradle {GRADLE_VERSION}.\n"
+                    f"Point it to [path]{jdk['home']}[/path] instead?")
+        if ASSUME_YES or not Confirm.ask(question, default=False, console=console):
+            console.print(f"  [warning]JAVA_HOME was left unchanged. Set it to [path]{jdk['home']}[/path] (Java {jdk['version'] or '?'}) "
+                          f"to run Gradle {GRADLE_VERSION}.[/warning]")
+            return False
+    elif shutil.which("java") or not confirm(f"JAVA_HOME is not set. Set it to [path]{jdk['home']}[/path]?", default=True):
+        return False
+    return set_env_var_system("JAVA_HOME", jdk["home"])
+
+def inspect_environment():
+    environment = {"gradle_home": None, "path": "", "free_bytes": None}
+    try:
+        key = winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, r"SYSTEM\CurrentControlSet\Control\Session Manager\Environment", 0, winreg.KEY_READ)
+        try:
+            environment["gradle_home"] = winreg.QueryValueEx(key, "GRADLE_HOME")[0]
+        except OSError:
+            pass
+        try:
+            environment["path"] = winreg.QueryValueEx(key, "Path")[0]
+        except OSError:
+            pass
+        winreg.CloseKey(key)
+    except OSError:
+        pass
+    probe_dir = INSTALL_DIR
+    while probe_dir and not os.path.exists(probe_dir) and os.path.dirname(probe_dir) != probe_dir:
+        probe_dir = os.path.dirname(probe_dir)
     try:
-        result = subprocess.run(["java", "-version"], capture_output=True, text=True, check=False, creationflags=subprocess.CREATE_NO_WINDOW)
-        if result.returncode == 0:
-            console.print("  [success]Java is installed.[/success]"); return True
+        environment["free_bytes"] = shutil.disk_usage(probe_dir).free
+    except OSError:
+        pass
+    return environment
+
+def check_environment(environment):
+    console.print("Inspecting current environment...", style="info")
+    if environment["gradle_home"]:
+        console.print(f"  [info]Current system GRADLE_HOME: [path]{environment['gradle_home']}[/path][/info]")
+    else:
+        console.print("  [info]No system GRADLE_HOME is set yet.[/info]")
+    if environment["free_bytes"] is not None:
+        free_mb = environment["free_bytes"] // (1024 * 1024)
+        if free_mb < MIN_FREE_DISK_MB:
+            console.print(f"  [warning]Only {free_mb} MB free on the drive holding [path]{INSTALL_DIR}[/path]; Gradle needs about {MIN_FREE_DISK_MB} MB.[/warning]")
         else:
-            console.print("  [warning]Java not found! Gradle requires Java Development Kit (JDK).[/warning]")
-            console.print("  Please install a JDK from: [link=https://adoptium.net/]Adoptium (Recommended)[/link] or [link=https://www.oracle.com/java/technologies/javase-downloads.html]Oracle Java SE[/link]")
-            return False
-    except FileNotFoundError:
-        console.print("  [warning]Java command not found. Is JDK installed and an entry for it in PATH variable?[/warning]"); return False
+            console.print(f"  [success]{free_mb} MB free on the drive holding [path]{INSTALL_DIR}[/path].[/success]")
 
 def set_env_var_system(var_name, var_value):
     console.print(f"Setting system environment variable [variable]{var_name}[/variable] to [path]{var_value}[/path]...", style="info")
@@ -225,7 +2524,16 @@ def set_env_var_system(var_name, var_value):
     except Exception as e:
         console.print(f"  [danger]Failed to set system environment variable {var_name}: {e}[/danger]"); return False
 
+def _is_versioned_gradle_bin(path_entry):
+    # INSTALL_DIR\gradle-<version>\bin, as added by installers before the "current" link existed.
+    bin_dir = os.path.normcase(os.path.normpath(path_entry))
+    gradle_home = os.path.dirname(bin_dir)
+    return (os.path.basename(bin_dir) == "bin" and os.path.basename(gradle_home).startswith("gradle-")
+            and os.path.dirname(gradle_home) == os.path.normcase(os.path.normpath(INSTALL_DIR)))
+
 def add_to_path_system(dir_to_add):
+    # Returns True only when Path was changed. Entries for version directories are dropped,
+    # since they would shadow the "current" link.
     console.print(f"Adding [path]{dir_to_add}[/path] to system PATH environment variable...", style="info")
     try:
         key = winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, r"SYSTEM\CurrentControlSet\Control\Session Manager\Environment", 0, winreg.KEY_ALL_ACCESS)
@@ -234,27 +2542,37 @@ def add_to_path_system(dir_to_add):
         paths = current_path.split(';')
         normalized_dir_to_add = os.path.normpath(dir_to_add)
         
-        path_already_exists = any(os.path.normpath(p) == normalized_dir_to_add for p in paths)
+        path_already_exists = any(os.path.normpath(p) == normalized_dir_to_add for p in paths if p)
+        stale_paths = [p for p in paths if p and _is_versioned_gradle_bin(p) and os.path.normpath(p) != normalized_dir_to_add]
         
+        changed = False
+        if stale_paths:
+            paths = [p for p in paths if p not in stale_paths]
+            current_path = ';'.join(paths)
+            changed = True
+            console.print(f"  [info]Removing versioned Gradle entries from system PATH: {', '.join(stale_paths)}[/info]")
         if not path_already_exists:
             if not current_path or current_path.endswith(';'):
-                new_path = f"{current_path}{dir_to_add}"
+                current_path = f"{current_path}{dir_to_add}"
             else:
-                new_path = f"{current_path};{dir_to_add}"
-            winreg.SetValueEx(key, "Path", 0, reg_type, new_path) 
+                current_path = f"{current_path};{dir_to_add}"
+            changed = True
             console.print(f"  [success]Successfully added {dir_to_add} to system PATH.[/success]")
         else:
             console.print(f"  [info]{dir_to_add} is already in system PATH.[/info]")
-        winreg.CloseKey(key); return True
+        if changed:
+            winreg.SetValueEx(key, "Path", 0, reg_type, current_path)
+        winreg.CloseKey(key); return changed
     except Exception as e:
         console.print(f"  [danger]Failed to update system PATH: {e}[/danger]"); return False
 
 def broadcast_env_change():
     console.print("Broadcasting environment variable changes to other processes...", style="info")
     try:
-        win32gui.SendMessageTimeout(
-            win32con.HWND_BROADCAST, win32con.WM_SETTINGCHANGE, 0, "Environment",
-            win32con.SMTO_ABORTIFHUNG | win32con.SMTO_NORMAL, 1000)
+        with TRACE.span("WM_SETTINGCHANGE broadcast", "environment"):
+            win32gui.SendMessageTimeout(
+                win32con.HWND_BROADCAST, win32con.WM_SETTINGCHANGE, 0, "Environment",
+                win32con.SMTO_ABORTIFHUNG | win32con.SMTO_NORMAL, 1000)
         console.print("  [success]Environment change broadcast sent.[/success]")
     except Exception as e:
         console.print(f"  [warning]Failed to broadcast environment change: {e}. A system restart may be required for changes to take full effect everywhere.[/warning]")
@@ -292,7 +2610,7 @@ def create_shortcut():
     icon_location = target_exe 
     
     try:
-        with shortcut(shortcut_path) as sc:
+        with winshell.shortcut(shortcut_path) as sc:
             sc.path = target_exe
             sc.arguments = arguments
             sc.description = f"Command Prompt for Gradle {GRADLE_VERSION} (GRADLE_HOME={GRADLE_HOME})"
@@ -302,249 +2620,1580 @@ def create_shortcut():
     except Exception as e:
         console.print(f"  [danger]Failed to create shortcut: {e}[/danger]"); return False
 
-def verify_gradle():
-    global GRADLE_VERSION, GRADLE_HOME
-    console.print("Verifying Gradle installation...", style="info")
-    gradle_exe = os.path.join(GRADLE_HOME, "bin", "gradle.bat") 
+def system_memory_bytes():
+    # Physical memory, or None when it cannot be determined.
+    class MEMORYSTATUSEX(ctypes.Structure):
+        _fields_ = [("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong), ("ullTotalPhys", ctypes.c_ulonglong),
+                    ("ullAvailPhys", ctypes.c_ulonglong), ("ullTotalPageFile", ctypes.c_ulonglong), ("ullAvailPageFile", ctypes.c_ulonglong),
+                    ("ullTotalVirtual", ctypes.c_ulonglong), ("ullAvailVirtual", ctypes.c_ulonglong), ("ullAvailExtendedVirtual", ctypes.c_ulonglong)]
+    try:
+        status = MEMORYSTATUSEX(dwLength=ctypes.sizeof(MEMORYSTATUSEX))
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return status.ullTotalPhys
+    except (AttributeError, OSError):
+        pass
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return None
 
-    if not os.path.exists(gradle_exe):
-        console.print(f"  [danger]Gradle executable not found at [path]{gradle_exe}[/path]. Verification cannot proceed.[/danger]"); return False
-    
+def disk_incurs_seek_penalty(path):
+    # True for a spinning disk, False for an SSD, None when the volume does not say
+    # (network drives, virtual disks). Asks the storage driver; nothing is benchmarked.
+    class STORAGE_PROPERTY_QUERY(ctypes.Structure):
+        _fields_ = [("PropertyId", ctypes.c_int), ("QueryType", ctypes.c_int), ("AdditionalParameters", ctypes.c_ubyte * 1)]
+    class DEVICE_SEEK_PENALTY_DESCRIPTOR(ctypes.Structure):
+        _fields_ = [("Version", ctypes.c_ulong), ("Size", ctypes.c_ulong), ("IncursSeekPenalty", ctypes.c_ubyte)]
+    drive = os.path.splitdrive(os.path.abspath(path))[0]
+    if not drive or drive.startswith("\\\\"):
+        return None
+    try:
+        kernel32 = ctypes.windll.kernel32
+    except AttributeError:
+        return None
+    kernel32.CreateFileW.restype = ctypes.c_void_p
+    handle = kernel32.CreateFileW(f"\\\\.\\{drive}", 0, 0x1 | 0x2, None, 3, 0, None) # FILE_SHARE_READ|WRITE, OPEN_EXISTING
+    if not handle or handle == ctypes.c_void_p(-1).value:
+        return None
+    try:
+        query = STORAGE_PROPERTY_QUERY(PropertyId=STORAGE_DEVICE_SEEK_PENALTY_PROPERTY, QueryType=0)
+        descriptor = DEVICE_SEEK_PENALTY_DESCRIPTOR()
+        returned = ctypes.c_ulong()
+        if not kernel32.DeviceIoControl(ctypes.c_void_p(handle), IOCTL_STORAGE_QUERY_PROPERTY, ctypes.byref(query), ctypes.sizeof(query),
+                                        ctypes.byref(descriptor), ctypes.sizeof(descriptor), ctypes.byref(returned), None):
+            return None
+        return bool(descriptor.IncursSeekPenalty)
+    finally:
+        kernel32.CloseHandle(ctypes.c_void_p(handle))
+
+def recommended_gradle_properties(cores, memory_bytes, seek_penalty):
+    # The daemon heap gets a quarter of the RAM (within TUNE_HEAP_MIN_MB..TUNE_HEAP_MAX_MB);
+    # workers are capped by what is left for their own JVMs (compilers, test executors)
+    # and, on a spinning disk, to a few, since parallel I/O there only adds seeks.
+    memory_mb = (memory_bytes or 8 * 1024 ** 3) // (1024 * 1024)
+    heap_mb = min(TUNE_HEAP_MAX_MB, max(TUNE_HEAP_MIN_MB, memory_mb // 4 // 512 * 512))
+    metaspace_mb = 512 if heap_mb < 4096 else 1024
+    workers = min(cores, 4) if seek_penalty else cores
+    workers = max(1, min(workers, (memory_mb - heap_mb) // TUNE_WORKER_MEMORY_MB))
+    idle_timeout_ms = (3 if memory_mb >= 16 * 1024 else 1) * 60 * 60 * 1000 # Small machines get their RAM back sooner.
+    return {
+        "org.gradle.jvmargs": f"-Xmx{heap_mb}m -XX:MaxMetaspaceSize={metaspace_mb}m -XX:+HeapDumpOnOutOfMemoryError -Dfile.encoding=UTF-8",
+        "org.gradle.parallel": "true" if workers > 1 else "false",
+        "org.gradle.workers.max": str(workers),
+        "org.gradle.caching": "true",
+        "org.gradle.daemon.idletimeout": str(idle_timeout_ms),
+    }
+
+def _properties_entries(lines):
+    # (first line, last line, key) of every property in a .properties file, following
+    # the java.util.Properties rules: '#'/'!' comments, a key ending at the first
+    # unescaped '=', ':' or whitespace, and values continued by a trailing backslash.
+    # A comment line never continues, even when it ends in a backslash.
+    entries, index = [], 0
+    while index < len(lines):
+        start, text = index, lines[index].lstrip()
+        if not text or text[0] in "#!":
+            index += 1
+            continue
+        while lines[index].endswith("\\") and (len(lines[index]) - len(lines[index].rstrip("\\"))) % 2 and index + 1 < len(lines):
+            index += 1
+        index += 1
+        key, escaped = "", False
+        for char in text:
+            if not escaped and (char in "=:" or char.isspace()):
+                break
+            escaped = not escaped and char == "\\"
+            if not escaped:
+                key += char
+        entries.append((start, index - 1, key))
+    return entries
+
+def merge_gradle_properties(lines, recommended):
+    # Returns (new lines, kept): keys the user set outside the managed block keep
+    # their value (and are reported); the managed block is rewritten in place, or
+    # appended, with the rest. Everything else in the file is left untouched.
+    try:
+        block_start = lines.index(TUNE_BLOCK_BEGIN)
+        block_end = lines.index(TUNE_BLOCK_END, block_start)
+    except ValueError:
+        block_start = block_end = None
+    kept = {}
+    for start, end, key in _properties_entries(lines):
+        if key in recommended and (block_start is None or not block_start < start < block_end):
+            kept[key] = " ".join(line.rstrip("\\").strip() for line in lines[start:end + 1]).partition(key)[2].lstrip(" \t=:")
+    block = [TUNE_BLOCK_BEGIN] + [f"{key}={value}" for key, value in recommended.items() if key not in kept] + [TUNE_BLOCK_END]
+    if block_start is not None:
+        return lines[:block_start] + block + lines[block_end + 1:], kept
+    return lines + ([""] if lines and lines[-1].strip() else []) + block, kept
+
+def tune_gradle_properties(dry_run=False, user_home=None, ask=False):
+    # Writes a profile sized for this machine into <Gradle user home>/gradle.properties,
+    # which applies to every build the user runs (project settings still win). With ask,
+    # the diff is confirmed first (the installer; 'tune' was asked for explicitly).
+    properties_path = os.path.join(user_home or gradle_user_home(), "gradle.properties")
+    cores = os.cpu_count() or 1
+    memory_bytes = system_memory_bytes()
+    seek_penalty = disk_incurs_seek_penalty(user_home or gradle_user_home())
+    disk_type = {True: "spinning disk", False: "SSD", None: "unknown disk type"}[seek_penalty]
+    memory_text = f"{memory_bytes / 1024 ** 3:.1f} GiB RAM" if memory_bytes else "unknown RAM"
+    console.print(f"Tuning [path]{properties_path}[/path] for {cores} cores, {memory_text}, {disk_type}...", style="info")
+    recommended = recommended_gradle_properties(cores, memory_bytes, seek_penalty)
+
+    try:
+        with open(properties_path, "r", encoding="latin-1") as f:
+            old_lines = f.read().splitlines()
+    except FileNotFoundError:
+        old_lines = []
+    except OSError as e:
+        console.print(f"  [danger]Could not read {properties_path}: {e}[/danger]"); return False
+    new_lines, kept = merge_gradle_properties(old_lines, recommended)
+    for key, value in kept.items():
+        console.print(f"  [warning]Keeping your {key}={value} (recommended: {recommended[key]}).[/warning]")
+    if new_lines == old_lines:
+        console.print("  [success]gradle.properties already has this profile.[/success]"); return True
+    diff = list(difflib.unified_diff(old_lines, new_lines, fromfile=f"{properties_path} (current)", tofile=f"{properties_path} (tuned)", lineterm=""))
+    for line in diff:
+        style = "success" if line.startswith("+") and not line.startswith("+++") else "danger" if line.startswith("-") and not line.startswith("---") else "dim"
+        console.print(Text(f"    {line}", style=style))
+    if dry_run:
+        console.print("  [info]Dry run: gradle.properties was not changed.[/info]"); return True
+    if ask and not confirm(f"Write this performance profile to [path]{properties_path}[/path]?", default=True):
+        console.print("  [info]gradle.properties was not changed.[/info]"); return True
+
+    try:
+        os.makedirs(os.path.dirname(properties_path), exist_ok=True)
+        if old_lines:
+            shutil.copy2(properties_path, properties_path + ".bak")
+        tmp_path = f"{properties_path}.tmp-{os.getpid()}"
+        with open(tmp_path, "w", encoding="latin-1") as f:
+            f.write("\n".join(new_lines) + "\n")
+        os.replace(tmp_path, properties_path)
+        console.print(f"  [success]Gradle performance profile written{' (previous file saved as gradle.properties.bak)' if old_lines else ''}.[/success]"); return True
+    except OSError as e:
+        console.print(f"  [danger]Could not write {properties_path}: {e}[/danger]"); return False
+
+def _launcher_classpath(gradle_home):
+    # JARs the Windows launcher puts on the classpath ("set CLASSPATH=%APP_HOME%\lib\...").
+    with open(os.path.join(gradle_home, "bin", "gradle.bat"), "r", encoding="utf-8", errors="replace") as f:
+        lines = f.read().splitlines()
+    classpath = []
+    for line in lines:
+        if line.strip().lower().startswith("set classpath="):
+            for entry in line.strip()[len("set CLASSPATH="):].split(";"):
+                entry = entry.replace("%APP_HOME%", gradle_home).replace("\\", os.path.sep).strip()
+                if entry:
+                    classpath.append(os.path.normpath(entry))
+    return classpath
+
+def read_build_receipt(gradle_home):
+    # Gradle reports its version from org/gradle/build-receipt.properties; which JAR
+    # carries it has moved between releases, so every lib/gradle-*.jar is a candidate
+    # (base-services first). Returns (properties, jar_path, jars_checked) - reading a
+    # central directory also proves the JAR is a readable archive.
+    lib_dir = os.path.join(gradle_home, "lib")
+    jars = sorted((name for name in os.listdir(lib_dir) if name.startswith("gradle-") and name.endswith(".jar")),
+                  key=lambda name: ("base-services" not in name, name))
+    receipt, receipt_jar = None, None
+    for name in jars:
+        with zipfile.ZipFile(os.path.join(lib_dir, name), "r") as jar:
+            if receipt is None and "org/gradle/build-receipt.properties" in jar.NameToInfo:
+                receipt_jar = os.path.join(lib_dir, name)
+                receipt = {}
+                for line in jar.read("org/gradle/build-receipt.properties").decode("latin-1").splitlines():
+                    key, separator, value = line.partition("=")
+                    if separator and not key.lstrip().startswith("#"):
+                        receipt[key.strip()] = value.strip()
+    return receipt, receipt_jar, len(jars)
+
+def check_gradle_installation(gradle_home, version, deep=False):
+    # Verification without the console, so it can run while the environment is configured.
+    # The fast path starts no process: launcher scripts, their classpath JARs, every
+    # lib/gradle-*.jar as an archive, and the version in the build receipt. deep=True
+    # additionally runs 'gradle --version', which boots a JVM.
+    with TRACE.span("check installation", "verify", deep=deep) as span:
+        result = _check_gradle_installation(gradle_home, version, deep)
+        span.update(ok=result["ok"], jars=result["jars"])
+        return result
+
+def _check_gradle_installation(gradle_home, version, deep):
+    result = {"ok": False, "problems": [], "receipt": None, "receipt_jar": None, "jars": 0, "deep": None}
+    started = time.perf_counter()
+    for launcher in ("gradle", "gradle.bat"):
+        if not os.path.isfile(os.path.join(gradle_home, "bin", launcher)):
+            result["problems"].append(f"Launcher bin\\{launcher} is missing.")
     try:
+        for jar_path in _launcher_classpath(gradle_home):
+            if not os.path.isfile(jar_path):
+                result["problems"].append(f"Launcher classpath entry {jar_path} is missing.")
+        result["receipt"], result["receipt_jar"], result["jars"] = read_build_receipt(gradle_home)
+    except (OSError, zipfile.BadZipFile) as e:
+        result["problems"].append(f"Could not read the installation: {e}")
+    if not result["problems"]:
+        if not result["jars"]:
+            result["problems"].append("No lib\\gradle-*.jar files found.")
+        elif not result["receipt"]:
+            result["problems"].append("No build receipt (org/gradle/build-receipt.properties) found in lib\\gradle-*.jar.")
+        elif result["receipt"].get("versionNumber") != version:
+            result["problems"].append(f"Build receipt reports version {result['receipt'].get('versionNumber')}, expected {version}.")
+    result["seconds"] = time.perf_counter() - started
+
+    if deep and not result["problems"]:
         env = os.environ.copy()
-        env["GRADLE_HOME"] = GRADLE_HOME
-        env["PATH"] = os.path.join(GRADLE_HOME, "bin") + os.pathsep + env["PATH"]
-        
-        result = subprocess.run([gradle_exe, "--no-daemon", "--version"], capture_output=True, text=True, check=False, env=env, creationflags=subprocess.CREATE_NO_WINDOW)
-        
+        env["GRADLE_HOME"] = gradle_home
+        env["PATH"] = os.path.join(gradle_home, "bin") + os.pathsep + env["PATH"]
+        try:
+            with TRACE.span("gradle --version", "subprocess") as span:
+                process = subprocess.run([os.path.join(gradle_home, "bin", "gradle.bat"), "--no-daemon", "--version"], capture_output=True,
+                                         text=True, check=False, env=env, creationflags=subprocess.CREATE_NO_WINDOW)
+                span["returncode"] = process.returncode
+            result["deep"] = {"returncode": process.returncode, "stdout": process.stdout, "stderr": process.stderr}
+        except OSError as e:
+            result["deep"] = {"returncode": None, "stdout": "", "stderr": str(e)}
+        if result["deep"]["returncode"] != 0:
+            result["problems"].append(f"'gradle --version' failed. Return code: {result['deep']['returncode']}")
+        elif f"Gradle {version}" not in result["deep"]["stdout"]:
+            result["problems"].append(f"'gradle --version' ran, but its output does not mention 'Gradle {version}'.")
+    result["ok"] = not result["problems"]
+    return result
+
+def verify_gradle(check=None, deep=False):
+    # check: a check_gradle_installation() result (or a Future of one) started earlier.
+    global GRADLE_VERSION, GRADLE_HOME
+    console.print("Verifying Gradle installation...", style="info")
+    if check is None:
+        check = check_gradle_installation(GRADLE_HOME, GRADLE_VERSION, deep=deep)
+    elif isinstance(check, Future):
+        try:
+            check = check.result()
+        except Exception as e:
+            console.print(f"  [danger]An error occurred while verifying Gradle: {e}[/danger]"); return False
+
+    if check["receipt"]:
+        receipt = check["receipt"]
+        console.print(f"  [info]Build receipt in [path]{os.path.basename(check['receipt_jar'])}[/path]: version [variable]{receipt.get('versionNumber')}[/variable], "
+                      f"built {receipt.get('buildTimestampIso') or receipt.get('buildTimestamp', '?')}, commit {receipt.get('commitId', '?')[:12]}[/info]")
+        console.print(f"  [info]Checked launchers and {check['jars']} Gradle JARs without starting Java ({check['seconds'] * 1000:.0f} ms).[/info]")
+    if check["deep"]:
         console.print("-" * 60, style="dim")
-        if result.stdout:
-            console.print(Text(result.stdout.strip(), style="dim"))
-        if result.stderr:
-            console.print(f"[warning]stderr from gradle --version:\n{result.stderr.strip()}[/warning]")
+        if check["deep"]["stdout"]:
+            console.print(Text(check["deep"]["stdout"].strip(), style="dim"))
+        if check["deep"]["stderr"]:
+            console.print(f"[warning]stderr from gradle --version:\n{check['deep']['stderr'].strip()}[/warning]")
         console.print("-" * 60, style="dim")
-        
-        if result.returncode == 0 and f"Gradle {GRADLE_VERSION}" in result.stdout:
-            console.print(f"  [success]Gradle {GRADLE_VERSION} verified successfully![/success]"); return True
-        elif result.returncode == 0:
-            console.print(f"  [warning]Gradle command executed, but version string mismatch or not found in output. Expected '{GRADLE_VERSION}'.[/warning]")
-            return False
-        else:
-            console.print(f"  [danger]Gradle {GRADLE_VERSION} verification failed. Return code: {result.returncode}[/danger]"); return False
-    except Exception as e:
-        console.print(f"  [danger]An error occurred while verifying Gradle: {e}[/danger]"); return False
+    for problem in check["problems"]:
+        console.print(f"  [danger]{problem}[/danger]")
+    if check["ok"]:
+        console.print(f"  [success]Gradle {GRADLE_VERSION} verified successfully{' (including a JVM run)' if check['deep'] else ''}![/success]")
+    else:
+        console.print(f"  [danger]Gradle {GRADLE_VERSION} verification failed.[/danger]")
+    return check["ok"]
+
+def gradle_user_home():
+    return os.environ.get("GRADLE_USER_HOME") or os.path.join(os.path.expanduser("~"), ".gradle")
+
+def _process_image(pid):
+    # Full path of the executable of a running process, or None when it has exited
+    # (or cannot be queried). No process is spawned.
+    kernel32 = ctypes.windll.kernel32
+    handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+    if not handle:
+        return None
+    try:
+        exit_code = ctypes.c_ulong()
+        if not kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code)) or exit_code.value != STILL_ACTIVE:
+            return None
+        buffer = ctypes.create_unicode_buffer(32768)
+        size = ctypes.c_ulong(len(buffer))
+        if not kernel32.QueryFullProcessImageNameW(handle, 0, buffer, ctypes.byref(size)):
+            return None
+        return buffer.value
+    finally:
+        kernel32.CloseHandle(handle)
+
+def _process_command_line(pid):
+    # The command line of a running process, or None when it cannot be read.
+    class UNICODE_STRING(ctypes.Structure):
+        _fields_ = [("Length", ctypes.c_ushort), ("MaximumLength", ctypes.c_ushort), ("Buffer", ctypes.c_void_p)]
+    kernel32, ntdll = ctypes.windll.kernel32, ctypes.windll.ntdll
+    handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+    if not handle:
+        return None
+    try:
+        size = ctypes.c_ulong()
+        ntdll.NtQueryInformationProcess(handle, PROCESS_COMMAND_LINE_INFORMATION, None, 0, ctypes.byref(size))
+        if not size.value:
+            return None
+        buffer = ctypes.create_string_buffer(size.value)
+        if ntdll.NtQueryInformationProcess(handle, PROCESS_COMMAND_LINE_INFORMATION, buffer, size, ctypes.byref(size)) != 0:
+            return None
+        text = ctypes.cast(buffer, ctypes.POINTER(UNICODE_STRING)).contents
+        return ctypes.wstring_at(text.Buffer, text.Length // 2) if text.Buffer else ""
+    except (AttributeError, OSError):
+        return None
+    finally:
+        kernel32.CloseHandle(handle)
 
-def stop_gradle_daemons():
-    global GRADLE_HOME
-    console.print("Attempting to stop all running Gradle daemons (if any)...", style="info")
-    if not GRADLE_HOME or not os.path.isdir(GRADLE_HOME):
-        console.print(f"  [warning]GRADLE_HOME ([path]{GRADLE_HOME}[/path]) is not valid. Cannot stop daemons.[/warning]")
+def is_daemon_process(pid, version):
+    # Daemon logs outlive their processes and PIDs get reused, so a PID from a log name
+    # only counts when the live process is java(w).exe running GradleDaemon <version>.
+    # None: a live Java process whose command line could not be read (not confirmed).
+    image = _process_image(pid)
+    if not image or os.path.basename(image).lower() not in ("java.exe", "javaw.exe"):
         return False
-        
-    gradle_exe = os.path.join(GRADLE_HOME, "bin", "gradle.bat")
-    if not os.path.exists(gradle_exe):
-        console.print(f"  [warning]Gradle executable not found at [path]{gradle_exe}[/path]. Cannot stop daemons.[/warning]")
+    command_line = _process_command_line(pid)
+    if command_line is None:
+        return None
+    match = GRADLE_DAEMON_COMMAND_LINE.search(command_line)
+    return bool(match) and match.group(1) == version
+
+def find_gradle_daemons(user_home=None, unconfirmed=None):
+    # Every daemon writes <user home>/daemon/<version>/daemon-<pid>.out.log next to the
+    # version's registry.bin. Returns {version: [pid, ...]} for the ones confirmed to be
+    # running (see is_daemon_process); unconfirmed collects the (version, pid) left out.
+    daemon_dir = os.path.join(user_home or gradle_user_home(), "daemon")
+    daemons = {}
+    try:
+        versions = os.listdir(daemon_dir)
+    except OSError:
+        return daemons
+    for version in versions:
+        version_dir = os.path.join(daemon_dir, version)
+        if not os.path.isfile(os.path.join(version_dir, "registry.bin")):
+            continue
+        for name in os.listdir(version_dir):
+            pid = name[len("daemon-"):-len(".out.log")] if name.startswith("daemon-") and name.endswith(".out.log") else ""
+            if not pid.isdigit():
+                continue
+            running = is_daemon_process(int(pid), version)
+            if running:
+                daemons.setdefault(version, []).append(int(pid))
+            elif running is None and unconfirmed is not None:
+                unconfirmed.append((version, int(pid)))
+    return daemons
+
+def wait_for_processes_exit(pids, timeout=DAEMON_STOP_TIMEOUT):
+    # Returns the PIDs still running when the deadline passed (empty when all exited).
+    deadline = time.monotonic() + timeout
+    remaining = list(pids)
+    while remaining:
+        remaining = [pid for pid in remaining if _process_image(pid)]
+        if not remaining or time.monotonic() >= deadline:
+            break
+        time.sleep(DAEMON_POLL_INTERVAL)
+    return remaining
+
+def terminate_process(pid):
+    kernel32 = ctypes.windll.kernel32
+    handle = kernel32.OpenProcess(PROCESS_TERMINATE, False, pid)
+    if not handle:
         return False
-        
     try:
+        return bool(kernel32.TerminateProcess(handle, 1))
+    finally:
+        kernel32.CloseHandle(handle)
+
+def _gradle_launcher(version):
+    # The version's gradle.bat in INSTALL_DIR, else where its manifest says it was installed.
+    homes = [os.path.join(INSTALL_DIR, f"gradle-{version}")]
+    manifest = load_install_manifest(version)
+    if manifest:
+        homes.append(manifest["home"])
+    for home in homes:
+        gradle_exe = os.path.join(home, "bin", "gradle.bat")
+        if os.path.isfile(gradle_exe):
+            return gradle_exe
+    return None
+
+def stop_gradle_daemons(versions=None):
+    # Stops the daemons of versions (all when None): the ones whose files are about to
+    # be removed, wherever they were installed from. Daemons are found by version in
+    # the Gradle user home, not by install path.
+    console.print("Looking for running Gradle daemons...", style="info")
+    with TRACE.span("find daemons", "daemons") as span:
+        unconfirmed = []
+        daemons = find_gradle_daemons(unconfirmed=unconfirmed)
+        if versions is not None:
+            daemons = {version: pids for version, pids in daemons.items() if version in versions}
+            unconfirmed = [(version, pid) for version, pid in unconfirmed if version in versions]
+        span["versions"] = sorted(daemons)
+    for version, pid in unconfirmed:
+        console.print(f"  [warning]PID {pid} (named by a Gradle {version} daemon log) is a Java process that could not be confirmed "
+                      "as that daemon; it was left running. Stop it manually if it holds Gradle files open.[/warning]")
+    if not daemons:
+        console.print(f"  [success]No {'daemons of the replaced or removed Gradle versions' if versions is not None else 'Gradle daemons'} are running. Nothing to stop.[/success]")
+        return True
+
+    # 'gradle --stop' only reaches daemons of its own version, so each version is
+    # stopped with its own launcher; the stop requests run side by side. Daemons whose
+    # version has no launcher left (another install root, already removed) are ended
+    # directly; only confirmed daemons get here, never a PID guessed from a log name.
+    stopping = []
+    for version, pids in sorted(daemons.items(), key=lambda item: version_sort_key(item[0])):
+        console.print(f"  Found {len(pids)} Gradle {version} daemon(s) (PID {', '.join(map(str, pids))}).")
+        gradle_exe = _gradle_launcher(version)
+        if not gradle_exe:
+            console.print(f"  [warning]No Gradle {version} launcher to send the stop request with; ending its daemons directly.[/warning]")
+            if any([terminate_process(pid) for pid in pids]):
+                stopping.append((version, pids, None))
+            continue
         env = os.environ.copy()
-        env["GRADLE_HOME"] = GRADLE_HOME 
-        env["PATH"] = os.path.join(GRADLE_HOME, "bin") + os.pathsep + env["PATH"] 
+        env["GRADLE_HOME"] = os.path.dirname(os.path.dirname(gradle_exe))
+        try:
+            process = subprocess.Popen([gradle_exe, "--no-daemon", "--stop"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                       text=True, env=env, creationflags=subprocess.CREATE_NO_WINDOW)
+        except OSError as e:
+            console.print(f"  [danger]Error executing 'gradle --stop' for Gradle {version}: {e}[/danger]")
+            continue
+        stopping.append((version, pids, process))
 
-        result = subprocess.run([gradle_exe, "--no-daemon", "--stop"], capture_output=True, text=True, check=False, env=env, creationflags=subprocess.CREATE_NO_WINDOW)
-        
-        if result.stdout:
-            processed_stdout = result.stdout.strip().replace('\n', '\n  ') 
-            console.print(f"  [info]Output from 'gradle --stop':[/info]\n  [dim]{processed_stdout}[/dim]")
-        if result.stderr:
-            processed_stderr = result.stderr.strip().replace('\n', '\n  ')
-            console.print(f"  [warning]Error output from 'gradle --stop':[/warning]\n  [dim]{processed_stderr}[/dim]")
-
-        if result.returncode == 0:
-            console.print("  [success]Gradle '--stop' command executed successfully.[/success]")
-            console.print("  Waiting a few seconds for daemons to terminate gracefully...", style="info")
-            time.sleep(5) 
-            return True
-        else:
-            console.print("  [warning]Gradle '--stop' command finished with an error (this might be okay if no daemons were running or due to environment issues).[/warning]")
-            time.sleep(2)
-            return False 
-    except Exception as e:
-        console.print(f"  [danger]Error executing 'gradle --stop': {e}[/danger]")
+    started = time.monotonic()
+    for version, _, process in stopping:
+        if process is None:
+            continue
+        with TRACE.span("gradle --stop", "subprocess", version=version) as span:
+            try:
+                output, _ = process.communicate(timeout=max(1, DAEMON_STOP_TIMEOUT - (time.monotonic() - started)))
+            except subprocess.TimeoutExpired:
+                process.kill()
+                output, _ = process.communicate()
+                span["killed"] = True
+            span["returncode"] = process.returncode
+        if process.returncode != 0 and output:
+            processed_output = output.strip().replace('\n', '\n  ')
+            console.print(f"  [warning]'gradle --stop' for Gradle {version} finished with an error:[/warning]\n  [dim]{processed_output}[/dim]")
+    with TRACE.span("wait for daemons to exit", "daemons") as span:
+        remaining = wait_for_processes_exit([pid for _, pids, _ in stopping for pid in pids],
+                                            max(0, DAEMON_STOP_TIMEOUT - (time.monotonic() - started)))
+        span["remaining"] = len(remaining)
+    if remaining:
+        console.print(f"  [warning]{len(remaining)} daemon(s) still running after {DAEMON_STOP_TIMEOUT}s (PID {', '.join(map(str, remaining))}). Old versions they use may not be removable until they exit.[/warning]")
         return False
+    if stopping:
+        console.print(f"  [success]Stopped the daemons of {len(stopping)} Gradle version(s) ({time.monotonic() - started:.1f}s).[/success]")
+    return len(stopping) == len(daemons)
+
+def trash_dir_path(install_dir=None):
+    return os.path.join(install_dir or INSTALL_DIR, TRASH_DIR_NAME)
+
+def move_to_trash(path, install_dir=None):
+    # A rename within INSTALL_DIR is instant however many files the tree has; the slow
+    # deletion happens later in empty_trash(). Renaming fails while a process holds a
+    # file inside open, so it is retried briefly before giving up.
+    trash_dir = trash_dir_path(install_dir)
+    os.makedirs(trash_dir, exist_ok=True)
+    trash_path = os.path.join(trash_dir, f"{os.path.basename(path).lstrip('.')}-{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}")
+    for attempt in range(TRASH_RETRIES):
+        try:
+            os.replace(path, trash_path)
+            return trash_path
+        except PermissionError:
+            if attempt == TRASH_RETRIES - 1:
+                raise
+            time.sleep(TRASH_RETRY_DELAY * (attempt + 1))
 
-def cleanup_old_gradle_versions():
+def _remove_trash_file(path):
+    # Returns the path when it could not be deleted (still locked after the retries).
+    for attempt in range(TRASH_RETRIES):
+        try:
+            os.remove(path)
+            return None
+        except FileNotFoundError:
+            return None
+        except PermissionError:
+            try: os.chmod(path, 0o666) # Read-only files cannot be deleted on Windows.
+            except OSError: pass
+            if attempt:
+                time.sleep(TRASH_RETRY_DELAY * attempt)
+        except OSError:
+            if attempt:
+                time.sleep(TRASH_RETRY_DELAY * attempt)
+    return path
+
+def empty_trash(install_dir=None, workers=EXTRACT_WORKERS):
+    # Deletes everything in the trash, files in parallel and then directories bottom-up.
+    # Whatever stays locked is left for the next sweep. Returns (trees deleted, files left).
+    # Directory links (junctions, symlinks) are removed as links and never walked into,
+    # so nothing outside the trash is deleted.
+    trash_dir = trash_dir_path(install_dir)
+    try:
+        trees = [os.path.join(trash_dir, name) for name in os.listdir(trash_dir)]
+    except OSError:
+        return 0, 0
+    files, links, directories = [], [], []
+    for tree in trees:
+        if _is_dir_link(tree):
+            links.append(tree)
+            continue
+        if not os.path.isdir(tree):
+            files.append(tree)
+            continue
+        for root, dirnames, filenames in os.walk(tree):
+            linked = [name for name in dirnames if _is_dir_link(os.path.join(root, name))]
+            links.extend(os.path.join(root, name) for name in linked)
+            dirnames[:] = [name for name in dirnames if name not in linked] # Pruned before os.walk descends.
+            files.extend(os.path.join(root, name) for name in filenames)
+            directories.append(root)
+    left = []
+    for link in links:
+        try: _remove_dir_link(link)
+        except OSError: left.append(link)
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="gradle-trash") as pool:
+        left += [path for path in pool.map(_remove_trash_file, files) if path]
+    for directory in reversed(directories): # os.walk lists parents before their children.
+        try: os.rmdir(directory)
+        except OSError: pass
+    return sum(1 for tree in trees if not os.path.lexists(tree)), len(left)
+
+def start_trash_sweep(install_dir=None):
+    # Empties the trash in a detached, low-priority copy of this script ("empty-trash"), so
+    # the installer can finish without waiting. Returns the process, or None when there is
+    # nothing to delete or it could not be started (the next run sweeps again).
+    install_dir = install_dir or INSTALL_DIR
+    try:
+        if not os.listdir(trash_dir_path(install_dir)):
+            return None
+    except OSError:
+        return None
+    command = [sys.executable] if getattr(sys, 'frozen', False) else [sys.executable, os.path.abspath(__file__)]
+    command += ["empty-trash", "--install-dir", install_dir]
+    try:
+        with TRACE.span("start empty-trash", "subprocess"):
+            return subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                    close_fds=True, creationflags=TRASH_SWEEP_CREATION_FLAGS)
+    except (OSError, ValueError):
+        return None
+
+def plan_cleanup(current_home, keep=CLEANUP_KEEP_VERSIONS, install_dir=None):
+    # Retention policy: keep the `keep` newest installed versions, plus the version being
+    # installed, the one the "current" link points to, the rollback target and any
+    # install pinned in the index. Returns [(version, path)] to remove, newest first.
+    install_dir = install_dir or INSTALL_DIR
+    index = _load_install_index(_manifest_paths(install_dir)[2])
+    protected = {os.path.normcase(os.path.normpath(current_home))}
+    current_target = read_current_link(install_dir)
+    if current_target:
+        protected.add(os.path.normcase(os.path.normpath(current_target)))
+    for version in (index.get("current"), index.get("previous")):
+        if version:
+            protected.add(os.path.normcase(os.path.join(install_dir, f"gradle-{version}")))
+    protected.update(os.path.normcase(os.path.normpath(entry["home"])) for entry in index["installs"].values() if entry.get("pinned"))
+    installed = sorted(installed_versions(install_dir), key=lambda entry: version_sort_key(entry["version"]), reverse=True)
+    removable = []
+    for position, entry in enumerate(installed):
+        path = os.path.join(install_dir, f"gradle-{entry['version']}")
+        if position >= keep and os.path.normcase(os.path.normpath(path)) not in protected:
+            removable.append((entry["version"], path))
+    return removable
+
+def cleanup_old_gradle_versions(keep=CLEANUP_KEEP_VERSIONS, removals=None):
+    # removals: a plan_cleanup() result computed earlier (to stop those versions' daemons first).
     global INSTALL_DIR, GRADLE_HOME 
-    console.print(f"Cleaning up old Gradle installations in [path]{INSTALL_DIR}[/path] (excluding current: [path]{GRADLE_HOME}[/path])...", style="info")
+    console.print(f"Cleaning up old Gradle installations in [path]{INSTALL_DIR}[/path] (keeping the {keep} newest, the active one, the rollback target and pinned ones)...", style="info")
     if not os.path.isdir(INSTALL_DIR):
         console.print(f"  [info]Installation directory [path]{INSTALL_DIR}[/path] not found. Nothing to clean.[/info]")
         return
 
     cleaned_count = 0
     error_count = 0
-    normalized_current_gradle_home = os.path.normpath(GRADLE_HOME)
-
-    for item_name in os.listdir(INSTALL_DIR):
-        item_path = os.path.join(INSTALL_DIR, item_name)
-        if os.path.isdir(item_path) and item_name.startswith("gradle-") and os.path.normpath(item_path) != normalized_current_gradle_home:
-            console.print(f"  Attempting to remove old version: [path]{item_path}[/path]")
-            try:
-                shutil.rmtree(item_path)
-                console.print(f"    [success]Successfully removed [path]{item_path}[/path][/success]")
-                cleaned_count += 1
-            except OSError as e: 
-                console.print(f"    [danger]Failed to remove [path]{item_path}[/path]: {e}[/danger]")
-                console.print(f"    [info]This might be due to lingering processes. A reboot might be required to fully clean up, or manually delete it later.[/info]")
-                error_count += 1
+    for version, item_path in (plan_cleanup(GRADLE_HOME, keep) if removals is None else removals):
+        try:
+            move_to_trash(item_path)
+            remove_install_record(version)
+            console.print(f"  [success]Removed old version [path]{item_path}[/path][/success]")
+            cleaned_count += 1
+        except OSError as e: 
+            console.print(f"  [danger]Failed to remove [path]{item_path}[/path]: {e}[/danger]")
+            console.print(f"    [info]Files in it are still in use, probably by a running Gradle or IDE process. The next run will try again.[/info]")
+            error_count += 1
     
     if cleaned_count == 0 and error_count == 0:
-        console.print("  No old Gradle versions found to remove (other than the current one).", style="info")
+        console.print("  No old Gradle versions to remove under the retention policy.", style="info")
     elif error_count > 0:
         console.print(f"  [warning]Cleanup attempt finished. {cleaned_count} old version(s) removed. {error_count} version(s) could not be automatically removed.[/warning]")
     else: 
         console.print(f"  [success]Successfully cleaned up {cleaned_count} old Gradle version(s).[/success]")
+    if start_trash_sweep():
+        console.print("  [info]Their files are being deleted in the background.[/info]")
 
-def main():
-    global GRADLE_VERSION, DOWNLOAD_URL, GRADLE_ZIP_NAME, GRADLE_ZIP_PATH
-    global GRADLE_HOME_DIR_NAME, GRADLE_HOME, TEMP_DIR, INSTALL_DIR
+def start_speculative_download(offline=False, reuse=None):
+    # Start fetching before the user confirms the settings; the partial download is
+    # resumable, so an abort afterwards only leaves a .part file in TEMP_DIR for the
+    # next run. Streamed extraction waits for activate(), so nothing is written under
+    # INSTALL_DIR before the user has said yes.
+    if offline:
+        return None
+    try:
+        if cache_lookup(GRADLE_VERSION)[0]:
+            return None
+    except (OSError, TimeoutError):
+        pass
+    extractor = StreamingExtractor(staging_dir_for(GRADLE_HOME_DIR_NAME), reuse=reuse, active=False) if STREAM_EXTRACT else None
+    return BackgroundDownload(DOWNLOAD_URL, GRADLE_ZIP_PATH, extractor=extractor, mirrors=DOWNLOAD_MIRROR_URLS).start()
 
-    if not is_admin():
-        console.clear()
-        try: console.show_cursor(False) 
-        except Exception: pass
-        
-        print_logo()
-        console.print()
-        console.print(Panel("[b yellow]ADMINISTRATOR PRIVILEGES REQUIRED[/b yellow]\n\n"
-                            "This script needs administrator privileges to install Gradle, modify\n"
-                            "system environment variables, and create system-wide settings.\n\n"
-                            "It can attempt to restart itself with the required permissions.",
-                            title="Permissions Notice", border_style="yellow", expand=False))
-        console.print()
-        
-        if Confirm.ask("Do you want to try restarting as administrator now?", default=True, console=console):
-            console.print("\nAttempting to re-launch with admin rights...", style="info")
-            time.sleep(1)  
-            
-            if run_as_admin():
-                sys.exit(0) 
+def download_gradle_distribution(download=None):
+    global GRADLE_ZIP_SHA256
+    download = download or BackgroundDownload(DOWNLOAD_URL, GRADLE_ZIP_PATH, mirrors=DOWNLOAD_MIRROR_URLS).start()
+    console.print(f"Downloading Gradle {GRADLE_VERSION} from [link={DOWNLOAD_URL}]{DOWNLOAD_URL}[/link]...", style="info")
+    try:
+        with transfer_progress(transient=False, eta=True) as progress:
+            download_task = progress.add_task(f"Downloading {GRADLE_ZIP_NAME}", total=download.total, completed=download.completed)
+            while True:
+                finished = download.wait(0.1)
+                progress.update(download_task, total=download.total, completed=download.completed)
+                for event, url, detail in download.pop_mirror_events():
+                    if event == "selected":
+                        progress.console.print(f"  [info]Using mirror [link={url}]{url}[/link] ({detail}).[/info]")
+                    elif event == "rejected":
+                        progress.console.print(f"  [warning]Skipping mirror {url}: {detail}.[/warning]")
+                    else:
+                        progress.console.print(f"  [warning]Mirror {url} failed ({detail}).[/warning]")
+                for attempt, delay, error in download.pop_retries():
+                    progress.console.print(f"  [warning]Download interrupted ({error}). Resuming in {delay:.0f}s (attempt {attempt}/{DOWNLOAD_RETRIES})...[/warning]")
+                if finished:
+                    break
+            total_size, GRADLE_ZIP_SHA256 = download.result()
+            progress.update(download_task, completed=total_size, total=total_size, refresh=True) # Ensure 100%
+        console.print("  [success]Download complete.[/success]")
+        if download.expected_sha256:
+            console.print(f"  [success]SHA-256 checksum verified: [variable]{download.expected_sha256}[/variable][/success]")
+        else:
+            console.print(f"  [warning]Could not fetch the published SHA-256 from [link={DOWNLOAD_URL}.sha256]{DOWNLOAD_URL}.sha256[/link]{' or any mirror' if download.mirrors else ''}. The download was not verified.[/warning]")
+    except ChecksumMismatchError as e:
+        console.print(f"  [danger]Download failed integrity check: {e}[/danger]")
+        console.print("  [danger]The corrupted download was deleted. Extraction was not attempted.[/danger]")
+        sys.exit(EXIT_FAILED)
+    except requests.exceptions.Timeout:
+        console.print(f"  [danger]Download failed: The request timed out connecting to or reading from {DOWNLOAD_URL}[/danger]")
+        console.print(f"  [info]The partial download was kept in [path]{TEMP_DIR}[/path]; re-run the installer to resume it.[/info]")
+        sys.exit(EXIT_FAILED)
+    except (requests.RequestException, DownloadError) as e:
+        console.print(f"  [danger]Download failed: {e}[/danger]")
+        console.print(f"  [info]The partial download was kept in [path]{TEMP_DIR}[/path]; re-run the installer to resume it.[/info]")
+        sys.exit(EXIT_FAILED)
+
+    try:
+        with TRACE.span("cache insert", "cache"):
+            cached_path, evicted = cache_insert(GRADLE_ZIP_PATH, GRADLE_VERSION, GRADLE_ZIP_SHA256)
+        console.print(f"  [info]Stored in distribution cache: [path]{cached_path}[/path][/info]")
+        if evicted:
+            console.print(f"  [info]Evicted {len(evicted)} least recently used distribution(s) to stay under the cache size limit.[/info]")
+    except (OSError, TimeoutError) as e:
+        console.print(f"  [warning]Could not store the distribution in the cache [path]{CACHE_DIR}[/path]: {e}[/warning]")
+
+def use_cached_distribution():
+    global GRADLE_ZIP_PATH, GRADLE_ZIP_SHA256
+    try:
+        cached_path, cached_sha256 = cache_lookup(GRADLE_VERSION)
+    except (OSError, TimeoutError) as e:
+        console.print(f"  [warning]Distribution cache [path]{CACHE_DIR}[/path] is unavailable: {e}[/warning]")
+        return False
+    if not cached_path:
+        return False
+    GRADLE_ZIP_PATH, GRADLE_ZIP_SHA256 = cached_path, cached_sha256
+    TRACE.mark("distribution cache hit", "cache", version=GRADLE_VERSION)
+    console.print(f"Using cached Gradle {GRADLE_VERSION} distribution [path]{cached_path}[/path]", style="info")
+    console.print(f"  [success]SHA-256: [variable]{cached_sha256}[/variable] (no download needed)[/success]")
+    return True
+
+def _repair_version(spec="latest", offline=False):
+    # An explicit version, else the one GRADLE_HOME points to, else the newest installed.
+    if spec and spec != "latest":
+        if os.path.isdir(installed_home(spec)):
+            return spec
+        return resolve_gradle_version(spec, offline=offline)
+    active_home = resolve_active_home(get_system_env_var("GRADLE_HOME"))
+    if active_home and os.path.isdir(active_home):
+        active_name = os.path.basename(os.path.normpath(active_home))
+        if active_name.startswith("gradle-"):
+            return active_name[len("gradle-"):]
+    installed = [status for status in install_status(check_files=False) if status["present"]]
+    return installed[0]["version"] if installed else None
+
+def repair_gradle(spec="latest", offline=False):
+    version = _repair_version(spec, offline)
+    if not version:
+        console.print("[danger]No installed Gradle version found to repair.[/danger]")
+        return False
+    update_global_config(version)
+    home = installed_home(version)
+    console.rule(f"[bold cyan]Repairing Gradle {GRADLE_VERSION}[/bold cyan]")
+    if not os.path.isdir(home):
+        console.print(f"[danger]Gradle {GRADLE_VERSION} is not installed at [path]{home}[/path]; run the installer instead.[/danger]")
+        return False
+    if not use_cached_distribution():
+        if offline:
+            console.print(f"[danger]Gradle {GRADLE_VERSION} is not in the distribution cache [path]{CACHE_DIR}[/path] and --offline was given.[/danger]")
+            return False
+        download_gradle_distribution()
+
+    started = time.perf_counter()
+    with transfer_progress() as progress:
+        verify_task = progress.add_task(f"Verifying {GRADLE_HOME_DIR_NAME}", total=None)
+        damaged = verify_install_tree(GRADLE_ZIP_PATH, os.path.dirname(home), progress=progress, task_id=verify_task)
+    console.print(f"  [info]Checked every file against the archive in {time.perf_counter() - started:.2f}s.[/info]")
+    if damaged:
+        console.print(f"  [warning]{len(damaged)} damaged or missing entries:[/warning]")
+        for member, reason in damaged[:20]:
+            console.print(f"    [path]{member.filename}[/path]: {reason}")
+        if len(damaged) > 20:
+            console.print(f"    ... and {len(damaged) - 20} more.")
+        try:
+            stats = repair_install_tree(GRADLE_ZIP_PATH, os.path.dirname(home), damaged)
+        except (OSError, zipfile.BadZipFile) as e:
+            console.print(f"  [danger]Repair failed: {e}. Close programs that use Gradle and try again.[/danger]")
+            return False
+        console.print(f"  [success]Re-extracted {stats['files']} file(s) ({stats['bytes'] / (1024 * 1024):.1f} MB); everything else was left in place.[/success]")
+    else:
+        console.print("  [success]All files are intact. Nothing to repair.[/success]")
+    try:
+        write_install_manifest(GRADLE_VERSION, home, DOWNLOAD_URL, GRADLE_ZIP_SHA256, GRADLE_ZIP_PATH)
+    except (OSError, TimeoutError) as e:
+        console.print(f"  [warning]Could not record the install manifest: {e}[/warning]")
+    if not is_cached_distribution(GRADLE_ZIP_PATH) and os.path.exists(GRADLE_ZIP_PATH):
+        try: os.remove(GRADLE_ZIP_PATH)
+        except OSError: pass
+    return True
+
+def _base36(number):
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    text = ""
+    while number:
+        number, remainder = divmod(number, 36)
+        text = digits[remainder] + text
+    return text or "0"
+
+def wrapper_distribution_url(spec):
+    # A full distributionUrl, or a version for the official -bin distribution (what 'gradle wrapper' writes).
+    return spec if "://" in spec else f"{WRAPPER_DISTRIBUTION_BASE_URL}/gradle-{spec}-bin.zip"
+
+def wrapper_dist_dir(url, user_home=None):
+    # Same layout as the wrapper's PathAssembler: dists/<zip name without .zip>/<hash>,
+    # hash being the MD5 of the URL string as an unsigned number in base 36.
+    zip_name = url.rstrip("/").rsplit("/", 1)[-1]
+    dist_name = zip_name[:-len(".zip")] if zip_name.endswith(".zip") else zip_name
+    url_hash = _base36(int.from_bytes(hashlib.md5(url.encode("utf-8")).digest(), "big"))
+    return os.path.join(user_home or gradle_user_home(), "wrapper", "dists", dist_name, url_hash), zip_name
+
+def link_tree(source_dir, target_dir, workers=EXTRACT_WORKERS):
+    # Hardlinks every file of source_dir into target_dir (copies across volumes). Returns the number of files.
+    pairs = []
+    for root, _, filenames in os.walk(source_dir):
+        target_root = os.path.join(target_dir, os.path.relpath(root, source_dir))
+        os.makedirs(target_root, exist_ok=True)
+        pairs.extend((os.path.join(root, name), os.path.join(target_root, name)) for name in filenames)
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="gradle-link") as pool:
+        list(pool.map(lambda pair: reuse_file(*pair), pairs))
+    return len(pairs)
+
+def seed_wrapper_distribution(url, zip_path, gradle_home=None, user_home=None):
+    # Populates the wrapper's dists directory for url, so 'gradlew' finds the distribution
+    # instead of downloading it. The tree is hardlinked from an unmodified installation
+    # when there is one (extracted from the ZIP otherwise) and staged, the ZIP is linked
+    # next to it, and the .ok marker is written last, because the wrapper treats a
+    # directory without it as an interrupted download. Returns (dist_dir, seeded).
+    dist_dir, zip_name = wrapper_dist_dir(url, user_home)
+    marker_path = os.path.join(dist_dir, f"{zip_name}.ok")
+    if os.path.exists(marker_path):
+        return dist_dir, False
+    os.makedirs(dist_dir, exist_ok=True)
+    with zipfile.ZipFile(zip_path, "r") as archive:
+        top_level_names = {member.filename.split("/", 1)[0] for member in archive.infolist()}
+    staging_dir = os.path.join(dist_dir, f".seed-{os.getpid()}")
+    if os.path.exists(staging_dir):
+        shutil.rmtree(staging_dir)
+    os.makedirs(staging_dir)
+    try:
+        manifest = load_install_manifest(os.path.basename(gradle_home)[len("gradle-"):]) if gradle_home else None
+        if (manifest and len(top_level_names) == 1 and os.path.basename(gradle_home) in top_level_names
+                and check_install_files(manifest) == ([], [])):
+            link_tree(gradle_home, os.path.join(staging_dir, os.path.basename(gradle_home)))
+        else:
+            extract_archive(zip_path, staging_dir)
+        for displaced_path in promote_staged_tree(staging_dir, dist_dir):
+            shutil.rmtree(displaced_path, ignore_errors=True) # A partial tree left by an interrupted wrapper download.
+    except BaseException:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+    reuse_file(zip_path, os.path.join(dist_dir, zip_name))
+    open(marker_path, "w").close()
+    return dist_dir, True
+
+def seed_gradle_wrappers(specs, offline=False, known_zips=None, install_dir=None):
+    # specs: wrapper distributionUrls or versions. ZIPs come from known_zips, the
+    # distribution cache or a download (which is then cached).
+    install_dir = install_dir or INSTALL_DIR
+    console.print(f"Seeding the Gradle wrapper cache in [path]{os.path.join(gradle_user_home(), 'wrapper', 'dists')}[/path]...", style="info")
+    failures = 0
+    for spec in specs:
+        url = wrapper_distribution_url(spec)
+        zip_name = url.rsplit("/", 1)[-1]
+        cache_key = distribution_cache_key(zip_name)
+        zip_path = (known_zips or {}).get(url)
+        temp_zip_path = None
+        try:
+            if not zip_path:
+                zip_path = cache_lookup(cache_key)[0]
+            if not zip_path:
+                if offline:
+                    console.print(f"  [warning]{zip_name} is not in the distribution cache; skipped in offline mode.[/warning]")
+                    failures += 1
+                    continue
+                temp_zip_path = os.path.join(TEMP_DIR, zip_name)
+                os.makedirs(TEMP_DIR, exist_ok=True)
+                with transfer_progress() as progress:
+                    download_task = progress.add_task(f"Downloading {zip_name}", total=None)
+                    _, sha256 = download_file(url, temp_zip_path, expected_sha256=fetch_published_sha256(url),
+                                              progress=progress, task_id=download_task,
+                                              mirrors=[mirror_url(mirror, zip_name) for mirror in DOWNLOAD_MIRRORS]
+                                                      + ([] if url.startswith(SERVICES_BASE_URL) else [f"{SERVICES_BASE_URL}/distributions/{zip_name}"]))
+                zip_path = cache_insert(temp_zip_path, cache_key, sha256)[0]
+            installed_home = os.path.join(install_dir, f"gradle-{cache_key}")
+            dist_dir, seeded = seed_wrapper_distribution(url, zip_path, installed_home if os.path.isdir(installed_home) else None)
+            if seeded:
+                console.print(f"  [success]Seeded {zip_name} for [link={url}]{url}[/link][/success]")
+            else:
+                console.print(f"  [info]{zip_name} is already in the wrapper cache ([path]{dist_dir}[/path]).[/info]")
+        except (OSError, zipfile.BadZipFile, requests.RequestException, DownloadError) as e:
+            console.print(f"  [danger]Could not seed {url}: {e}[/danger]")
+            failures += 1
+        finally:
+            if temp_zip_path and os.path.exists(temp_zip_path):
+                try: os.remove(temp_zip_path)
+                except OSError: pass
+    return failures == 0
+
+def distribution_cache_key(zip_name):
+    # gradle-8.14.3-bin.zip -> "8.14.3" (the key installs use); -all (and other) flavours get their own key.
+    cache_key = zip_name[len("gradle-"):-len(".zip")]
+    return cache_key[:-len("-bin")] if cache_key.endswith("-bin") else cache_key
+
+def parse_range_header(value, size):
+    # A single "bytes=" range as (start, end); False when the header should be ignored
+    # (several ranges, other units, garbage), None when it cannot be satisfied.
+    unit, _, ranges = value.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return False
+    first, separator, last = ranges.strip().partition("-")
+    if not separator or not (first.isdigit() or last.isdigit()) or (first and not first.isdigit()) or (last and not last.isdigit()):
+        return False
+    if not first:
+        start, end = max(0, size - int(last)), size - 1 # Suffix range: the last N bytes.
+        return (start, end) if int(last) and size else None
+    start, end = int(first), min(int(last), size - 1) if last else size - 1
+    return (start, end) if start <= end else None
+
+class DistributionProxyServer(http.server.ThreadingHTTPServer):
+    request_queue_size = 128 # A rollout starts hundreds of installers within seconds.
+
+    def __init__(self, address):
+        super().__init__(address, DistributionProxyHandler)
+        self.versions_lock = threading.Lock() # fetch_versions_api() rewrites one cache file per endpoint
+        self.fills = {} # zip name -> Future of its upstream fetch (see fill)
+        self.touched = {} # SHA-256 -> time.monotonic() of its last cache_touch()
+        self.state_lock = threading.Lock()
+        self.checksums = {} # zip name -> published SHA-256 of distributions not cached yet
+
+    def fill(self, zip_name):
+        # The Future of the upstream fetch of zip_name into the cache, started unless one
+        # is running. Its error reaches the requests waiting on it; the next one retries.
+        with self.state_lock:
+            future = self.fills.get(zip_name)
+            if future is None or future.done():
+                future = self.fills[zip_name] = run_in_background(self.fetch_distribution, zip_name)
+            return future
+
+    def fetch_distribution(self, zip_name):
+        url = f"{SERVICES_BASE_URL}/distributions/{zip_name}"
+        temp_zip_path = os.path.join(TEMP_DIR, "serve", zip_name)
+        os.makedirs(os.path.dirname(temp_zip_path), exist_ok=True)
+        console.print(Text(f"  fetching {url} upstream", style="dim"))
+        _, sha256 = download_file(url, temp_zip_path, expected_sha256=fetch_published_sha256(url),
+                                  mirrors=[mirror_url(mirror, zip_name) for mirror in DOWNLOAD_MIRRORS])
+        try:
+            return cache_insert(temp_zip_path, distribution_cache_key(zip_name), sha256)[0], sha256
+        finally:
+            os.remove(temp_zip_path)
+
+    def touch(self, sha256):
+        # The LRU time of a served ZIP is refreshed off the request path, and only now and
+        # then, so concurrent requests never queue on the cache lock.
+        now = time.monotonic()
+        with self.state_lock:
+            if now - self.touched.get(sha256, -DISTRIBUTION_PROXY_TOUCH_INTERVAL) < DISTRIBUTION_PROXY_TOUCH_INTERVAL:
+                return
+            self.touched[sha256] = now
+        run_in_background(cache_touch, sha256)
+
+class DistributionProxyHandler(http.server.BaseHTTPRequestHandler):
+    # Answers /versions/<endpoint> and /distributions/<zip>[.sha256] like services.gradle.org,
+    # from the local caches. The first request for a ZIP starts one upstream fetch (with
+    # the configured mirrors) that feeds the site; requests that arrive while it runs get
+    # a 503 with Retry-After once DISTRIBUTION_PROXY_FILL_WAIT has passed, which the
+    # installers' download retries honour. A .sha256 never waits for its ZIP: it comes
+    # from the cache or the small upstream file. Cache hits never take the cache lock.
+    protocol_version = "HTTP/1.1"
+    server_version = "GradleInstallerProxy/1.0"
+
+    def do_HEAD(self):
+        self.do_GET(head=True)
+
+    def do_GET(self, head=False):
+        path = urllib.parse.urlsplit(self.path).path
+        self.response_started = False
+        try:
+            if path.startswith("/versions/") and DISTRIBUTION_PROXY_ENDPOINT.fullmatch(path[len("/versions/"):]):
+                self._send_versions(path[len("/versions/"):], head)
+            elif path.startswith("/distributions/") and DISTRIBUTION_PROXY_ZIP.fullmatch(path[len("/distributions/"):].removesuffix(".sha256")):
+                zip_name = path[len("/distributions/"):].removesuffix(".sha256")
+                if path.endswith(".sha256"):
+                    self._send_bytes(200, self._distribution_sha256(zip_name).encode("ascii"), "text/plain", head)
+                elif cached := self._cached_distribution(zip_name):
+                    self._send_file(*cached, head)
+                else:
+                    self._send_failure(503, f"{zip_name} is being fetched upstream; retry shortly.", head, retry_after=True)
             else:
-                console.print("[warning]Could not automatically restart with admin rights.[/warning]")
-                console.print("Please close this window and run the script manually as an administrator (right-click -> Run as administrator).")
-                if getattr(sys, 'frozen', False): Prompt.ask("Press Enter to exit.", console=console)
-                else: input("Press Enter to exit.")
-                sys.exit(1)
+                self._send_bytes(404, b"Not found\n", "text/plain", head)
+        except requests.HTTPError as e:
+            status = e.response.status_code if e.response is not None and e.response.status_code == 404 else 502
+            self._send_failure(status, f"Upstream: {e}", head)
+        except (requests.RequestException, DownloadError, ValueError) as e:
+            self._send_failure(502, f"Upstream: {e}", head)
+        except CacheLockTimeout as e:
+            self._send_failure(503, f"Cache busy: {e}", head, retry_after=True)
+        except (ConnectionError, TimeoutError):
+            self.close_connection = True # The client went away mid-response.
+        except OSError as e:
+            self._send_failure(500, f"Cache: {e}", head)
+
+    def send_response(self, code, message=None):
+        self.response_started = True
+        super().send_response(code, message)
+
+    def _send_failure(self, status, message, head, retry_after=False):
+        if self.response_started:
+            self.close_connection = True # Too late for an error status; the client sees a short body.
+            return
+        self._send_bytes(status, f"{message}\n".encode("utf-8"), "text/plain", head,
+                         retry_after=DISTRIBUTION_PROXY_RETRY_AFTER if retry_after else None)
+
+    def _send_versions(self, endpoint, head):
+        with self.server.versions_lock:
+            data, _ = fetch_versions_api(endpoint)
+        if data is None:
+            raise DownloadError(f"No version information for '{endpoint}'.")
+        body = json.dumps(data).encode("utf-8")
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        if self.headers.get("If-None-Match") == etag:
+            self._send_bytes(304, b"", None, head=True, etag=etag)
+        else:
+            self._send_bytes(200, body, "application/json", head, etag=etag)
+
+    def _distribution_sha256(self, zip_name):
+        sha256 = cache_lookup(distribution_cache_key(zip_name), touch=False)[1] or self.server.checksums.get(zip_name)
+        if sha256:
+            return sha256
+        urls = [f"{SERVICES_BASE_URL}/distributions/{zip_name}"] + [mirror_url(mirror, zip_name) for mirror in DOWNLOAD_MIRRORS]
+        sha256 = next(filter(None, map(fetch_published_sha256, urls)), None)
+        if not sha256:
+            raise DownloadError(f"No published SHA-256 for {zip_name}.")
+        self.server.checksums[zip_name] = sha256
+        return sha256
+
+    def _cached_distribution(self, zip_name):
+        # (path, SHA-256) of the cached ZIP, or None while its upstream fetch still runs.
+        zip_path, sha256 = cache_lookup(distribution_cache_key(zip_name), touch=False)
+        if zip_path:
+            self.server.touch(sha256)
+            return zip_path, sha256
+        future = self.server.fill(zip_name)
+        try:
+            return future.result(timeout=DISTRIBUTION_PROXY_FILL_WAIT)
+        except FuturesTimeoutError:
+            if future.done():
+                raise # The fetch itself failed with a timeout (the same class since Python 3.11).
+            return None
+
+    def _send_bytes(self, status, body, content_type, head=False, etag=None, retry_after=None):
+        self.send_response(status)
+        if content_type:
+            self.send_header("Content-Type", content_type)
+        if etag:
+            self.send_header("ETag", etag)
+        if retry_after:
+            self.send_header("Retry-After", str(retry_after))
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if not head and body:
+            self.wfile.write(body)
+
+    def _send_file(self, zip_path, sha256, head):
+        etag = f'"{sha256}"' # The content hash is a strong validator for If-Range.
+        with open(zip_path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            start, end, status = 0, size - 1, 200
+            if self.headers.get("Range") and self.headers.get("If-Range", etag) == etag:
+                requested = parse_range_header(self.headers["Range"], size)
+                if requested is None:
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{size}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                if requested:
+                    (start, end), status = requested, 206
+            self.send_response(status)
+            self.send_header("Content-Type", "application/zip")
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", email.utils.formatdate(os.fstat(f.fileno()).st_mtime, usegmt=True))
+            if status == 206:
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            self.send_header("Content-Length", str(end - start + 1))
+            self.end_headers()
+            if not head:
+                # os.sendfile where the platform has it: the bytes go from the page cache to the socket.
+                self.connection.sendfile(f, start, end - start + 1)
+
+    def log_message(self, format, *args):
+        console.print(Text(f"  {self.address_string()} {format % args}", style="dim"))
+
+def serve_distributions(host, port):
+    try:
+        server = DistributionProxyServer((host, port))
+    except OSError as e:
+        console.print(f"[danger]Cannot listen on {host}:{port}: {e}[/danger]"); return False
+    shown_host = host if host not in ("", "0.0.0.0") else socket.gethostname()
+    console.print(Panel(f"Serving the Gradle versions API and distributions on [link=http://{shown_host}:{port}]http://{shown_host}:{port}[/link]\n"
+                        f"Upstream: [link={SERVICES_BASE_URL}]{SERVICES_BASE_URL}[/link]{f' (+{len(DOWNLOAD_MIRRORS)} mirror(s))' if DOWNLOAD_MIRRORS else ''}\n"
+                        f"Cache: [path]{CACHE_DIR}[/path]\n\n"
+                        f"Point the other installers at it with [yellow]--services-url http://{shown_host}:{port}[/yellow].\n"
+                        "Press Ctrl+C to stop.", title="Distribution Proxy", border_style="cyan", expand=False))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        console.print("Stopping the distribution proxy.", style="info")
+    finally:
+        server.server_close()
+    return True
+
+def enter_background_mode():
+    # Windows background processing mode: below-normal CPU and very low I/O and memory
+    # priority for this process, so a prefetch never slows down builds. Best effort.
+    try:
+        kernel32 = ctypes.windll.kernel32
+        return bool(kernel32.SetPriorityClass(kernel32.GetCurrentProcess(), PROCESS_MODE_BACKGROUND_BEGIN))
+    except (AttributeError, OSError):
+        pass
+    try:
+        os.nice(10)
+        return True
+    except (AttributeError, OSError):
+        return False
+
+def prefetch_round(specs, bandwidth=None):
+    # One check: revalidates the versions API (a conditional request, so usually a 304)
+    # and downloads every resolved version that is not in the distribution cache yet.
+    # Returns the number of versions that could not be resolved or fetched.
+    versions = []
+    failures = 0
+    for spec in specs:
+        version = resolve_gradle_version(spec, ttl=0)
+        if not version:
+            # Between releases there is no active release candidate; that is not a failure
+            # as long as the versions API answered.
+            failures += not (spec.strip().lower() == "rc" and fetch_versions_api("all", offline=True)[0])
+        elif version not in versions:
+            versions.append(version)
+    for version in versions:
+        try:
+            cached_path = cache_lookup(version)[0]
+        except (OSError, TimeoutError) as e:
+            console.print(f"  [danger]Distribution cache [path]{CACHE_DIR}[/path] is unavailable: {e}[/danger]")
+            return failures + 1
+        if cached_path:
+            console.print(f"  [info]Gradle {version} is already cached ([path]{cached_path}[/path]).[/info]")
+            continue
+        # Its own temp directory, so an installer run at the same time never shares a .part file with it.
+        install = GradleInstall(version, temp_dir=os.path.join(TEMP_DIR, "prefetch"))
+        try:
+            os.makedirs(os.path.dirname(install.zip_path), exist_ok=True)
+            expected_sha256 = fetch_published_sha256(install.url)
+            with TRACE.span(f"prefetch {version}", "prefetch"), transfer_progress() as progress:
+                download_task = progress.add_task(f"Prefetching {install.zip_name}", total=None)
+                _, sha256 = download_file(install.url, install.zip_path, expected_sha256=expected_sha256,
+                                          progress=progress, task_id=download_task, mirrors=install.mirror_urls, throttle=bandwidth)
+            cached_path = cache_insert(install.zip_path, version, sha256)[0]
+            os.remove(install.zip_path)
+            console.print(f"  [success]Prefetched Gradle {version} into [path]{cached_path}[/path] (SHA-256 {sha256}"
+                          f"{', verified' if expected_sha256 else ', not verified: no published checksum'}).[/success]")
+        except (OSError, TimeoutError, requests.RequestException, DownloadError) as e:
+            console.print(f"  [danger]Could not prefetch Gradle {version}: {e}[/danger]")
+            failures += 1
+    return failures
+
+def prefetch_distributions(specs, interval=0, max_bandwidth=None):
+    # Keeps the newest releases in the distribution cache, so the next install or upgrade
+    # only extracts. Run once from a scheduled task, or keep running with an interval.
+    # Returns the exit code.
+    enter_background_mode()
+    bandwidth = RateLimiter.from_megabytes(max_bandwidth)
+    while True:
+        failures = prefetch_round(specs, bandwidth)
+        if not interval:
+            return EXIT_FAILED if failures else EXIT_OK
+        delay = interval * 3600 * (1 + random.uniform(-PREFETCH_JITTER, PREFETCH_JITTER))
+        console.print(f"Next check at {time.strftime('%Y-%m-%d %H:%M', time.localtime(time.time() + delay))}.", style="info")
+        try:
+            time.sleep(delay)
+        except KeyboardInterrupt:
+            console.print("Stopping the prefetcher.", style="info")
+            return EXIT_OK
+
+def installed_versions(install_dir=None):
+    # gradle-<version> directories, shaped like versions API entries for select_gradle_version().
+    install_dir = install_dir or INSTALL_DIR
+    versions = []
+    if os.path.isdir(install_dir):
+        for item_name in os.listdir(install_dir):
+            if item_name.startswith("gradle-") and os.path.isdir(os.path.join(install_dir, item_name)):
+                version = item_name[len("gradle-"):]
+                versions.append({"version": version, "rcFor": "-rc-" in version, "activeRc": "-rc-" in version,
+                                 "milestoneFor": "-milestone-" in version})
+    return versions
+
+def is_installed(version, install_dir=None):
+    # Installed by this script and its launchers are in place.
+    install_dir = install_dir or INSTALL_DIR
+    gradle_home = os.path.join(install_dir, f"gradle-{version}")
+    return bool(load_install_manifest(version, install_dir) and
+                all(os.path.isfile(os.path.join(gradle_home, "bin", launcher)) for launcher in ("gradle", "gradle.bat")))
+
+def installed_and_active(version, install_dir=None):
+    # True when version was installed by this script, the current link points to it and
+    # the system GRADLE_HOME and Path lead there: what installing it again would produce.
+    install_dir = install_dir or INSTALL_DIR
+    gradle_home = os.path.join(install_dir, f"gradle-{version}")
+    if not is_installed(version, install_dir) or read_current_link(install_dir) != os.path.realpath(gradle_home):
+        return False
+    active_home = current_link_path(install_dir)
+    active_bin = os.path.normpath(os.path.join(active_home, "bin"))
+    return (get_system_env_var("GRADLE_HOME") == active_home and
+            any(os.path.normpath(entry) == active_bin for entry in (get_system_env_var("Path") or "").split(";") if entry))
+
+def provision_install(install, progress=None, task_id=None, offline=False, reuse=None, workers=EXTRACT_WORKERS,
+                      segments=DOWNLOAD_SEGMENTS, bandwidth=None, disk_io=None):
+    # One version of a provisioning run, on a pool thread. Everything it writes belongs to
+    # install (its temp ZIP, staging and gradle-<version> tree) or locks (the distribution
+    # cache, the install index), so several run at once. Returns (extraction stats,
+    # check_gradle_installation() result).
+    with TRACE.span(f"provision {install.version}", "provision") as span:
+        cached_path, install.zip_sha256 = cache_lookup(install.version)
+        span["cached"] = bool(cached_path)
+        if cached_path:
+            install.zip_path = cached_path
+        elif offline:
+            raise DownloadError(f"not in the distribution cache {CACHE_DIR} and offline mode is enabled")
         else:
-            console.print("\nUser declined to restart with admin privileges.", style="warning")
-            console.print("Please run the script manually as an administrator if you wish to proceed with the installation.")
-            if getattr(sys, 'frozen', False): Prompt.ask("Press Enter to exit.", console=console)
-            else: input("Press Enter to exit.")
-            sys.exit(1)
-        # The finally block for show_cursor(True) in the initial if __name__ == "__main__" 
-        # will handle restoring cursor for these sys.exit() paths if script is run directly
-    # --- If we are here, we are running as Admin ---
-    try: console.show_cursor(True) 
+            temp_zip_path = install.zip_path
+            os.makedirs(os.path.dirname(temp_zip_path), exist_ok=True)
+            _report(progress, task_id, description=f"Downloading {install.zip_name}")
+            _, install.zip_sha256 = download_file(install.url, install.zip_path, segments=segments,
+                                                  expected_sha256=fetch_published_sha256(install.url), progress=progress,
+                                                  task_id=task_id, mirrors=install.mirror_urls, throttle=bandwidth)
+            try:
+                with TRACE.span("cache insert", "cache"):
+                    install.zip_path = cache_insert(temp_zip_path, install.version, install.zip_sha256)[0]
+                os.remove(temp_zip_path)
+            except (OSError, TimeoutError):
+                pass # Extract from the temp ZIP; provision_versions removes it afterwards.
+        staging_dir = staging_dir_for(install.home_dir_name, install.install_dir)
+        if os.path.exists(staging_dir):
+            shutil.rmtree(staging_dir)
+        _report(progress, task_id, description=f"Extracting {install.zip_name}", total=None, completed=0)
+        stats = extract_archive(install.zip_path, staging_dir, workers=workers, progress=progress, task_id=task_id,
+                                reuse=reuse, throttle=disk_io)
+        stats["displaced"] = promote_staged_tree(staging_dir, install.install_dir)
+        for displaced_path in stats["displaced"]:
+            try:
+                move_to_trash(displaced_path, install.install_dir)
+            except OSError:
+                pass # Left next to the tree; the next cleanup or trash sweep finds it.
+        write_install_manifest(install.version, install.home, install.url, install.zip_sha256, install.zip_path, install.install_dir)
+        _report(progress, task_id, description=f"Verifying {install.home_dir_name}")
+        return stats, check_gradle_installation(install.home, install.version)
+
+def provision_versions(specs, jobs=PROVISION_JOBS, offline=False, force=False, reuse=True, seed_wrapper=True,
+                       max_bandwidth=None, max_disk_io=None, install_dir=None, temp_dir=None):
+    # Installs several versions side by side (say, every version a monorepo's builds pin)
+    # without changing the active one. Up to `jobs` versions download and extract at once;
+    # their downloads share one bandwidth budget and their extractions one disk write
+    # budget (MB/s, None for unlimited), and the connections and extraction threads a
+    # single install would use are split between them. Each job gets everything it needs
+    # in its GradleInstall; no module global is read or changed on the pool threads.
+    # Returns {version or spec: status}.
+    install_dir, temp_dir = install_dir or INSTALL_DIR, temp_dir or TEMP_DIR
+    results = {}
+    installs = []
+    for spec in specs:
+        version = spec if load_install_manifest(spec, install_dir) else resolve_gradle_version(spec, offline=offline)
+        if not version:
+            console.print(f"[danger]Could not resolve Gradle version '{spec}'.[/danger]")
+            results[spec] = "unresolved"
+        elif version in results or any(install.version == version for install in installs):
+            continue
+        elif not force and is_installed(version, install_dir):
+            console.print(f"[success]Gradle {version} is already installed ([path]{os.path.join(install_dir, f'gradle-{version}')}[/path]).[/success]")
+            results[version] = "present"
+        else:
+            installs.append(GradleInstall(version, install_dir, temp_dir))
+    if installs:
+        jobs = max(1, min(jobs, len(installs)))
+        console.print(f"Provisioning Gradle {', '.join(install.version for install in installs)} into [path]{install_dir}[/path] "
+                      f"({jobs} at a time)...", style="info")
+        os.makedirs(install_dir, exist_ok=True)
+        homes = [install.home for install in installs]
+        replaced = [install.version for install in installs if os.path.exists(install.home)]
+        if replaced:
+            # Trees a --force run replaces: their daemons stop before any job stages or swaps.
+            stop_gradle_daemons(replaced)
+        # Built up front and never from a tree this run replaces, so no job reads files another moves away.
+        reuse_indexes = {install.version: build_reuse_index(install.home, exclude=homes, install_dir=install_dir) if reuse else None for install in installs}
+        bandwidth, disk_io = RateLimiter.from_megabytes(max_bandwidth), RateLimiter.from_megabytes(max_disk_io)
+        with transfer_progress(transient=False) as progress, \
+                ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="gradle-provision") as pool:
+            futures = {}
+            for install in installs:
+                task_id = progress.add_task(f"Waiting: {install.zip_name}", total=None)
+                future = pool.submit(provision_install, install, progress, task_id, offline, reuse_indexes[install.version],
+                                     max(1, EXTRACT_WORKERS // jobs), max(1, DOWNLOAD_SEGMENTS // jobs), bandwidth, disk_io)
+                futures[future] = (install, task_id)
+            for future in as_completed(futures):
+                install, task_id = futures[future]
+                try:
+                    stats, check = future.result()
+                except ChecksumMismatchError as e:
+                    progress.update(task_id, description=f"[danger]Failed: {install.zip_name}[/danger]")
+                    progress.console.print(f"  [danger]Gradle {install.version} failed its integrity check: {e}[/danger]")
+                    results[install.version] = "failed"
+                    continue
+                except Exception as e:
+                    # Any error ends only its own job; the other versions still get installed.
+                    progress.update(task_id, description=f"[danger]Failed: {install.zip_name}[/danger]")
+                    progress.console.print(f"  [danger]Gradle {install.version} could not be installed: {e or type(e).__name__}[/danger]")
+                    results[install.version] = "failed"
+                    continue
+                progress.update(task_id, description=f"Installed {install.home_dir_name}")
+                progress.console.print(f"  [success]Gradle {install.version} installed to [path]{install.home}[/path].[/success] "
+                                       f"[info]{format_extraction_stats(stats)}[/info]")
+                if check["ok"]:
+                    results[install.version] = "installed"
+                else:
+                    progress.console.print(f"  [warning]Gradle {install.version} failed verification: {'; '.join(check['problems'])}[/warning]")
+                    results[install.version] = "unverified"
+    installed = [install for install in installs if results.get(install.version, "failed") == "installed"]
+    if seed_wrapper and installed:
+        seed_gradle_wrappers([install.version for install in installed], offline=offline,
+                             known_zips={wrapper_distribution_url(install.version): install.zip_path for install in installed},
+                             install_dir=install_dir)
+    for install in installs:
+        if not is_cached_distribution(install.zip_path) and os.path.exists(install.zip_path):
+            try: os.remove(install.zip_path)
+            except OSError: pass
+    active_home = read_current_link(install_dir)
+    if installed:
+        console.print(f"[info]The active version is unchanged{f' ([path]{active_home}[/path])' if active_home else ''}; "
+                      f"run with 'switch -g <version>' to change it.[/info]")
+    return results
+
+def switch_gradle(spec="latest", rollback=False):
+    # Activates an installed version by repointing the "current" link; GRADLE_HOME and
+    # Path already name the link, so nothing in the registry changes.
+    if rollback:
+        version = _load_install_index(_manifest_paths()[2]).get("previous")
+        if not version:
+            console.print("[danger]No previously active version is recorded, so there is nothing to roll back to.[/danger]")
+            return False
+    else:
+        version = select_gradle_version(spec, installed_versions())
+        if not version:
+            console.print(f"[danger]No installed Gradle version matches '{spec}'. Install it first with --gradle-version {spec}.[/danger]")
+            return False
+    gradle_home = os.path.join(INSTALL_DIR, f"gradle-{version}")
+    if not os.path.isdir(gradle_home):
+        console.print(f"[danger]Gradle {version} is no longer installed at [path]{gradle_home}[/path].[/danger]")
+        return False
+    check = check_gradle_installation(gradle_home, version)
+    if not check["ok"]:
+        for problem in check["problems"]:
+            console.print(f"  [danger]{problem}[/danger]")
+        console.print(f"[danger]Gradle {version} failed verification; run 'repair --gradle-version {version}' first.[/danger]")
+        return False
+
+    started = time.perf_counter()
+    try:
+        previous_home = point_current_link(gradle_home)
+    except (OSError, TimeoutError) as e:
+        console.print(f"[danger]Could not repoint [path]{current_link_path()}[/path]: {e}[/danger]")
+        return False
+    previous = os.path.basename(previous_home)[len("gradle-"):] if previous_home else "none"
+    console.print(f"[success]Switched Gradle from {previous} to {version} in {(time.perf_counter() - started) * 1000:.0f} ms.[/success]")
+    link_path = current_link_path()
+    if get_system_env_var("GRADLE_HOME") == link_path:
+        console.print("  [info]No environment changes were needed; open terminals pick up the new version on their next 'gradle' call.[/info]")
+    else:
+        # Installs made before the link existed name a version directory; point them at the link once.
+        set_env_var_system("GRADLE_HOME", link_path)
+        add_to_path_system(os.path.join(link_path, "bin"))
+        broadcast_env_change()
+    return True
+
+def require_admin():
+    # Returns when running elevated. Otherwise offers to restart elevated, or with --yes
+    # exits at once: nobody is there to answer the UAC prompt.
+    if is_admin():
+        try: console.show_cursor(True)
+        except Exception: pass
+        return
+    if ASSUME_YES:
+        console.print("[danger]Administrator privileges are required. Run the installer elevated (or as SYSTEM); unattended runs (--yes) do not ask for elevation.[/danger]")
+        sys.exit(EXIT_NOT_ADMIN)
+    console.clear()
+    try: console.show_cursor(False) 
     except Exception: pass
-            
-    console.clear(); print_logo()
-    latest_version = fetch_latest_gradle_version()
-    if not latest_version:
-        console.print("[danger]Could not determine the latest Gradle version. Aborting installation.[/danger]")
-        if getattr(sys, 'frozen', False): Prompt.ask("Press Enter to exit.", console=console)
-        else: input("Press Enter to exit.")
-        sys.exit(1)
+    
+    print_logo()
+    console.print()
+    console.print(Panel("[b yellow]ADMINISTRATOR PRIVILEGES REQUIRED[/b yellow]\n\n"
+                        "This script needs administrator privileges to install Gradle, modify\n"
+                        "system environment variables, and create system-wide settings.\n\n"
+                        "It can attempt to restart itself with the required permissions.",
+                        title="Permissions Notice", border_style="yellow", expand=False))
+    console.print()
+    
+    if confirm("Do you want to try restarting as administrator now?", default=True):
+        console.print("\nAttempting to re-launch with admin rights...", style="info")
+        time.sleep(1)  
+        
+        if run_as_admin():
+            sys.exit(EXIT_OK) 
+        else:
+            console.print("[warning]Could not automatically restart with admin rights.[/warning]")
+            console.print("Please close this window and run the script manually as an administrator (right-click -> Run as administrator).")
+            pause()
+            sys.exit(EXIT_NOT_ADMIN)
+    else:
+        console.print("\nUser declined to restart with admin privileges.", style="warning")
+        console.print("Please run the script manually as an administrator if you wish to proceed with the installation.")
+        pause()
+        sys.exit(EXIT_NOT_ADMIN)
+    # The finally block for show_cursor(True) in the initial if __name__ == "__main__" 
+    # will handle restoring cursor for these sys.exit() paths if script is run directly
+
+def begin_stage(title):
+    # Section rule on the console; with --trace also the phase span that runs until the next stage.
+    console.rule(f"[bold cyan]{title}[/bold cyan]")
+    TRACE.phase(title)
+
+def main(argv=None):
+    global ASSUME_YES
+    args = parse_args(argv)
+    ASSUME_YES = args.yes
+    trace_path = args.trace or TRACE_PATH
+    if not trace_path:
+        return _main(args)
+    TRACE.enable()
+    try:
+        with TRACE.span(args.command, "run", argv=sys.argv[1:] if argv is None else list(argv)):
+            return _main(args)
+    finally:
+        try:
+            TRACE.write(trace_path, args.trace_format, command=args.command, version=GRADLE_VERSION)
+            console.print(f"[dim]Trace written to {trace_path}.[/dim]")
+        except OSError as e:
+            console.print(f"[warning]Could not write the trace to [path]{trace_path}[/path]: {e}[/warning]")
+
+def _main(args):
+    global GRADLE_VERSION, DOWNLOAD_URL, GRADLE_ZIP_NAME, GRADLE_ZIP_PATH
+    global GRADLE_HOME_DIR_NAME, GRADLE_HOME, TEMP_DIR, INSTALL_DIR, SERVICES_BASE_URL
+
+    if args.services_url:
+        SERVICES_BASE_URL = args.services_url.rstrip("/")
+    if args.install_dir:
+        INSTALL_DIR = os.path.abspath(args.install_dir)
+    DOWNLOAD_MIRRORS.extend(args.mirror)
+    if args.command == "empty-trash":
+        _, left = empty_trash()
+        sys.exit(EXIT_OK if not left else EXIT_FAILED)
+    if args.command == "status":
+        print_status() # Read-only, so no admin rights needed.
+        return
+    if args.command == "serve":
+        sys.exit(EXIT_OK if serve_distributions(args.bind, args.port) else EXIT_FAILED) # Only needs the cache, no admin rights.
+    if args.command == "prefetch":
+        sys.exit(prefetch_distributions(args.gradle_versions, args.interval, args.max_bandwidth)) # Cache only, like serve.
+    if args.command == "tune":
+        sys.exit(EXIT_OK if tune_gradle_properties(dry_run=args.tune_dry_run) else EXIT_FAILED) # Per-user, so no admin rights needed.
+
+    if args.command == "install":
+        # Resolved before the admin check, so a repeated run on a provisioned machine ends
+        # here: no elevation, download or UI. Java and environment probes don't depend on
+        # the version, so they run while it resolves.
+        java_check = run_in_background(discover_jdks)
+        environment_check = run_in_background(inspect_environment)
+        if not ASSUME_YES:
+            console.clear(); print_logo()
+        TRACE.phase("Version Resolution")
+        # An exact version that was installed before needs no versions API lookup.
+        latest_version = args.gradle_version if load_install_manifest(args.gradle_version) else resolve_gradle_version(args.gradle_version, offline=args.offline)
+        if not latest_version:
+            console.print("[danger]Could not determine the Gradle version to install. Aborting installation.[/danger]")
+            pause()
+            sys.exit(EXIT_FAILED)
+        if not args.force and installed_and_active(latest_version):
+            console.print(f"[success]Gradle {latest_version} is already installed and active ([path]{os.path.join(INSTALL_DIR, f'gradle-{latest_version}')}[/path]). "
+                          "Nothing to do; use --force to reinstall.[/success]")
+            pause()
+            sys.exit(EXIT_OK)
+
+    require_admin()
+    if args.command == "provision":
+        results = provision_versions(args.gradle_versions, jobs=args.jobs, offline=args.offline, force=args.force,
+                                     reuse=not args.no_reuse, seed_wrapper=not args.no_wrapper_seed,
+                                     max_bandwidth=args.max_bandwidth, max_disk_io=args.max_disk_io)
+        if any(status in ("failed", "unresolved") for status in results.values()):
+            sys.exit(EXIT_FAILED)
+        sys.exit(EXIT_VERIFY_FAILED if "unverified" in results.values() else EXIT_OK)
+    if args.command == "repair":
+        sys.exit(EXIT_OK if repair_gradle(args.gradle_version, offline=args.offline) else EXIT_FAILED)
+    if args.command in ("pin", "unpin"):
+        sys.exit(EXIT_OK if pin_versions(args.gradle_versions, pinned=args.command == "pin") else EXIT_FAILED)
+    if args.command in ("switch", "rollback"):
+        sys.exit(EXIT_OK if switch_gradle(args.gradle_version, rollback=args.command == "rollback") else EXIT_FAILED)
+    if args.command == "seed-wrapper":
+        specs = args.seed_wrapper or [_repair_version(args.gradle_version, offline=args.offline)]
+        if not all(specs):
+            console.print("[danger]No installed Gradle version found; give the distributions to seed with --seed-wrapper.[/danger]")
+            sys.exit(EXIT_FAILED)
+        sys.exit(EXIT_OK if seed_gradle_wrappers(specs, offline=args.offline) else EXIT_FAILED)
+    start_trash_sweep() # Whatever an earlier run could not delete (locked files, interrupted sweep).
     update_global_config(latest_version)
+    reuse_index = None if args.no_reuse else build_reuse_index(GRADLE_HOME)
+    background_download = start_speculative_download(offline=args.offline, reuse=reuse_index)
 
     console.print(Panel(f"[bold white on teal] Gradle Setup Utility by Germanized [/]\n[dim]Targeting Gradle: [variable]{GRADLE_VERSION}[/variable][/dim]",
-                  title="Welcome", subtitle=f"Latest: v{GRADLE_VERSION}", highlight=True))
+                  title="Welcome", subtitle=f"Target: v{GRADLE_VERSION}", highlight=True))
 
-    console.rule("[bold cyan]System Checks[/bold cyan]")
-    if not check_java():
-        if not Confirm.ask("Java JDK not found or verification failed. Gradle may not work.\nContinue with Gradle installation anyway?", default=False, console=console):
+    begin_stage("System Checks")
+    selected_jdk = check_java(java_check.result())
+    if not selected_jdk:
+        if not confirm("Java JDK not found or verification failed. Gradle may not work.\nContinue with Gradle installation anyway?", default=False):
             console.print("Installation aborted by user due to Java JDK issue.", style="warning")
-            sys.exit(1)
+            if background_download: background_download.cancel()
+            sys.exit(EXIT_CANCELLED)
+    check_environment(environment_check.result())
     console.print()
 
-    console.rule("[bold cyan]Installation Settings[/bold cyan]")
-    console.print(f"  Gradle Version: [variable]{GRADLE_VERSION}[/variable] (Latest)")
+    begin_stage("Installation Settings")
+    console.print(f"  Gradle Version: [variable]{GRADLE_VERSION}[/variable] (requested: {args.gradle_version})")
     console.print(f"  Download URL: [link={DOWNLOAD_URL}]{DOWNLOAD_URL}[/link]")
     console.print(f"  Temporary Directory: [path]{TEMP_DIR}[/path]")
     console.print(f"  Installation Root Directory: [path]{INSTALL_DIR}[/path]")
-    console.print(f"  GRADLE_HOME will be set to: [path]{GRADLE_HOME}[/path]")
+    console.print(f"  Gradle will be installed to: [path]{GRADLE_HOME}[/path]")
+    console.print(f"  GRADLE_HOME will be set to: [path]{current_link_path()}[/path] (a link to the active version)")
     console.print()
 
-    if not Confirm.ask("Proceed with installation using these settings?", default=True, console=console):
-        console.print("Installation aborted by user.", style="warning"); sys.exit(0)
+    if not confirm("Proceed with installation using these settings?", default=True):
+        console.print("Installation aborted by user.", style="warning")
+        if background_download: background_download.cancel()
+        sys.exit(EXIT_CANCELLED)
 
-    console.rule("[bold cyan]Gradle Installation[/bold cyan]")
+    begin_stage("Gradle Installation")
+    if background_download and background_download.extractor:
+        background_download.extractor.activate()
     os.makedirs(TEMP_DIR, exist_ok=True)
     os.makedirs(INSTALL_DIR, exist_ok=True) 
 
-    console.print(f"Downloading Gradle {GRADLE_VERSION} from [link={DOWNLOAD_URL}]{DOWNLOAD_URL}[/link]...", style="info")
-    try:
-        with requests.get(DOWNLOAD_URL, stream=True, timeout=(10, 300)) as r: 
-            r.raise_for_status() 
-            total_size = int(r.headers.get('content-length', 0))
-            
-            with Progress(
-                "[progress.description]{task.description}", BarColumn(), DownloadColumn(), 
-                TransferSpeedColumn(), "ETA:", TimeRemainingColumn(),
-                console=console, transient=False 
-            ) as progress:
-                download_task = progress.add_task(f"Downloading {GRADLE_ZIP_NAME}", total=total_size)
-                with open(GRADLE_ZIP_PATH, 'wb') as f:
-                    for chunk in r.iter_content(chunk_size=8192 * 4): 
-                        if chunk: 
-                            f.write(chunk)
-                            progress.update(download_task, advance=len(chunk))
-            if total_size > 0:
-                 progress.update(download_task, completed=total_size, refresh=True) # Ensure 100%
-        console.print("  [success]Download complete.[/success]")
-    except requests.exceptions.Timeout:
-        console.print(f"  [danger]Download failed: The request timed out connecting to or reading from {DOWNLOAD_URL}[/danger]")
-        if os.path.exists(GRADLE_ZIP_PATH): os.remove(GRADLE_ZIP_PATH)
-        sys.exit(1)
-    except requests.RequestException as e:
-        console.print(f"  [danger]Download failed: {e}[/danger]")
-        if os.path.exists(GRADLE_ZIP_PATH): os.remove(GRADLE_ZIP_PATH)
-        sys.exit(1)
+    if not use_cached_distribution():
+        if args.offline:
+            console.print(f"  [danger]Gradle {GRADLE_VERSION} is not in the distribution cache [path]{CACHE_DIR}[/path] and offline mode is enabled.[/danger]")
+            sys.exit(EXIT_FAILED)
+        download_gradle_distribution(background_download)
     console.print()
 
     console.print(f"Extracting Gradle to [path]{INSTALL_DIR}[/path]...", style="info")
+    # Extraction always goes to a staging sibling that is renamed into place when complete,
+    # so an existing tree stays usable until the new one replaces it.
+    install_tree = True
     if os.path.exists(GRADLE_HOME):
         console.print(f"  [warning]Target directory [path]{GRADLE_HOME}[/path] already exists.[/warning]")
-        if Confirm.ask(f"Remove existing directory [path]{GRADLE_HOME}[/path] and perform a fresh extraction?", default=True, console=console):
-            try:
-                shutil.rmtree(GRADLE_HOME)
-                console.print(f"  [success]Successfully removed existing target directory.[/success]")
-            except OSError as e:
-                console.print(f"  [danger]Error removing existing directory [path]{GRADLE_HOME}[/path]: {e}.[/danger]")
-                console.print(f"  Please remove it manually and re-run the script. Or, ensure no files are in use.")
-                sys.exit(1)
+        if confirm(f"Replace existing directory [path]{GRADLE_HOME}[/path] with a fresh extraction?", default=True):
+            console.print("  The fresh tree is extracted next to it and swapped in once complete.", style="info")
         else:
+            install_tree = False
             console.print("  Extraction skipped as user chose not to overwrite existing directory.", style="info")
+        if install_tree:
+            # Its daemons run from the tree being replaced, so they stop before the swap.
+            stop_gradle_daemons([GRADLE_VERSION])
     
-    if not os.path.exists(GRADLE_HOME): 
+    # Set when the archive was downloaded in this run and entries were extracted into staging on the fly.
+    stream_extractor = background_download.extractor if background_download and not is_cached_distribution(GRADLE_ZIP_PATH) else None
+    if not install_tree and stream_extractor:
+        stream_extractor.abort()
+    if install_tree: 
         try:
-            with zipfile.ZipFile(GRADLE_ZIP_PATH, 'r') as zip_ref:
-                zip_ref.extractall(INSTALL_DIR) 
+            if stream_extractor:
+                stats = stream_extractor.finish(GRADLE_ZIP_PATH, INSTALL_DIR)
+            else:
+                staging_dir = staging_dir_for(GRADLE_HOME_DIR_NAME)
+                if os.path.exists(staging_dir):
+                    shutil.rmtree(staging_dir)
+                with transfer_progress() as progress:
+                    extract_task = progress.add_task(f"Extracting {GRADLE_ZIP_NAME}", total=None)
+                    stats = extract_archive(GRADLE_ZIP_PATH, staging_dir, progress=progress, task_id=extract_task, reuse=reuse_index)
+                stats["displaced"] = promote_staged_tree(staging_dir, INSTALL_DIR)
             console.print("  [success]Extraction complete.[/success]")
+            console.print(f"  [info]{format_extraction_stats(stats)}[/info]")
+            for displaced_path in stats["displaced"]:
+                try:
+                    move_to_trash(displaced_path)
+                except OSError as e:
+                    console.print(f"  [warning]Could not move the replaced tree [path]{displaced_path}[/path] to the trash: {e}[/warning]")
+            try:
+                write_install_manifest(GRADLE_VERSION, GRADLE_HOME, DOWNLOAD_URL, GRADLE_ZIP_SHA256, GRADLE_ZIP_PATH)
+            except (OSError, TimeoutError) as e:
+                console.print(f"  [warning]Could not record the install manifest: {e}[/warning]")
             if not os.path.isdir(GRADLE_HOME):
                  console.print(f"  [danger]Post-extraction check failed: Expected directory [path]{GRADLE_HOME}[/path] not found.[/danger]")
                  extracted_items = os.listdir(INSTALL_DIR)
                  console.print(f"  [info]Contents of [path]{INSTALL_DIR}[/path] are: {extracted_items}[/info]")
                  console.print(f"  [info]The ZIP might have an unexpected top-level folder structure.[/info]")
-                 sys.exit(1)
+                 sys.exit(EXIT_FAILED)
         except zipfile.BadZipFile:
-            console.print(f"  [danger]Extraction failed: The downloaded file [path]{GRADLE_ZIP_PATH}[/path] is not a valid ZIP archive or is corrupted.[/danger]"); sys.exit(1)
+            console.print(f"  [danger]Extraction failed: The downloaded file [path]{GRADLE_ZIP_PATH}[/path] is not a valid ZIP archive or is corrupted.[/danger]"); sys.exit(EXIT_FAILED)
         except Exception as e:
-            console.print(f"  [danger]An unexpected error occurred during extraction: {e}[/danger]"); sys.exit(1)
+            console.print(f"  [danger]An unexpected error occurred during extraction: {e}[/danger]"); sys.exit(EXIT_FAILED)
     console.print()
 
-    console.rule("[bold cyan]Environment Configuration (System-wide)[/bold cyan]")
+    # Verification reads only the installed tree, so it runs while the environment is configured.
+    installation_check = run_in_background(check_gradle_installation, GRADLE_HOME, GRADLE_VERSION, deep=args.deep_verify)
+
+    begin_stage("Environment Configuration (System-wide)")
+    # GRADLE_HOME and Path name the "current" link, so once they are set, later installs
+    # and switches only repoint the link: no registry write and no broadcast.
+    try:
+        previous_home = point_current_link(GRADLE_HOME)
+        active_home = current_link_path()
+        console.print(f"[path]{active_home}[/path] now points to [path]{GRADLE_HOME}[/path]"
+                      f"{f' (was [path]{previous_home}[/path])' if previous_home and previous_home != os.path.realpath(GRADLE_HOME) else ''}.", style="info")
+    except (OSError, TimeoutError) as e:
+        console.print(f"  [warning]Could not create the link [path]{current_link_path()}[/path]: {e}. Environment variables will name the version directory instead.[/warning]")
+        active_home = GRADLE_HOME
     env_vars_changed = False
-    if set_env_var_system("GRADLE_HOME", GRADLE_HOME): env_vars_changed = True
-    if add_to_path_system(os.path.join(GRADLE_HOME, "bin")): env_vars_changed = True
+    if get_system_env_var("GRADLE_HOME") == active_home:
+        console.print(f"System GRADLE_HOME is already [path]{active_home}[/path].", style="info")
+    elif set_env_var_system("GRADLE_HOME", active_home): env_vars_changed = True
+    if add_to_path_system(os.path.join(active_home, "bin")): env_vars_changed = True
+    if selected_jdk and configure_java_home(selected_jdk): env_vars_changed = True
     
     if env_vars_changed:
         broadcast_env_change()
@@ -553,31 +4202,51 @@ def main():
         console.print("No system environment variables needed changes (or changes failed).", style="info")
     console.print()
 
-    console.rule("[bold cyan]User Experience Customizations[/bold cyan]")
+    begin_stage("User Experience Customizations")
     set_cmd_colors() 
     create_shortcut()  
     console.print()
 
+    if not args.no_tune:
+        begin_stage("Gradle Performance Profile")
+        tune_gradle_properties(dry_run=args.tune_dry_run, ask=True)
+        console.print()
+
     verification_passed = False
-    console.rule("[bold cyan]Final Verification[/bold cyan]")
-    if verify_gradle():
+    begin_stage("Final Verification")
+    if verify_gradle(installation_check):
         verification_passed = True
     console.print()
 
     if verification_passed:
-        console.rule("[bold cyan]Post-Install Operations[/bold cyan]")
-        stop_gradle_daemons()
-        cleanup_old_gradle_versions()
+        begin_stage("Post-Install Operations")
+        removals = [] if args.no_cleanup else plan_cleanup(GRADLE_HOME, args.keep)
+        # Daemons of the old versions cleanup removes (a replaced tree's were stopped before
+        # extraction). Kept versions' daemons stay usable.
+        if removals:
+            stop_gradle_daemons([version for version, _ in removals])
+        if args.no_cleanup:
+            console.print("Keeping all older Gradle versions (--no-cleanup).", style="info")
+        else:
+            cleanup_old_gradle_versions(args.keep, removals)
         console.print()
     else:
         console.print("[warning]Gradle verification failed or was skipped. Critical post-install steps (stopping daemons, cleaning old versions) will be skipped to prevent unintended actions.[/warning]")
         console.print("[warning]Please manually verify your Gradle installation and environment variables.[/warning]")
         console.print()
 
-    console.rule("[bold cyan]Final Cleanup (Temporary Files)[/bold cyan]")
+    wrapper_specs = ([] if args.no_wrapper_seed else [GRADLE_VERSION]) + args.seed_wrapper
+    if verification_passed and wrapper_specs:
+        begin_stage("Gradle Wrapper Cache")
+        seed_gradle_wrappers(wrapper_specs, offline=args.offline, known_zips={wrapper_distribution_url(GRADLE_VERSION): GRADLE_ZIP_PATH})
+        console.print()
+
+    begin_stage("Final Cleanup (Temporary Files)")
     console.print(f"Cleaning up temporary download file [path]{GRADLE_ZIP_PATH}[/path]...", style="info")
     try:
-        if os.path.exists(GRADLE_ZIP_PATH):
+        if is_cached_distribution(GRADLE_ZIP_PATH):
+            console.print(f"  [info]Distribution is kept in the cache at [path]{GRADLE_ZIP_PATH}[/path].[/info]")
+        elif os.path.exists(GRADLE_ZIP_PATH):
             os.remove(GRADLE_ZIP_PATH)
             console.print(f"  [success]Removed temporary file: [path]{GRADLE_ZIP_PATH}[/path][/success]")
         else:
@@ -593,7 +4262,8 @@ def main():
     console.print(Panel(
         f"[bold {final_status_style}]{final_message_intro}[/bold {final_status_style}]\n\n"
         f"Target Gradle Version: [variable]{GRADLE_VERSION}[/variable]\n"
-        f"Installed to/GRADLE_HOME: [path]{GRADLE_HOME}[/path]\n\n"
+        f"Installed to: [path]{GRADLE_HOME}[/path]\n"
+        f"GRADLE_HOME: [path]{active_home}[/path]\n\n"
         f"{'Verification: [success]Passed[/success]' if verification_passed else 'Verification: [danger]Failed or Skipped[/danger]'}\n"
         "System Environment Variables: Configured (GRADLE_HOME and PATH updated).\n"
         f"Desktop Shortcut: {'Created' if os.path.exists(os.path.join(winshell.desktop(), f'Gradle Command Prompt ({GRADLE_VERSION}).lnk')) else 'Not created or failed'}.\n"
@@ -606,8 +4276,9 @@ def main():
         title=final_status_title, style=final_status_style, highlight=True
     ))
 
-    if getattr(sys, 'frozen', False): Prompt.ask("Press Enter to exit script.", console=console)
-    else: input("Press Enter to exit script.")
+    pause("Press Enter to exit script.")
+    if not verification_passed:
+        sys.exit(EXIT_VERIFY_FAILED)
 
 
 if __name__ == "__main__":
@@ -617,29 +4288,30 @@ if __name__ == "__main__":
             console.show_cursor(True) # Ensure cursor is initially visible
         main()
     except SystemExit: 
-        # This allows sys.exit() to terminate the script cleanly.
+        # This allows sys.exit() to terminate the script cleanly, with its exit code.
         # The finally block will still execute to restore the cursor.
-        pass
+        raise
     except ImportError: 
         # This is a fallback for ImportErrors not caught by the very first check,
         # or if `console` object itself failed to initialize properly for the messages.
         print("FATAL: A critical library is missing. The script cannot continue.")
         print("Please ensure 'rich', 'requests', 'winshell', and 'pywin32' are installed.")
         print("Run: pip install rich requests winshell pywin32")
-        if not getattr(sys, 'frozen', False): input("Press Enter to exit.")
+        if not getattr(sys, 'frozen', False) and not ASSUME_YES: input("Press Enter to exit.")
+        sys.exit(EXIT_FAILED)
     except Exception as e:
         # General exception handler for any other unexpected errors during main execution.
         if 'console' in globals() and console is not None:
             console.print_exception(show_locals=True, width=120)
             console.print("[danger]An unexpected error occurred. Please review the output above for details.[/danger]")
-            if getattr(sys, 'frozen', False): Prompt.ask("Press Enter to exit due to error.", console=console)
-            else: input("Press Enter to exit due to error.")
+            pause("Press Enter to exit due to error.")
         else: 
             # Fallback if 'console' object itself is problematic or not defined.
             print("AN UNEXPECTED CRITICAL ERROR OCCURRED (console object unavailable):")
             import traceback
             traceback.print_exc()
-            if not getattr(sys, 'frozen', False): input("Press Enter to exit due to error.")
+            if not getattr(sys, 'frozen', False) and not ASSUME_YES: input("Press Enter to exit due to error.")
+        sys.exit(EXIT_FAILED)
     finally:
         # This block will execute whether an exception occurred or not.
         # Ensure cursor is visible when script exits, regardless of how.